@@ -10,6 +10,7 @@
 # Load packages
 
 import os
+import sys
 import pandas as pd
 import seaborn as sns
 from statsmodels.tsa.stattools import adfuller
@@ -32,7 +33,14 @@ pd.set_option('display.width', 100)
 # Read in dataset
 
 input_folder = f"{os.getcwd()}"
-df_proc = pd.read_excel(f"{input_folder}/ffiec031_processed.xlsx")
+sys.path.append(os.path.join(input_folder, "..", "trend_analysis"))
+from ffiec031_panel_store import PANEL_STORE_PATH, open_panel_store, read_panel_series
+# Memory-mapped panel written by the trend analysis preprocessing: only the selected MDRM is read
+panel_path = os.path.join(input_folder, "..", PANEL_STORE_PATH)
+if os.path.exists(panel_path):
+    panel = open_panel_store(panel_path)
+else:
+    df_proc = pd.read_excel(f"{input_folder}/ffiec031_processed.xlsx")
 
 
 # In[3]:
@@ -51,7 +59,7 @@ def process_ts_data(ts_data: pd.DataFrame, mdrm: str) -> pd.DataFrame:
 
 # Select a sample MDRM: RCFA3792 (Total Capital)
 
-df = process_ts_data(df_proc, 'RCFA3792')
+df = read_panel_series(panel, 'RCFA3792') if os.path.exists(panel_path) else process_ts_data(df_proc, 'RCFA3792')
 
 
 # In[5]:
@@ -1,13 +1,29 @@
 # Load packages
 import os
-import re
+import csv
 import time
+import queue
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from datetime import datetime, date, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from ffiec031_http_fetch import FACSIMILE_URL, build_facsimile_url, download_sdfs_http
+from ffiec031_sdf_manifest import (find_latest_recorded_quarter, find_unrecorded_sdf_files, list_recorded_sdf_files,
+                                   open_manifest, sync_manifest)
+from ffiec031_sdf_stub_server import index_sdf_files, start_stub_server
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+except ImportError:
+    webdriver = None    # Selenium is only needed for fetch_mode="selenium"; "http" runs without a browser
 
 
 # Function to generate the quarter end dates starting from 03312001 to most recent quarter-end date
@@ -52,9 +68,16 @@ def get_recent_quarter_end():
     return date(year - 1, 12, 31)
 
 
-# Function to download the SDF file for a given quarter end date
-def download_sdf(quarter_end_date, download_folder):
-    url = f"https://cdr.ffiec.gov/Public/ViewFacsimileDirect.aspx?ds=call&idtype=id_rssd&id=480228&date={quarter_end_date}"
+# Function to resolve the ChromeDriver binary once and reuse it for every browser session
+@lru_cache(maxsize=None)
+def get_chromedriver_path():
+    return ChromeDriverManager().install()
+
+
+# Function to start a headless Chrome session that saves downloads into the download folder
+def create_chrome_driver(download_folder):
+    if webdriver is None:
+        raise ImportError("Selenium is not installed - use fetch_mode='http' to download without a browser.")
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -68,51 +91,168 @@ def download_sdf(quarter_end_date, download_folder):
     }
     chrome_options.add_experimental_option("prefs", prefs)
 
-    # Initialize Chrome WebDriver
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    service = Service(get_chromedriver_path())
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+
+# Function to wait until the downloaded file appears in the download folder
+def wait_for_download(download_folder, filename, timeout=60, poll_interval=0.2):
+    # Chrome writes to a temporary .crdownload file and renames it once the download has finished,
+    # so the final file name only shows up when the file is complete
+    file_path = os.path.join(download_folder, filename)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.isfile(file_path):
+            return file_path
+        time.sleep(poll_interval)
+    raise TimeoutError(f"{filename} did not appear in {download_folder} within {timeout} seconds")
+
 
+# Function to download the SDF file for a given quarter end date with an existing browser session
+def download_sdf_with_driver(driver, quarter_end_date, download_folder, timeout=60, base_url=FACSIMILE_URL):
+    url = build_facsimile_url(quarter_end_date, base_url=base_url)
     try:
         driver.get(url)
-        time.sleep(5)  # Wait for the page to load
-        download_button = driver.find_element(By.ID, "Download_SDF_3")
+        download_button = WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable((By.ID, "Download_SDF_3"))
+        )
         download_button.click()
-        time.sleep(10)  # Wait for download
+        wait_for_download(download_folder, create_sdf_filename(quarter_end_date), timeout)
         print(f"File for {quarter_end_date} downloaded successfully to {download_folder}")
+        return True
     except Exception as e:
         print(f"Error downloading file for {quarter_end_date}: {e}")
+        return False
+
+
+# Function to download the SDF file for a given quarter end date
+def download_sdf(quarter_end_date, download_folder, base_url=FACSIMILE_URL):
+    driver = create_chrome_driver(download_folder)
+    try:
+        return download_sdf_with_driver(driver, quarter_end_date, download_folder, base_url=base_url)
     finally:
         driver.quit()
 
 
+# Function to download SDF files concurrently over a pool of long-lived browser sessions
+def download_sdfs_concurrently(quarter_end_dates, download_folder, pool_size=4, timeout=60, base_url=FACSIMILE_URL):
+    driver_pool = queue.Queue()
+    started_drivers = []
+    started_drivers_lock = threading.Lock()
+
+    def download_with_pooled_driver(quarter_end_date):
+        start_time = time.perf_counter()
+        try:
+            driver = driver_pool.get_nowait()
+        except queue.Empty:
+            # At most pool_size sessions are started since only pool_size workers are running
+            driver = create_chrome_driver(download_folder)
+            with started_drivers_lock:
+                started_drivers.append(driver)
+        try:
+            downloaded = download_sdf_with_driver(driver, quarter_end_date, download_folder, timeout, base_url)
+        finally:
+            driver_pool.put(driver)
+        return downloaded, time.perf_counter() - start_time
+
+    download_results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = {executor.submit(download_with_pooled_driver, qed): qed for qed in quarter_end_dates}
+            for future in as_completed(futures):
+                quarter_end_date = futures[future]
+                try:
+                    downloaded, elapsed = future.result()
+                except Exception as e:
+                    print(f"Error starting a browser session for {quarter_end_date}: {e}")
+                    continue
+                download_results[quarter_end_date] = (downloaded, elapsed)
+                status = "done" if downloaded else "failed"
+                print(f"Quarter end date {quarter_end_date}: {status} in {elapsed:.2f} seconds")
+    finally:
+        for driver in started_drivers:
+            driver.quit()
+
+    return download_results
+
+
+# Function to download SDF files with plain HTTP requests, without a browser
+def download_sdfs_without_browser(quarter_end_dates, download_folder, max_connections=8, requests_per_second=4.0,
+                                  base_url=FACSIMILE_URL):
+    jobs = [
+        {
+            "key": f"Quarter end date {quarter_end_date}",
+            "url": build_facsimile_url(quarter_end_date, base_url=base_url),
+            "filename": create_sdf_filename(quarter_end_date),
+        }
+        for quarter_end_date in quarter_end_dates
+    ]
+    results = download_sdfs_http(jobs, download_folder, max_connections, requests_per_second)
+    return {quarter_end_date: results[job["key"]] for quarter_end_date, job in zip(quarter_end_dates, jobs)}
+
+
+# Function to benchmark the HTTP and Selenium fetch modes offline against the stand-in facsimile server
+def benchmark_fetch_modes(sdf_folder, pool_size=4, max_connections=8, latency=0.0, include_selenium=True):
+    server, base_url = start_stub_server(Path(sdf_folder), latency=latency)
+    quarter_end_dates = sorted(index_sdf_files(sdf_folder))
+    fetch_modes = {
+        "http": lambda folder: download_sdfs_without_browser(
+            quarter_end_dates, folder, max_connections, requests_per_second=0, base_url=base_url),
+    }
+    if include_selenium:
+        fetch_modes["selenium"] = lambda folder: download_sdfs_concurrently(
+            quarter_end_dates, folder, pool_size, base_url=base_url)
+
+    try:
+        for fetch_mode, fetch in fetch_modes.items():
+            target_folder = tempfile.mkdtemp(prefix=f"sdf_{fetch_mode}_")
+            try:
+                start_time = time.perf_counter()
+                results = fetch(target_folder)
+                total_time = time.perf_counter() - start_time
+                count_downloaded = sum(downloaded for downloaded, _ in results.values())
+                print(f"{fetch_mode}: {count_downloaded} of {len(quarter_end_dates)} file(s) in {total_time:.2f} seconds "
+                      f"({count_downloaded / total_time:.1f} files/second)")
+            finally:
+                shutil.rmtree(target_folder, ignore_errors=True)
+    finally:
+        server.shutdown()
+
+
 # Function to list all files in a download folder
 def list_files_in_folder(download_folder):
     files = [f for f in os.listdir(download_folder) if os.path.isfile(os.path.join(download_folder, f))]
     return files
 
 
+# Function to create the sdf file name of an institution for a quarter end date
+def create_sdf_filename(quarter_end_date, cert_number=3510):
+    quarter_end_date_short = quarter_end_date[:4]+quarter_end_date[-2:]
+    return f"Call_Cert{cert_number}_{quarter_end_date_short}.SDF"
+
+
 # Function to create a list of sdf files to download at time of script run
-def create_sdf_filenames():
+def create_sdf_filenames(cert_number=3510):
     ls_filenames = []
     quarter_end_dates = generate_quarter_end_dates()
     for quarter_end_date in quarter_end_dates:
-        quarter_end_date_short = quarter_end_date[:4]+quarter_end_date[-2:]
-        filename = f"Call_Cert3510_{quarter_end_date_short}.SDF"
+        filename = create_sdf_filename(quarter_end_date, cert_number)
         ls_filenames.append(filename)
     return ls_filenames
 
 
-# Function to compare existing sdf files against sdf files to download
-def find_sdf_files_to_download(download_folder):
-    ls_files_in_folder = list_files_in_folder(download_folder)
-    ls_files_to_download = create_sdf_filenames()
-    ls_files_not_in_folder = [file for file in ls_files_to_download if file not in ls_files_in_folder]
+# Function to compare the sdf files recorded in the manifest against sdf files to download
+def find_sdf_files_to_download(manifest, cert_number=3510, ls_files_to_download=None):
+    if ls_files_to_download is None:
+        ls_files_to_download = create_sdf_filenames(cert_number)
+    ls_files_not_in_folder = find_unrecorded_sdf_files(manifest, cert_number, ls_files_to_download)
     return ls_files_not_in_folder
 
 # Function to obtain quarter end dates to download
-def get_quarter_end_dates_to_download(download_folder):
-    count_files_to_download = len(create_sdf_filenames())
-    sdf_files_to_download = find_sdf_files_to_download(download_folder)
+def get_quarter_end_dates_to_download(manifest, cert_number=3510):
+    ls_files_to_download = create_sdf_filenames(cert_number)
+    count_files_to_download = len(ls_files_to_download)
+    sdf_files_to_download = find_sdf_files_to_download(manifest, cert_number, ls_files_to_download)
 
     ls_quarter_end_dates_to_download = []
     if sdf_files_to_download:
@@ -130,35 +270,100 @@ def get_quarter_end_dates_to_download(download_folder):
     return ls_quarter_end_dates_to_download
 
 
-# Function to find the most recent quarter end dates in the download folder
-def find_most_recent_quarter_end_date(download_folder):
-    ls_files_in_folder = list_files_in_folder(download_folder)
-    ls_quarter_end_dates = []
-    for file in ls_files_in_folder:
-        pattern = r'_(\d{6})\.'
-        match = re.search(pattern, file)
-        if match:
-            result = match.group(1)
-            result_reformat = '20'+ result[-2:] + result[:4]
-            ls_quarter_end_dates.append(result_reformat)
-    return max(ls_quarter_end_dates)
+# Function to find the most recent quarter end date (YYYYMMDD) recorded in the manifest
+def find_most_recent_quarter_end_date(manifest, cert_number=None):
+    return find_latest_recorded_quarter(manifest, cert_number)
+
+
+# Function to read the institutions to track from a CSV file with 'rssd_id' and 'cert_number' columns
+def read_institutions(institutions_path):
+    with open(institutions_path, newline='') as file:
+        return [(int(row['rssd_id']), int(row['cert_number'])) for row in csv.DictReader(file)]
+
+
+# Function to find the (institution, quarter) pairs whose sdf files are missing from the manifest
+def find_missing_institution_quarters(institutions, manifest):
+    files_in_folder = list_recorded_sdf_files(manifest)     # Look up the manifest once for every institution
+    quarter_end_dates = generate_quarter_end_dates()
+    missing_pairs = []
+    for rssd_id, cert_number in institutions:
+        for quarter_end_date in quarter_end_dates:
+            if create_sdf_filename(quarter_end_date, cert_number) not in files_in_folder:
+                missing_pairs.append((rssd_id, cert_number, quarter_end_date))
+    return missing_pairs
+
+
+# Function to download the missing sdf files of many institutions in one bounded, rate-limited job
+def schedule_institution_downloads(institutions, download_folder, max_workers=8, requests_per_second_per_host=2.0,
+                                   max_connections_per_host=4, base_url=FACSIMILE_URL):
+    manifest = open_manifest(download_folder)
+    try:
+        sync_manifest(manifest, download_folder)
+        missing_pairs = find_missing_institution_quarters(institutions, manifest)
+        total_pairs = len(institutions) * len(generate_quarter_end_dates())
+        print(f"Out of a total of {total_pairs} institution quarter(s), {len(missing_pairs)} file(s) need(s) to be downloaded.")
+        if not missing_pairs:
+            return {}
+
+        jobs = [
+            {
+                "key": f"RSSD {rssd_id} quarter end date {quarter_end_date}",
+                "url": build_facsimile_url(quarter_end_date, rssd_id, base_url),
+                "filename": create_sdf_filename(quarter_end_date, cert_number),
+            }
+            for rssd_id, cert_number, quarter_end_date in missing_pairs
+        ]
+        results = download_sdfs_http(jobs, download_folder, max_connections=max_workers,
+                                     requests_per_second=requests_per_second_per_host,
+                                     max_connections_per_host=max_connections_per_host)
+        sync_manifest(manifest, download_folder)        # Record checksums of the new files
+    finally:
+        manifest.close()
+    return {pair: results[job["key"]] for pair, job in zip(missing_pairs, jobs)}
 
 
 # Main function to orchestrate the download process
-def main():
+def main(pool_size=4, fetch_mode="selenium", max_connections=8, requests_per_second=4.0, institutions_path=None):
     download_folder = "C:\\Users\\james\\PycharmProjects\\data-analysis-portfolio\\AI & ML Projects\\inputs\\ffiec_031_sdf_files"
     if not os.path.exists(download_folder):
         os.makedirs(download_folder)
 
-    most_recent_quarter_end_date = find_most_recent_quarter_end_date(download_folder)
-    quarter_end_dates = get_quarter_end_dates_to_download(download_folder)
+    # Refresh every tracked institution in one job when a list of peers is given
+    if institutions_path:
+        institutions = read_institutions(institutions_path)
+        start_time = time.perf_counter()
+        download_results = schedule_institution_downloads(institutions, download_folder, max_workers=max_connections,
+                                                          requests_per_second_per_host=requests_per_second)
+        total_time = time.perf_counter() - start_time
+        count_downloaded = sum(downloaded for downloaded, _ in download_results.values())
+        print(f"Downloaded {count_downloaded} of {len(download_results)} file(s) for {len(institutions)} "
+              f"institution(s) in {total_time:.2f} seconds")
+        return
 
-    if quarter_end_dates:
-        for quarter_end_date in quarter_end_dates:
-            print(f"Attempting to download SDF for the quarter end date: {quarter_end_date}")
-            download_sdf(quarter_end_date, download_folder)
-    else:
-        print(f"No SDF files to download - most recent quarter-end date is: {most_recent_quarter_end_date}")
+    # Record new or changed files once; later lookups read the manifest instead of the folder
+    manifest = open_manifest(download_folder)
+    try:
+        sync_manifest(manifest, download_folder)
+        most_recent_quarter_end_date = find_most_recent_quarter_end_date(manifest)
+        quarter_end_dates = get_quarter_end_dates_to_download(manifest)
+
+        if quarter_end_dates:
+            start_time = time.perf_counter()
+            if fetch_mode == "http":
+                print(f"Attempting to download {len(quarter_end_dates)} SDF file(s) over up to {max_connections} connection(s)")
+                download_results = download_sdfs_without_browser(quarter_end_dates, download_folder,
+                                                                 max_connections, requests_per_second)
+            else:
+                print(f"Attempting to download {len(quarter_end_dates)} SDF file(s) over {pool_size} browser session(s)")
+                download_results = download_sdfs_concurrently(quarter_end_dates, download_folder, pool_size=pool_size)
+            total_time = time.perf_counter() - start_time
+            count_downloaded = sum(downloaded for downloaded, _ in download_results.values())
+            print(f"Downloaded {count_downloaded} of {len(quarter_end_dates)} file(s) in {total_time:.2f} seconds")
+            sync_manifest(manifest, download_folder)
+        else:
+            print(f"No SDF files to download - most recent quarter-end date is: {most_recent_quarter_end_date}")
+    finally:
+        manifest.close()
 
 
 # Execute the main function
@@ -1,11 +1,25 @@
 # Load packages
+import io
 import os
+import re
+import csv
+import zipfile
 import pyodbc
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List
-from sqlalchemy import create_engine
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from sqlalchemy.engine import Engine
+from ffiec031_sdf_cache import load_sdf_files_cached
+from ffiec031_excel_writer import write_excel_streaming
+from ffiec031_panel_store import PANEL_STORE_PATH, write_panel_store
+from ffiec031_panel_stats import CATEGORY_FREQUENCIES, build_mdrm_quarter_matrix, categorize_matrix_rows
+from ffiec031_sdf_manifest import SDF_FILENAME_PATTERN
+from ffiec031_value_history import CHANGED_MDRMS_PATH, record_sdf_versions, write_changed_mdrms
+from ffiec031_sql_loader import (FFIEC031_HIST_DTYPES, get_pooled_engine, stream_sql_query, upsert_ffiec031_data,
+                                 write_sql_chunks_to_parquet)
+from ffiec031_sdf_parser import clean_sdf_values, load_sdf_files_parallel
 import warnings
 warnings.filterwarnings('ignore')
 pd.set_option('display.max_rows', None)
@@ -13,65 +27,205 @@ pd.set_option('display.max_columns', 100)
 pd.set_option('display.width', 100)
 
 
-# Read in datasets from a SQL database: Deactivated - Modify code quoted below
-def read_from_sqlserver(query: str, method: str = "odbc") -> pd.DataFrame:
+# Connection settings of the SQL Server holding the FFIEC tables
+SQLSERVER_ODBC_STR = (
+    r'Driver=ODBC Driver 17 for SQL Server;'  # ODBC SQL Server drive installed in a local drive
+    r'Server=host.name.company.com,15001;'  # host name
+    r'Database=DBNAME;'  # DB name
+    r'Trusted_Connection=yes;'
+)
+SQLSERVER_ENGINE_STR = (
+    'mssql+pyodbc://host.name.company.com:15001/DBNAME'
+    '?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes'
+)
+
+
+# Function to open a raw ODBC connection for the connection pool
+def _connect_odbc() -> pyodbc.Connection:
+    return pyodbc.connect(SQLSERVER_ODBC_STR)
+
+
+# Function to get the pooled SQL Server engine of a connection method
+def get_sqlserver_engine(method: str = "alchemy") -> Engine:
+    if method == "odbc":
+        # Pool the connections built from the ODBC connection string
+        return get_pooled_engine("mssql+pyodbc://", creator=_connect_odbc)
+    return get_pooled_engine(SQLSERVER_ENGINE_STR, fast_executemany=True)
+
+
+# Read in datasets from a SQL database: Deactivated - Modify connection settings above
+def read_from_sqlserver(query: str, method: str = "odbc", chunksize: Optional[int] = None,
+                        dtype: Optional[Dict[str, str]] = None,
+                        parse_dates: Optional[List[str]] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
     """
-    Reads data from a SQL Server using either ODBC or SQLAlchemy.
+    Reads data from a SQL Server using either ODBC or SQLAlchemy, through a connection pool shared by all calls.
     Args:
         - query (str): The SQL query string.
         - method (str): The connection method to use ('odbc' or 'alchemy'). Defaults to 'odbc'.
-    Returns: pd.DataFrame: The resulting dataset as a DataFrame.
+        - chunksize (Optional[int]): Stream the result in chunks of this many rows. Defaults to reading it at once.
+        - dtype (Optional[Dict[str, str]]): Column types of the result, e.g. FFIEC031_HIST_DTYPES. Defaults to inferring them.
+        - parse_dates (Optional[List[str]]): Columns to parse as datetimes. Defaults to none.
+    Returns: Union[pd.DataFrame, Iterator[pd.DataFrame]]: The resulting dataset, or an iterator of chunks
+        when chunksize is given.
     Raises:
         ValueError: If both connection methods fail or an invalid method is provided.
     """
     if method not in ["odbc", "alchemy"]:
         raise ValueError("Invalid method. Use 'odbc' or 'alchemy'.")
 
-    if method == "odbc":
-        try:
-            conn_str = (
-                r'Driver=ODBC Driver 17 for SQL Server;'  # ODBC SQL Server drive installed in a local drive
-                r'Server=host.name.company.com,15001;'  # host name
-                r'Database=DBNAME'  # DB name
-                r'Trusted_Connection=yes;'
-            )
-            cnxn = pyodbc.connect(conn_str)
-            sqlserver_df = pd.read_sql_query(query, cnxn)
-            cnxn.close()
-        except Exception as e:
-            print(f"ODBC connection failed: {e}. Trying SQLAlchemy...")
+    if chunksize is not None:
+        return stream_sql_query(query, get_sqlserver_engine(method), chunksize, dtype, parse_dates)
 
-    if method == "alchemy":
+    for attempt in [method] + (["alchemy"] if method == "odbc" else []):
         try:
-            engine_str = (
-                'mssql+pyodbc://host.name.company.com:15001/DBNAME'
-                '?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes'
-            )
-            engine = create_engine(engine_str)
-            sqlserver_df = pd.read_sql_query(query, engine)
-            engine.dispose()
-            return sqlserver_df
+            with get_sqlserver_engine(attempt).connect() as conn:
+                return pd.read_sql_query(query, conn, dtype=dtype, parse_dates=parse_dates)
         except Exception as e:
-            print(f"SQLAlchemy connection failed: {e}")
+            if attempt == "odbc":
+                print(f"ODBC connection failed: {e}. Trying SQLAlchemy...")
+            else:
+                print(f"SQLAlchemy connection failed: {e}")
 
     raise ValueError("Both ODBC and SQLAlchemy connection failed. Check your configuration.")
 
 
+# Function to stream a SQL Server query into a Parquet file of the columnar cache
+def cache_sqlserver_query(query: str, file_path: Path, method: str = "alchemy", chunksize: int = 100000,
+                          dtype: Optional[Dict[str, str]] = FFIEC031_HIST_DTYPES,
+                          parse_dates: Optional[Sequence[str]] = ('ReportDate',)) -> int:
+    """
+    Streams a query result chunk by chunk into a Parquet file, keeping memory flat for large history tables.
+    Args:
+        query (str): The SQL query string.
+        file_path (Path): Parquet file to write.
+        method (str): The connection method to use ('odbc' or 'alchemy'). Defaults to 'alchemy'.
+        chunksize (int): Rows per chunk. Defaults to 100000.
+        dtype (Optional[Dict[str, str]]): Column types of every chunk. Defaults to the FFIEC031_HIST types.
+        parse_dates (Optional[Sequence[str]]): Columns to parse as datetimes. Defaults to 'ReportDate'.
+    Returns: int: Number of rows written.
+    """
+    chunks = read_from_sqlserver(query, method, chunksize, dtype, list(parse_dates) if parse_dates else None)
+    return write_sql_chunks_to_parquet(chunks, file_path)
+
+
+SDF_COLUMNS = ['Call Date', 'Bank RSSD Identifier', 'MDRM #', 'Value', 'Last Update',
+               'Short Definition', 'Call Schedule', 'Line Number']
+
+
+# Function to read the members of an FFIEC bulk ZIP as text streams without extracting them
+def _read_bulk_member(bulk_zip: zipfile.ZipFile, member: str) -> Iterator[List[str]]:
+    with bulk_zip.open(member) as raw_member:
+        text_member = io.TextIOWrapper(raw_member, encoding='utf-8-sig', errors='replace', newline='')
+        yield from csv.reader(text_member, delimiter='\t')
+
+
+# Function to stream SDF-layout records out of an FFIEC bulk "all schedules" ZIP for one quarter
+def stream_ffiec_bulk_zip(zip_path: Path, rssd_ids: Optional[Iterable[int]] = None,
+                          mdrm_prefixes: Optional[Tuple[str, ...]] = None) -> Iterator[tuple]:
+    """
+    Streams the schedule text files straight out of a bulk ZIP and yields one record per reported item,
+    filtering to the wanted institutions and MDRMs while parsing.
+    Args:
+        zip_path (Path): Path to an 'FFIEC CDR Call Bulk All Schedules MMDDYYYY.zip' file.
+        rssd_ids (Optional[Iterable[int]]): RSSD IDs to keep. Defaults to all institutions.
+        mdrm_prefixes (Optional[Tuple[str, ...]]): MDRM prefixes to keep, e.g. ('RCFD', 'RCON'). Defaults to all MDRMs.
+    Returns: Iterator[tuple]: Records in the SDF_COLUMNS order.
+    """
+    wanted_rssd_ids = {str(rssd_id) for rssd_id in rssd_ids} if rssd_ids is not None else None
+    call_date = int(datetime.strptime(re.search(r'(\d{8})', zip_path.name).group(1), '%m%d%Y').strftime('%Y%m%d'))
+
+    with zipfile.ZipFile(zip_path) as bulk_zip:
+        members = [member for member in bulk_zip.namelist() if member.lower().endswith('.txt')]
+
+        # The panel of reporters holds the last submission update of every institution
+        last_updates = {}
+        for member in [member for member in members if ' POR ' in member]:
+            rows = _read_bulk_member(bulk_zip, member)
+            header = next(rows)
+            rssd_col = header.index('IDRSSD')
+            update_col = next((i for i, col in enumerate(header) if col.startswith('Last Date/Time Submission')), None)
+            for row in rows:
+                if update_col is not None and len(row) > update_col and row[update_col]:
+                    last_updates[row[rssd_col]] = int(pd.Timestamp(row[update_col]).strftime('%Y%m%d'))
+
+        for member in members:
+            schedule = re.search(r'Schedule (\w+) ', member)
+            if schedule is None:
+                continue
+            rows = _read_bulk_member(bulk_zip, member)
+            header = next(rows)
+            definitions = next(rows)
+            rssd_col = header.index('IDRSSD')
+            mdrm_cols = [
+                (i, mdrm, definitions[i] if i < len(definitions) else None)
+                for i, mdrm in enumerate(header)
+                if i != rssd_col and mdrm and (mdrm_prefixes is None or mdrm.startswith(mdrm_prefixes))
+            ]
+            for row in rows:
+                rssd_id = row[rssd_col] if len(row) > rssd_col else ''
+                if wanted_rssd_ids is not None and rssd_id not in wanted_rssd_ids:
+                    continue
+                for i, mdrm, definition in mdrm_cols:
+                    value = row[i].strip() if i < len(row) else ''
+                    if value:
+                        yield (call_date, int(rssd_id), mdrm, value, last_updates.get(rssd_id),
+                               definition, schedule.group(1), None)
+
+
+# Function to load the FFIEC bulk ZIP files of every quarter into the SDF layout
+def load_ffiec_bulk_zips(bulk_dir: Path, rssd_ids: Optional[Iterable[int]] = None,
+                         mdrm_prefixes: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """
+    Streams every bulk ZIP of a folder and keeps only the filtered records in memory.
+    Args:
+        bulk_dir (Path): Folder holding the quarterly bulk ZIP files.
+        rssd_ids (Optional[Iterable[int]]): RSSD IDs to keep. Defaults to all institutions.
+        mdrm_prefixes (Optional[Tuple[str, ...]]): MDRM prefixes to keep. Defaults to all MDRMs.
+    Returns: pd.DataFrame: Historical data with the same columns as the .SDF files.
+    """
+    records = []
+    for zip_path in sorted(bulk_dir.glob("*.zip")):
+        records.extend(stream_ffiec_bulk_zip(zip_path, rssd_ids, mdrm_prefixes))
+    return pd.DataFrame.from_records(records, columns=SDF_COLUMNS)
+
+
 # Read in datasets from a local drive
-def load_ffiec031_data(rootdir: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+def load_ffiec031_data(rootdir: Path, source: str = "sdf", rssd_ids: Optional[Iterable[int]] = None,
+                       mdrm_prefixes: Optional[Tuple[str, ...]] = None, parallel: bool = False,
+                       max_workers: Optional[int] = None, use_cache: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Loads historical and static FFIEC data from specified directories.
-    Args: rootdir (Path): The root directory containing the input files.
+    Args:
+        rootdir (Path): The root directory containing the input files.
+        source (str): 'sdf' for the per-bank .SDF facsimiles or 'bulk_zip' for the FFIEC bulk ZIP files
+            in inputs/ffiec_031_bulk_files. Defaults to 'sdf'.
+        rssd_ids (Optional[Iterable[int]]): RSSD IDs to keep from the bulk ZIP files. Defaults to all.
+        mdrm_prefixes (Optional[Tuple[str, ...]]): MDRM prefixes to keep from the bulk ZIP files. Defaults to all.
+        parallel (bool): Parse the .SDF files on a process pool with an explicit dtype schema. Defaults to False.
+        max_workers (Optional[int]): Number of worker processes when parallel. Defaults to the number of CPUs.
+        use_cache (bool): Load the .SDF files through the Arrow cache in inputs/ffiec_031_sdf_cache, parsing
+            only new or changed files. Defaults to False.
     Returns:
         tuple[pd.DataFrame, pd.DataFrame]: A tuple containing:
             - hist_df (pd.DataFrame): Concatenated historical data from .SDF files.
             - static_df (pd.DataFrame): Static data from the report static CSV file.
     """
-    # Define the root directory
-    sdf_dir = rootdir / 'inputs' / 'ffiec_031_sdf_files'                                # Collect all .SDF files
-    ls_rpt_files_paths = [file for file in sdf_dir.rglob("*.SDF")]                      # Append dataframes to a list
-    ls_rpt_dfs = [pd.read_csv(file, sep=';') for file in ls_rpt_files_paths]            # Combine all dataframes into one
-    hist_df = pd.concat(ls_rpt_dfs, axis=0, ignore_index=True)
+    if source not in ["sdf", "bulk_zip"]:
+        raise ValueError("Invalid source. Use 'sdf' or 'bulk_zip'.")
+
+    if source == "bulk_zip":
+        hist_df = load_ffiec_bulk_zips(rootdir / 'inputs' / 'ffiec_031_bulk_files', rssd_ids, mdrm_prefixes)
+    else:
+        # Define the root directory
+        sdf_dir = rootdir / 'inputs' / 'ffiec_031_sdf_files'                                # Collect all .SDF files
+        ls_rpt_files_paths = [file for file in sdf_dir.rglob("*.SDF")]                      # Append dataframes to a list
+        if use_cache:
+            hist_df = load_sdf_files_cached(ls_rpt_files_paths, rootdir / 'inputs' / 'ffiec_031_sdf_cache')
+        elif parallel:
+            hist_df = load_sdf_files_parallel(ls_rpt_files_paths, max_workers=max_workers)
+        else:
+            ls_rpt_dfs = [pd.read_csv(file, sep=';') for file in ls_rpt_files_paths]        # Combine all dataframes into one
+            hist_df = pd.concat(ls_rpt_dfs, axis=0, ignore_index=True)
     static_df_path = rootdir / 'inputs' / 'FFIEC_031_AX_Report_Static_Data.csv'
     static_df = pd.read_csv(static_df_path)                                           # Load static report data
 
@@ -87,56 +241,59 @@ def process_ffiec031_sdf_files(hist_data: pd.DataFrame, static_data: pd.DataFram
         static_data (pd.DataFrame): Static data containing MDRM field names.
     Returns: pd.DataFrame: Cleaned and processed historical data.
     """
-    # Drop unnecessary columns
-    columns_to_drop = ['Bank RSSD Identifier', 'Last Update', 'Short Definition', 'Call Schedule', 'Line Number']
-    hist_df_cleaned = hist_data.drop(columns=columns_to_drop, errors='ignore')
-
-    # Remove '%' and convert 'Value' column to numeric, replacing errors with NaN
-    hist_df_cleaned['Value'] = (hist_df_cleaned['Value'].astype(str).str.rstrip('%'))       # Remove '%' character
-    hist_df_cleaned['Value'] = pd.to_numeric(hist_df_cleaned['Value'], errors='coerce')     # Coerce invalid values to NaN
-
-    # Extract MDRMs to drop
-    static_mdrms = static_data['field_name'].unique()
-    string_mdrms = hist_df_cleaned[hist_df_cleaned['Value'].apply(lambda x: isinstance(x, str))]['MDRM #'].unique()
-    text_mdrms = hist_df_cleaned[hist_df_cleaned['MDRM #'].str.contains('TEXT', na=False, regex=True)]['MDRM #'].unique()
-    mdrms_to_drop = set(static_mdrms).union(string_mdrms, text_mdrms)
-
-    # Filter out unwanted MDRMs and format types
-    filtered_df = hist_df_cleaned[~hist_df_cleaned['MDRM #'].isin(mdrms_to_drop)]
-    filtered_df['Value'] = pd.to_numeric(filtered_df['Value'], errors='coerce')
-    filtered_df['Call Date'] = pd.to_datetime(filtered_df['Call Date'], format='%Y%m%d')
+    # Convert the parsed values and flag the static and TEXT MDRMs, vectorised over the whole column
+    values, drop_mask = clean_sdf_values(hist_data['Value'], hist_data['MDRM #'], static_data['field_name'].unique())
+    # Rows without a call date cannot be placed in a quarter
+    call_date_values = hist_data['Call Date']
+    keep_mask = ~drop_mask & call_date_values.notna().to_numpy()
+
+    # Parse each distinct call date once
+    date_codes, call_dates = pd.factorize(call_date_values.to_numpy(dtype=np.int64, na_value=0)[keep_mask])
+    filtered_df = pd.DataFrame({
+        'Call Date': pd.to_datetime(pd.Index(call_dates).astype(str), format='%Y%m%d').to_numpy()[date_codes],
+        'MDRM #': hist_data['MDRM #'].to_numpy()[keep_mask],
+        'Value': values[keep_mask],
+    })
 
     # Prepare unique report dates
-    report_dates = pd.DataFrame(
-        pd.to_datetime(hist_data['Call Date'].unique(), format='%Y%m%d', errors='coerce'),
-        columns=['ReportDate']
+    report_dates = pd.Series(
+        pd.to_datetime(pd.Index(call_date_values.dropna().unique()).astype(str), format='%Y%m%d', errors='coerce'),
+        name='ReportDate'
     ).dropna()
 
-    # Extract and process MDRMs
-    mdrm_dfs = []
-    for mdrm in filtered_df['MDRM #'].unique():
-        mdrm_df = (
-            report_dates
-            .merge(filtered_df[filtered_df['MDRM #'] == mdrm],
-                   left_on='ReportDate', right_on='Call Date', how='outer')
-        )
-        mdrm_df['MDRM #'] = mdrm_df['MDRM #'].fillna(mdrm)
-        mdrm_df.drop(columns=['Call Date'], inplace=True)
-        mdrm_dfs.append(mdrm_df)
-
-    # Combine all MDRM dataframes
-    final_df = (
-        pd.concat(mdrm_dfs, ignore_index=True)
-        .rename(columns={'MDRM #': 'MDRM'})
-        .sort_values(by=['MDRM', 'ReportDate'])
-        .reset_index(drop=True)
-    )
+    # Fill every MDRM out to every report date in one pass
+    final_df = densify_mdrm_report_dates(filtered_df, report_dates)
 
     return final_df
 
 
+# Function to build the full MDRM x ReportDate grid of values in a single pass
+def densify_mdrm_report_dates(filtered_data: pd.DataFrame, report_dates: pd.Series) -> pd.DataFrame:
+    """
+    Expands the reported values to one row per MDRM and report date, leaving unreported quarters as NaN.
+    Args:
+        filtered_data (pd.DataFrame): Reported values with 'Call Date' (datetime), 'MDRM #' and 'Value' columns.
+        report_dates (pd.Series): Report dates every MDRM should have a row for.
+    Returns: pd.DataFrame: 'ReportDate', 'MDRM' and 'Value' columns sorted by MDRM and report date.
+    """
+    mdrms = np.sort(np.asarray(filtered_data['MDRM #'].unique(), dtype=object))
+    dates = np.sort(report_dates.unique())
+    grid = pd.MultiIndex.from_product([mdrms, dates], names=['MDRM', 'ReportDate']).to_frame(index=False)
+
+    observed = pd.DataFrame({
+        'MDRM': filtered_data['MDRM #'].to_numpy(dtype=object),
+        'ReportDate': filtered_data['Call Date'].to_numpy(),
+        'Value': filtered_data['Value'].to_numpy(),
+    })
+
+    # A left merge keeps the grid order, so the result is already sorted by MDRM and report date
+    final_df = grid.merge(observed, on=['MDRM', 'ReportDate'], how='left')
+
+    return final_df[['ReportDate', 'MDRM', 'Value']]
+
+
 # Function to categorize MDRMs based on reporting frequency
-def categorize_mdrms(proc_data: pd.DataFrame) -> Dict[str, List[str]]:
+def categorize_mdrms(proc_data: pd.DataFrame, prior_totals: Optional[pd.Series] = None) -> Dict[str, List[str]]:
     """
         Categorizes MDRMs (Micro Data Reference Manual items) based on their reporting
         patterns and values across recent reporting periods.
@@ -145,111 +302,45 @@ def categorize_mdrms(proc_data: pd.DataFrame) -> Dict[str, List[str]]:
                 - 'MDRM': Unique identifier for each MDRM.
                 - 'ReportDate': Date of the report.
                 - 'Value': Numeric value associated with the MDRM for the given report date.
+            prior_totals (Optional[pd.Series]): Sum of every value before the latest report date, indexed
+                by MDRM. When given, proc_data only needs to hold the latest 9 report dates. Defaults to
+                summing the values of proc_data.
         Returns:
             Dict[str, List[str]]: A dictionary with keys representing reporting categories,
             and values being lists of MDRMs that fall into each category.
     """
-    # Extract unique report dates
-    unique_dates = sorted(proc_data['ReportDate'].unique(), reverse=True)
-
-    # Filter report dates by frequency
-    current_report_date = unique_dates[0]
-    recent_8quarters = unique_dates[1:9]
-    semi_annual_dates = [date for date in recent_8quarters if date.month in [6, 12]]
-    annual_dates = [date for date in recent_8quarters if date.month == 12]
-
-    # Filter historical data
-    proc_data_wo_current = proc_data[proc_data['ReportDate'] != current_report_date]
-
-    # Initialize MDRM lists
-    zero_quarter_mdrms = []
-    zero_quarter_novalue_mdrms = []
-    zero_semi_annual_mdrms = []
-    zero_annual_mdrms = []
-    nonzero_annual_mdrms = []
-    nonzero_semi_annual_mdrms = []
-    nonzero_quarter_mdrms = []
-    proc_mdrms = proc_data_wo_current['MDRM'].unique()
-
-    # Classify MDRMs into MDRM lists
-    for mdrm in proc_mdrms:
-        mdrm_data = proc_data_wo_current[proc_data_wo_current['MDRM'] == mdrm]
-        total_value = mdrm_data['Value'].sum(skipna=True)
-
-        recent_8quarter_data = mdrm_data[mdrm_data['ReportDate'].isin(recent_8quarters)]
-        recent_8quarter_value = recent_8quarter_data['Value'].sum(skipna=True)
-
-        # Process zero balance MDRMs
-        if total_value == 0 or recent_8quarter_value == 0:
-
-            zero_values = recent_8quarter_data['Value']
-            semi_annual_data = recent_8quarter_data[recent_8quarter_data['ReportDate'].isin(semi_annual_dates)].dropna()
-            annual_data = recent_8quarter_data[recent_8quarter_data['ReportDate'].isin(annual_dates)].dropna()
-
-            if zero_values.isna().any():
-                missing_count = zero_values.isna().sum()
-                if missing_count == 6 and len(annual_data.loc[annual_data['Value'] == 0]) == 2:
-                    zero_annual_mdrms.append(mdrm)
-                elif missing_count == 4 and len(semi_annual_data.loc[semi_annual_data['Value'] == 0]) == 4:
-                    zero_semi_annual_mdrms.append(mdrm)
-                else:
-                    zero_quarter_novalue_mdrms.append(mdrm)
-            else:
-                zero_quarter_mdrms.append(mdrm)
-
-        # Process non-zero balance MDRMs
-        else:
-            non_zero_values = recent_8quarter_data['Value'].dropna()
-            if len(non_zero_values) == 8 and non_zero_values.iloc[-1] == 0:
-                zero_quarter_mdrms.append(mdrm)
-            else:
-                if len(non_zero_values) == 2:
-                    nonzero_annual_mdrms.append(mdrm)
-                elif len(non_zero_values) == 4:
-                    nonzero_semi_annual_mdrms.append(mdrm)
-                else:
-                    nonzero_quarter_mdrms.append(mdrm)
+    mdrms, report_dates, values, present = build_mdrm_quarter_matrix(proc_data)
+    total_value = None if prior_totals is None else prior_totals.reindex(mdrms).fillna(0).to_numpy(dtype=float)
+    mdrm_category, has_prior_rows = categorize_matrix_rows(values, present, report_dates, prior_totals=total_value)
 
     # Categorize MDRMs
     mdrm_categories = {
-        "zero_quarter": zero_quarter_mdrms,
-        "zero_quarter_novalue": zero_quarter_novalue_mdrms,
-        "zero_semi_annual": zero_semi_annual_mdrms,
-        "zero_annual": zero_annual_mdrms,
-        "nonzero_quarter": nonzero_quarter_mdrms,
-        "nonzero_semi_annual": nonzero_semi_annual_mdrms,
-        "nonzero_annual": nonzero_annual_mdrms,
+        category: mdrms[has_prior_rows & (mdrm_category == category)].tolist()
+        for category in CATEGORY_FREQUENCIES
     }
 
     return mdrm_categories
 
 
 # Function to generate metadata for line items
-def generate_lineitem_metadata(hist_data: pd.DataFrame, proc_data: pd.DataFrame) -> pd.DataFrame:
+def generate_lineitem_metadata(hist_data: pd.DataFrame, proc_data: pd.DataFrame,
+                               prior_totals: Optional[pd.Series] = None) -> pd.DataFrame:
     """
         Generates metadata for line items by combining historical MDRM data with
         processed categorization results to assign reporting frequencies.
         Args:
             hist_data (pd.DataFrame): Historical MDRM data.
             proc_data (pd.DataFrame): Processed data used to categorize MDRMs.
+            prior_totals (Optional[pd.Series]): Passed on to categorize_mdrms. Defaults to None.
         Returns:
             pd.DataFrame: A DataFrame containing metadata for each MDRM.
     """
     # Get MDRM categories
-    mdrm_categories = categorize_mdrms(proc_data)
+    mdrm_categories = categorize_mdrms(proc_data, prior_totals)
 
     # Define reporting frequency categories
     def define_reporting_frequency(category: str) -> str:
-        frequency_map = {
-            'zero_quarter': 'Quarterly with Zeros',
-            'zero_quarter_novalue': 'Quarterly - Not Reported',
-            'zero_semi_annual': 'Semi-Annually with Zeros',
-            'zero_annual': 'Annually with Zeros',
-            'nonzero_quarter': 'Quarterly with Non-zeros',
-            'nonzero_semi_annual': 'Semi-Annually with Non-zeros',
-            'nonzero_annual': 'Annually with Non-zeros',
-        }
-        return frequency_map.get(category, 'Not Reported')
+        return CATEGORY_FREQUENCIES.get(category, 'Not Reported')
 
     # Filter and rename columns
     hist_data_filtered = hist_data[['MDRM #', 'Call Schedule', 'Line Number', 'Short Definition']].rename(
@@ -274,6 +365,41 @@ def generate_lineitem_metadata(hist_data: pd.DataFrame, proc_data: pd.DataFrame)
     return hist_data_unique
 
 
+# Function to re-classify only the MDRMs whose values changed since the previous run
+def update_lineitem_metadata(hist_data: pd.DataFrame, proc_data: pd.DataFrame, changed_mdrms: Iterable[str],
+                             frequency_path: Path) -> pd.DataFrame:
+    """
+    Keeps the ReportingFrequency of the previous run for MDRMs without new, amended or removed values.
+    Every MDRM is classified again on the first run and whenever the latest report date moved, because
+    that moves the 8-quarter window of every MDRM.
+    Args:
+        hist_data (pd.DataFrame): Historical MDRM data.
+        proc_data (pd.DataFrame): Processed data used to categorize MDRMs.
+        changed_mdrms (Iterable[str]): MDRMs with changed values, from record_sdf_versions.
+        frequency_path (Path): Parquet file keeping the reporting frequencies between runs.
+    Returns: pd.DataFrame: A DataFrame containing metadata for each MDRM, like generate_lineitem_metadata.
+    """
+    latest_date = proc_data['ReportDate'].max()
+    previous = pd.read_parquet(frequency_path) if frequency_path.exists() else pd.DataFrame()
+    if previous.empty or previous['ClassifiedAsOf'].iloc[0] != latest_date:
+        linemeta_df = generate_lineitem_metadata(hist_data, proc_data)
+        reclassified = proc_data['MDRM'].nunique()
+    else:
+        prev_frequency = previous.set_index('MDRM')['ReportingFrequency']
+        reclassify = set(changed_mdrms) | (set(proc_data['MDRM'].unique()) - set(prev_frequency.index))
+        linemeta_df = generate_lineitem_metadata(hist_data, proc_data[proc_data['MDRM'].isin(reclassify)])
+        kept = ~linemeta_df['MDRM'].isin(reclassify) & linemeta_df['MDRM'].isin(prev_frequency.index)
+        linemeta_df.loc[kept, 'ReportingFrequency'] = linemeta_df.loc[kept, 'MDRM'].map(prev_frequency)
+        reclassified = len(reclassify)
+
+    frequency_path.parent.mkdir(parents=True, exist_ok=True)
+    linemeta_df[['MDRM', 'ReportingFrequency']].astype(object).assign(ClassifiedAsOf=latest_date).to_parquet(
+        frequency_path, index=False
+    )
+    print(f"Classified {reclassified} MDRM(s); kept the reporting frequency of the others.")
+    return linemeta_df
+
+
 # Connect to SQL Server with Open Database Connectivity (ODBC)
 def upload_ffiec031_data_to_sqlserver(proc_data):
     """
@@ -281,21 +407,17 @@ def upload_ffiec031_data_to_sqlserver(proc_data):
     Args: proc_data (pd.DataFrame): The processed data to be uploaded to SQL Server.
     Returns:None
     """
-    # Connection string for SQLAlchemy (if defined above, can be deleted)
-    engine_str = (
-        'mssql+pyodbc://host.name.company.com:15001/DBNAME'
-        '?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes'
-    )
-    engine = create_engine(engine_str)
-
-    # Output final historical data into Audit SQL Dev server (overwrite the table)
-    proc_data.to_sql(
-        name='FFIEC031_HIST',       # Table name
-        con=engine,                 # Database connection
-        schema='dbo',               # Schema name
-        if_exists='replace',        # Overwrite the table (use 'append' to add rows)
-        index=False                 # Don't include the index as a column
+    # Pooled SQLAlchemy engine with fast_executemany batches
+    engine = get_sqlserver_engine("alchemy")
+
+    # Bulk load into a staging table and merge into the Audit SQL Dev server table (only new or changed rows)
+    changed_rows = upsert_ffiec031_data(
+        proc_data,
+        engine,
+        table_name='FFIEC031_HIST',     # Table name
+        schema='dbo',                   # Schema name
     )
+    print(f"{changed_rows} row(s) of FFIEC031_HIST were inserted or updated.")
 
     # Write log files for table updates in SQL Server
     # Query table metadata
@@ -340,33 +462,242 @@ def create_output_folder() -> Path:
 
 def save_dataframe_to_excel(dataframe: pd.DataFrame, folder: Path, prefix: str, suffix: str, date_str: str):
     """
-    Saves a DataFrame to an Excel file.
+    Saves a DataFrame to an Excel file in constant memory.
+    Sheets and files are split when the data exceeds Excel's row limit.
     Args:
         dataframe (pd.DataFrame): The DataFrame to save.
         folder (Path): The folder where the file will be saved.
         prefix (str): Prefix for the file name.
         suffix (str): Suffix for the file name.
         date_str (str): Timestamp for the file name.
+    Returns: List[Path]: The saved workbooks, in order.
     """
     file_path = folder / f"{prefix}_{suffix}_{date_str}.xlsx"
-    dataframe.to_excel(file_path, index=False, engine='openpyxl')
-    print(f"File saved as: {file_path}")
+    saved_paths = write_excel_streaming({"Sheet1": dataframe}, file_path)
+    for saved_path in saved_paths:
+        print(f"File saved as: {saved_path}")
+    return saved_paths
+
+
+# Function to write processed data as one Parquet part per report date
+def write_processed_parts(proc_data: pd.DataFrame, state_dir: Path) -> None:
+    parts_dir = state_dir / "processed"
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    for report_date, part_df in proc_data.groupby('ReportDate', sort=True):
+        part_df[['ReportDate', 'MDRM', 'Value']].to_parquet(
+            parts_dir / f"part-{report_date:%Y%m%d}.parquet", index=False
+        )
+
+
+# Function to list the report dates held in the processed state
+def list_processed_report_dates(state_dir: Path) -> List[pd.Timestamp]:
+    return sorted(
+        pd.Timestamp(datetime.strptime(part_path.stem[len("part-"):], '%Y%m%d'))
+        for part_path in (state_dir / "processed").glob("part-*.parquet")
+    )
+
 
-def main():
-    """ Main function to process and save FFIEC 031 data and metadata. """
+# Function to read the latest report dates of the processed state as a dense MDRM x ReportDate frame
+def read_processed_window(state_dir: Path, mdrms: Iterable[str], num_dates: int = 9) -> pd.DataFrame:
+    """
+    Reads only the Parquet parts of the latest report dates and fills every known MDRM out to each of them.
+    Args:
+        state_dir (Path): Folder holding the processed state.
+        mdrms (Iterable[str]): Every MDRM in the processed state.
+        num_dates (int): Number of latest report dates to read. Defaults to 9 (the current quarter and
+            the 8-quarter window used by categorize_mdrms).
+    Returns: pd.DataFrame: 'ReportDate', 'MDRM' and 'Value' columns sorted by MDRM and report date.
+    """
+    window_dates = list_processed_report_dates(state_dir)[-num_dates:]
+    window_df = pd.concat(
+        [pd.read_parquet(state_dir / "processed" / f"part-{report_date:%Y%m%d}.parquet") for report_date in window_dates],
+        axis=0, ignore_index=True
+    )
+    # MDRMs first reported after an older part was written have no rows in that part
+    return _densify_known_mdrms(window_df, mdrms, window_dates)
+
+
+# Function to read every report date of the processed state as a dense MDRM x ReportDate frame
+def read_processed_state(state_dir: Path) -> pd.DataFrame:
+    mdrms = pd.read_parquet(state_dir / "prior_totals.parquet")['MDRM']
+    return read_processed_window(state_dir, mdrms, num_dates=len(list_processed_report_dates(state_dir)))
+
+
+# Function to fill a set of MDRMs out to a set of report dates from partial processed rows
+def _densify_known_mdrms(proc_rows: pd.DataFrame, mdrms: Iterable[str], report_dates: Iterable) -> pd.DataFrame:
+    grid = pd.MultiIndex.from_product(
+        [np.sort(np.asarray(list(set(mdrms)), dtype=object)), np.sort(pd.DatetimeIndex(list(report_dates)).to_numpy())],
+        names=['MDRM', 'ReportDate']
+    ).to_frame(index=False)
+    observed = proc_rows[['MDRM', 'ReportDate', 'Value']].astype({'MDRM': object})
+    return grid.merge(observed, on=['MDRM', 'ReportDate'], how='left')[['ReportDate', 'MDRM', 'Value']]
+
+
+# Function to save the full processed data and metadata as the starting state of the incremental mode
+def initialize_processed_state(proc_data: pd.DataFrame, linemeta_data: pd.DataFrame, state_dir: Path) -> None:
+    """
+    Writes the processed data as per-quarter Parquet parts, the line item metadata, and the per-MDRM
+    total of every value before the latest report date.
+    Args:
+        proc_data (pd.DataFrame): Output of process_ffiec031_sdf_files.
+        linemeta_data (pd.DataFrame): Output of generate_lineitem_metadata.
+        state_dir (Path): Folder to hold the processed state.
+    """
+    state_dir.mkdir(parents=True, exist_ok=True)
+    write_processed_parts(proc_data, state_dir)
+    linemeta_data.astype(object).to_parquet(state_dir / "reference.parquet", index=False)
+
+    latest_date = proc_data['ReportDate'].max()
+    prior_totals = (
+        proc_data[proc_data['ReportDate'] < latest_date].astype({'MDRM': object})
+        .groupby('MDRM')['Value'].sum().reindex(proc_data['MDRM'].unique(), fill_value=0)
+    )
+    prior_totals.rename('PriorTotal').rename_axis('MDRM').reset_index().to_parquet(
+        state_dir / "prior_totals.parquet", index=False
+    )
+
+
+# Function to find the SDF files of quarters after the latest processed report date
+def find_new_sdf_files(sdf_dir: Path, latest_date: pd.Timestamp) -> List[Path]:
+    new_files = []
+    for file_path in sorted(sdf_dir.rglob("*.SDF")):
+        match = SDF_FILENAME_PATTERN.match(file_path.name)
+        if match:
+            quarter_end_date_short = match.group(2)                                 # MMDDYY
+            quarter_end_date = datetime.strptime(quarter_end_date_short, '%m%d%y')
+            if quarter_end_date > latest_date:
+                new_files.append(file_path)
+    return new_files
+
+
+# Function to append newly filed quarters to the processed state
+def append_new_quarters(root_dir: Path, state_dir: Path,
+                        value_history_path: Optional[Path] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Loads only the SDF files of quarters after the processed state, appends their rows as new parts and
+    re-categorizes the MDRMs from the latest 9 quarters and the carried-forward historical totals.
+    Args:
+        root_dir (Path): The root directory containing the input files.
+        state_dir (Path): Folder holding the processed state written by initialize_processed_state.
+        value_history_path (Optional[Path]): Value history to record the new filings in (see
+            record_sdf_versions). Defaults to not recording them.
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: A tuple containing:
+            - proc_delta (pd.DataFrame): The processed rows that were added, including NaN rows that fill
+              new MDRMs out to the earlier report dates.
+            - linemeta_delta (pd.DataFrame): Line item metadata of new MDRMs and of MDRMs whose
+              ReportingFrequency changed.
+    """
+    processed_dates = list_processed_report_dates(state_dir)
+    sdf_dir = root_dir / 'inputs' / 'ffiec_031_sdf_files'
+    new_files = find_new_sdf_files(sdf_dir, processed_dates[-1])
+    linemeta_prev = pd.read_parquet(state_dir / "reference.parquet")
+    prior_totals = pd.read_parquet(state_dir / "prior_totals.parquet").set_index('MDRM')['PriorTotal']
+    if not new_files:
+        print(f"No quarters after {processed_dates[-1]:%Y-%m-%d} to append.")
+        return pd.DataFrame(columns=['ReportDate', 'MDRM', 'Value']), linemeta_prev.iloc[0:0]
+
+    # Load and process only the new quarters; the cache keeps the fragments of the older files
+    new_hist_df = load_sdf_files_cached(new_files, root_dir / 'inputs' / 'ffiec_031_sdf_cache', prune=False)
+    static_df = pd.read_csv(root_dir / 'inputs' / 'FFIEC_031_AX_Report_Static_Data.csv')
+    new_proc_df = process_ffiec031_sdf_files(new_hist_df, static_df)
+    new_dates = sorted(new_proc_df['ReportDate'].unique())
+    if value_history_path is not None:
+        record_sdf_versions(new_hist_df, value_history_path)
+
+    known_mdrms = set(prior_totals.index)
+    new_mdrms = set(new_proc_df['MDRM']) - known_mdrms
+    all_mdrms = known_mdrms | new_mdrms
+
+    # Roll the historical totals forward: the previous latest quarter and all but the newest new quarter
+    # now lie before the latest report date
+    rolled_rows = pd.concat([
+        read_processed_window(state_dir, known_mdrms, num_dates=1),
+        new_proc_df[new_proc_df['ReportDate'] < new_dates[-1]],
+    ], axis=0, ignore_index=True).astype({'MDRM': object})
+    prior_totals = prior_totals.reindex(sorted(all_mdrms), fill_value=0).add(
+        rolled_rows.groupby('MDRM')['Value'].sum(), fill_value=0
+    ).rename('PriorTotal').rename_axis('MDRM')
+
+    # Append the new quarters as parts holding every known MDRM
+    new_parts_df = _densify_known_mdrms(new_proc_df, all_mdrms, new_dates)
+    write_processed_parts(new_parts_df, state_dir)
+    backfill_df = _densify_known_mdrms(new_proc_df.iloc[0:0], new_mdrms, processed_dates)
+    proc_delta = pd.concat([backfill_df, new_parts_df], axis=0, ignore_index=True).sort_values(
+        ['MDRM', 'ReportDate'], ignore_index=True
+    )
+
+    # Re-categorize from the 9-quarter window; earlier metadata records come first so groupby-first keeps them
+    window_df = read_processed_window(state_dir, all_mdrms)
+    hist_for_metadata = pd.concat([
+        linemeta_prev.rename(columns={
+            'MDRM': 'MDRM #', 'Schedule': 'Call Schedule', 'LineNumber': 'Line Number', 'Definition': 'Short Definition'
+        }),
+        new_hist_df.astype({column: object for column in ['MDRM #', 'Call Schedule', 'Line Number', 'Short Definition']}),
+    ], axis=0, ignore_index=True)
+    linemeta_df = generate_lineitem_metadata(hist_for_metadata, window_df, prior_totals)
+
+    # Keep only MDRMs that are new or whose reporting frequency changed
+    prev_frequency = linemeta_prev.set_index('MDRM')['ReportingFrequency']
+    changed = linemeta_df['ReportingFrequency'].to_numpy() != linemeta_df['MDRM'].map(prev_frequency).to_numpy()
+    linemeta_delta = linemeta_df[changed].reset_index(drop=True)
+
+    linemeta_df.astype(object).to_parquet(state_dir / "reference.parquet", index=False)
+    prior_totals.reset_index().to_parquet(state_dir / "prior_totals.parquet", index=False)
+    print(f"Appended {len(new_dates)} quarter(s) and {len(new_mdrms)} new MDRM(s); "
+          f"{len(linemeta_delta)} MDRM(s) changed reporting frequency.")
+
+    return proc_delta, linemeta_delta
+
+
+def main(incremental: bool = False, upload: bool = False):
+    """
+    Main function to process and save FFIEC 031 data and metadata.
+    Args:
+        incremental (bool): Append only quarters newer than outputs/ffiec031_state and save the changed rows.
+            The first incremental run builds the state from the full history. Defaults to False.
+        upload (bool): Upsert the changed rows into FFIEC031_HIST on SQL Server (see
+            upload_ffiec031_data_to_sqlserver); needs the connection settings above. Defaults to False.
+    """
     try:
         # Initialize paths and configurations
         root_dir = Path.cwd()
         today_date = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
         output_folder = create_output_folder()
+        state_dir = output_folder / "ffiec031_state"
+
+        # Incremental mode: append new quarters to the saved state and save only the delta
+        if incremental and list_processed_report_dates(state_dir):
+            proc_delta_df, linemeta_delta_df = append_new_quarters(
+                root_dir, state_dir, output_folder / "ffiec031_value_history.sqlite"
+            )
+            save_dataframe_to_excel(proc_delta_df, output_folder, "FFIEC031", "Processed_Delta", today_date)
+            save_dataframe_to_excel(linemeta_delta_df, output_folder, "FFIEC031", "Reference_Delta", today_date)
+            write_changed_mdrms(proc_delta_df['MDRM'], root_dir / CHANGED_MDRMS_PATH)
+            if upload and not proc_delta_df.empty:
+                upload_ffiec031_data_to_sqlserver(proc_delta_df)
+            # Keep the panel in step with the appended state for the trend analysis and time series models
+            if not proc_delta_df.empty or not (root_dir / PANEL_STORE_PATH).exists():
+                write_panel_store(read_processed_state(state_dir), root_dir / PANEL_STORE_PATH)
+                print(f"File saved as: {root_dir / PANEL_STORE_PATH}")
+            print("All operations completed successfully!")
+            return
 
         # Load and process data
-        hist_df, static_df = load_ffiec031_data(root_dir)
+        hist_df, static_df = load_ffiec031_data(root_dir, use_cache=True)
         proc_df = process_ffiec031_sdf_files(hist_df, static_df)
-        linemeta_df = generate_lineitem_metadata(hist_df, proc_df)
+
+        # Record new and amended filings by 'Last Update'; only these series are re-classified and re-uploaded
+        changes_df = record_sdf_versions(hist_df, output_folder / "ffiec031_value_history.sqlite")
+        changed_mdrms = set(changes_df['mdrm'])
+        write_changed_mdrms(changed_mdrms, root_dir / CHANGED_MDRMS_PATH)
+        linemeta_df = update_lineitem_metadata(hist_df, proc_df, changed_mdrms,
+                                               output_folder / "ffiec031_reporting_frequencies.parquet")
+        if incremental:
+            initialize_processed_state(proc_df, linemeta_df, state_dir)
 
         # Define output file names
-        save_dataframe_to_excel(
+        proc_paths = save_dataframe_to_excel(
             dataframe=proc_df,
             folder=output_folder,
             prefix="FFIEC031",
@@ -381,9 +712,14 @@ def main():
             date_str=today_date
         )
 
-        # Optional: SQL Server upload (deactivated)
-        # Uncomment and configure when ready
-        # upload_ffiec031_data_to_sqlserver(proc_df)
+        # Memory-mapped MDRM x ReportDate panel for the trend analysis and time series models; it records the
+        # processed workbook so script 02 can tell whether inputs/FFIEC_031_Processed.xlsx is a copy of it
+        write_panel_store(proc_df, root_dir / PANEL_STORE_PATH, source_path=proc_paths[0])
+        print(f"File saved as: {root_dir / PANEL_STORE_PATH}")
+
+        # Optional: SQL Server upload of the changed series, staged and merged so unchanged rows are not touched
+        if upload and changed_mdrms:
+            upload_ffiec031_data_to_sqlserver(proc_df[proc_df['MDRM'].isin(changed_mdrms)])
 
         print("All operations completed successfully!")
 
@@ -1,11 +1,21 @@
 # Load packages
 import os
+import tempfile
 import pandas as pd
 import numpy as np
-from scipy.stats import shapiro
 import functools as ft
 from pathlib import Path
 from datetime import datetime
+from typing import Iterable, Optional
+from ffiec031_backtest import backtest_ffiec031_flags, count_backtest_flags_by_quarter, summarize_backtest_flags
+from ffiec031_excel_cache import read_excel_cached
+from ffiec031_excel_writer import write_excel_streaming
+from ffiec031_panel_store import PANEL_STORE_PATH, open_panel_store, panel_matches_source, panel_store_to_frame
+from ffiec031_normality import group_series, run_shapiro_wilk_tests
+from ffiec031_panel_stats import (build_mdrm_quarter_matrix, classify_reporting_frequencies, compute_outlier_scores,
+                                  grouped_window_stats, select_frequency_windows)
+from ffiec031_value_history import CHANGED_MDRMS_PATH, read_changed_mdrms
+from ffiec031_zero_balance import score_zero_balance_breaches
 import warnings
 warnings.filterwarnings("ignore")
 pd.set_option("display.max_rows", None)
@@ -20,11 +30,45 @@ pd.set_option("display.width", 100)
 
 
 # Read in datasets from a local driver
-rootdir = Path.cwd()
-file_path_processed = rootdir / "inputs" / "FFIEC_031_Processed.xlsx"
-file_path_reference = rootdir / "inputs" / "FFIEC_031_Reference.xlsx"
-df_processed = pd.read_excel(file_path_processed)
-df_reference = pd.read_excel(file_path_reference)
+# p-values kept between runs by perform_ffiec031_trend_analysis and perform_ffiec031_backtest, relative to
+# the working directory; the analysis functions only use a cache file when they are given one
+NORMALITY_CACHE_PATH = Path("outputs") / "ffiec031_normality_cache.sqlite"
+# Outlier scores kept between runs, so only the MDRMs changed by script 01 are scored again
+OUTLIER_SCORES_PATH = Path("outputs") / "ffiec031_outlier_scores.parquet"
+
+
+# Function to load the processed data from the panel store or the workbook's Parquet sidecar
+def load_processed_data(root_dir: Optional[Path] = None) -> pd.DataFrame:
+    """
+    Prefers the memory-mapped panel written by script 01 while inputs/FFIEC_031_Processed.xlsx is the
+    workbook saved with it, compared by mtime and size and else by SHA-256 (see panel_matches_source).
+    Panels without a recorded workbook (incremental runs, older panels) are used if saved after the
+    workbook. Otherwise the workbook is read through its Parquet sidecar (see ffiec031_excel_cache), so
+    Excel is parsed only when it changed.
+    Args: root_dir (Optional[Path]): Folder holding inputs/ and outputs/. Defaults to the working directory.
+    Returns: pd.DataFrame: Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+    """
+    root_dir = Path(root_dir or Path.cwd())
+    file_path_processed = root_dir / "inputs" / "FFIEC_031_Processed.xlsx"
+    file_path_panel = root_dir / PANEL_STORE_PATH
+    if file_path_panel.exists():
+        if not file_path_processed.exists():
+            return panel_store_to_frame(open_panel_store(file_path_panel))
+        matches_source = panel_matches_source(file_path_panel, file_path_processed)
+        if matches_source is None:
+            matches_source = file_path_panel.stat().st_mtime >= file_path_processed.stat().st_mtime
+        if matches_source:
+            return panel_store_to_frame(open_panel_store(file_path_panel))
+    return read_excel_cached(file_path_processed)
+
+
+# Function to load the reference data from the workbook's Parquet sidecar
+def load_reference_data(root_dir: Optional[Path] = None) -> pd.DataFrame:
+    """
+    Args: root_dir (Optional[Path]): Folder holding inputs/. Defaults to the working directory.
+    Returns: pd.DataFrame: Reference data with 'MDRM' and 'ReportingFrequency' columns.
+    """
+    return read_excel_cached(Path(root_dir or Path.cwd()) / "inputs" / "FFIEC_031_Reference.xlsx")
 
 
 # Perform zero/non-zero balance analysis
@@ -39,48 +83,11 @@ def perform_zero_balance_analysis(proc_data: pd.DataFrame, ref_data: pd.DataFram
     """
     current_report_date = proc_data["ReportDate"].max()
     proc_data_current = proc_data[proc_data["ReportDate"] == current_report_date]
-    proc_data_current_freq = proc_data_current.merge(ref_data[["MDRM", "ReportingFrequency"]], on="MDRM", how="left")
-
-    def check_zero_balance_breached(row):
-        freq = row["ReportingFrequency"]
-        value = row["Value"]
-        month = row["ReportDate"].month
-
-        if freq == "Quarterly with Zeros":
-            return "Yes" if value != 0 or pd.isna(value) else "No"
-
-        if freq == "Quarterly - Not Reported":
-            return "Yes" if not pd.isna(value) else "No"
-
-        if freq == "Semi-Annually with Zeros":
-            if month in [6, 12]:
-                return "Yes" if value != 0 or pd.isna(value) else "No"
-            return "Yes" if not pd.isna(value) else "No"
-
-        if freq == "Annually with Zeros":
-            if month == 12:
-                return "Yes" if value != 0 or pd.isna(value) else "No"
-            return "Yes" if not pd.isna(value) else "No"
 
-        if freq == "Quarterly with Non-zeros":
-            return "Yes" if value == 0 or pd.isna(value) else "No"
+    # One vectorised pass over the rule table in ffiec031_zero_balance instead of a Python call per row
+    proc_data_current_freq = score_zero_balance_breaches(proc_data_current, ref_data)
 
-        if freq == "Semi-Annually with Non-zeros":
-            if month in [6, 12]:
-                return "Yes" if value == 0 or pd.isna(value) else "No"
-            return "Yes" if not pd.isna(value) else "No"
-
-        if freq == "Annually with Non-zeros":
-            if month == 12:
-                return "Yes" if value == 0 or pd.isna(value) else "No"
-            return "Yes" if not pd.isna(value) else "No"
-
-        return "No"
-
-    proc_data_current_freq["ZeroBalance_Breached"] = proc_data_current_freq.apply(check_zero_balance_breached, axis=1)
-    proc_data_current_freq = proc_data_current_freq.drop("ReportingFrequency", axis=1)
-
-    return proc_data_current_freq[["MDRM", "ZeroBalance_Breached"]]
+    return proc_data_current_freq[["MDRM", "ZeroBalance_Breached"]].reset_index(drop=True)
 
 
 # Perform variance analysis
@@ -119,127 +126,156 @@ def perform_variance_analysis(proc_data: pd.DataFrame) -> pd.DataFrame:
 
 
 # Function to perform Shapiro-Wilk normality test per MDRM
-def perform_shapiro_wilk_test(proc_data: pd.DataFrame) -> pd.DataFrame:
-
+def perform_shapiro_wilk_test(proc_data: pd.DataFrame, cache_path: Optional[Path] = None,
+                              max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Tests the prior-period values of every MDRM for normality. The series are grouped in one pass and only
+    series whose history changed since the last run are re-tested (see ffiec031_normality).
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        cache_path (Optional[Path]): SQLite cache of p-values, e.g. NORMALITY_CACHE_PATH. Defaults to no file.
+        max_workers (Optional[int]): Worker processes for the tests. Defaults to the number of CPUs.
+    Returns: pd.DataFrame: 'MDRM', 'SW_pval' and 'Normality' columns.
+    """
     current_report_date = proc_data["ReportDate"].max()
     proc_data_prior = proc_data[proc_data["ReportDate"] != current_report_date]
-    unique_mdrms = proc_data_prior['MDRM'].unique()
-
-    sw_test = []
-    sw_test.append(["MDRM", "SW_pval", "Normality"])
-    for mdrm in unique_mdrms:
-        mdrm_value = proc_data_prior.loc[proc_data_prior["MDRM"] == mdrm, "Value"].dropna()
-        if len(mdrm_value) >= 3:
-            mdrm_sw_pvalue = round(shapiro(mdrm_value).pvalue, 4)
-            normality = "No" if mdrm_sw_pvalue < 0.05 else "Yes"
-        else:
-            mdrm_sw_pvalue = float("NaN")
-            normality = "Insufficient Data"
-        sw_test.append([mdrm, mdrm_sw_pvalue, normality])
-    sw_test_result = pd.DataFrame(sw_test[1:], columns=sw_test[0])
+    unique_mdrms, mdrm_series = group_series(proc_data_prior["MDRM"], proc_data_prior["Value"], proc_data_prior["ReportDate"])
+    sw_pvalues = run_shapiro_wilk_tests(mdrm_series, cache_path, max_workers)
+
+    sufficient = np.array([len(values) >= 3 for values in mdrm_series], dtype=bool)
+    sw_test_result = pd.DataFrame({
+        "MDRM": unique_mdrms,
+        "SW_pval": [round(pvalue, 4) if enough else float("NaN") for pvalue, enough in zip(sw_pvalues, sufficient)],
+    })
+    sw_test_result["Normality"] = np.select(
+        [~sufficient, sw_test_result["SW_pval"] < 0.05], ["Insufficient Data", "No"], default="Yes"
+    )
 
     return sw_test_result
 
 
 # Function to calculate standard or robust z-scores to detect outliers
-def perform_outlier_detection(proc_data: pd.DataFrame, ref_data: pd.DataFrame) -> pd.DataFrame:
-    # Helper Functions
-    def categorize_mdrms(ref_data):
-        """Categorize MDRMs based on their reporting frequency."""
-        categories = {"quarterly": [], "semi_annual": [], "annual": [], "non_reporting": []}
-        for idx, row in ref_data.iterrows():
-            if row["ReportingFrequency"].startswith("Quarterly with"):
-                categories["quarterly"].append(row["MDRM"])
-            elif row["ReportingFrequency"].startswith("Semi-Annually"):
-                categories["semi_annual"].append(row["MDRM"])
-            elif row["ReportingFrequency"].startswith("Annually"):
-                categories["annual"].append(row["MDRM"])
-            else:
-                categories["non_reporting"].append(row["MDRM"])
-        return categories
-
-    def extract_recent_periods(proc_data, num_quarters=12):
-        """Extract relevant report dates for quarterly, semi-annual, and annual categories."""
-        unique_dates = sorted(proc_data["ReportDate"].unique(), reverse=True)
-        quarter_dates = unique_dates[1:num_quarters + 1]
-        semi_annual_dates = [d for d in proc_data["ReportDate"] if d.month in [6, 12]][-10:]
-        annual_dates = [d for d in proc_data["ReportDate"] if d.month == 12][-10:]
-        return quarter_dates, semi_annual_dates, annual_dates
-
-    def identify_outliers(proc_data_prior, proc_data_current, sw_result, normal_mdrms, notnormal_mdrms):
-        """Calculate z-scores for normal and non-normal MDRMs."""
-        # Process normal MDRMs
-        normal = proc_data_prior[proc_data_prior["MDRM"].isin(normal_mdrms)].dropna()
-        normal_avgstd = (normal.groupby("MDRM")["Value"]
-                         .agg(["mean", "std"])
-                         .reset_index()
-                         .rename(columns={"mean": "Value_mean", "std": "Value_std"}))
-
-        # Process non-normal MDRMs
-        not_normal = proc_data_prior[proc_data_prior["MDRM"].isin(notnormal_mdrms)].dropna()
-        not_normal["Value_absdev"] = abs(not_normal["Value"] - not_normal["Value"].median())
-        not_normal_median_mad = (not_normal.groupby("MDRM")
-                                 .agg(Value_median=("Value", "median"),
-                                      Value_mad=("Value_absdev", "median"))
-                                 .reset_index())
-
-        # Merge all components
-        zscore_data = ft.reduce(
-            lambda left, right: pd.merge(left, right, on="MDRM", how="left"),
-            [proc_data_current,
-             sw_result[["MDRM", "Normality"]],
-             normal_avgstd,
-             not_normal_median_mad]
-        )
-
-        # Calculate Outlier Scores
-        def calculate_zscores(row):
-            if row["Normality"] == "Yes":
-                return (row["Value"] - row["Value_mean"]) / row["Value_std"] if row["Value_std"] > 0 else 0
-            elif row["Normality"] == "No":
-                return 0.6745 * (row["Value"] - row["Value_median"]) / row["Value_mad"] if row["Value_mad"] > 0 else 0
-            return 0
-
-        zscore_data["OutlierScore"] = zscore_data.apply(calculate_zscores, axis=1)
-        zscore_data["Outlier"] = np.where(zscore_data["OutlierScore"].abs() > 3, "Yes", "No")
-
-        return zscore_data
-
-    # Main Workflow
-    sw_result = perform_shapiro_wilk_test(proc_data)
-    proc_data_current = proc_data[proc_data["ReportDate"] == proc_data["ReportDate"].max()]
-    proc_data_prior = proc_data[proc_data["ReportDate"] != proc_data["ReportDate"].max()]
-
-    # Process normality categories
-    normal_mdrms = sw_result.loc[sw_result["Normality"] == "Yes", "MDRM"]
-    notnormal_mdrms = sw_result.loc[sw_result["Normality"] == "No", "MDRM"]
-
-    # Categorize MDRMs
-    mdrm_categories = categorize_mdrms(ref_data)
-    quarter_dates, semi_annual_dates, annual_dates = extract_recent_periods(proc_data)
-
-    # Filter prior data by frequency
-    prior_quarter = proc_data_prior[proc_data_prior["MDRM"].isin(mdrm_categories["quarterly"])]
-    prior_12qtrs = prior_quarter[prior_quarter["ReportDate"].isin(quarter_dates)]
-
-    prior_semi_annual = proc_data_prior[proc_data_prior["MDRM"].isin(mdrm_categories["semi_annual"])]
-    prior_semi_annual_5yrs = prior_semi_annual[prior_semi_annual["ReportDate"].isin(semi_annual_dates)]
-
-    prior_annual = proc_data_prior[proc_data_prior["MDRM"].isin(mdrm_categories["annual"])]
-    prior_annual_10yrs = prior_annual[prior_annual["ReportDate"].isin(annual_dates)]
+def perform_outlier_detection(proc_data: pd.DataFrame, ref_data: pd.DataFrame,
+                              sw_result: Optional[pd.DataFrame] = None,
+                              mdrms: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Scores the current value of every MDRM against its own window of prior values: the last 12 quarters
+    for quarterly items, the last 10 June/December filings for semi-annual items, the last 10 December
+    filings for annual items and the full history otherwise. Normal MDRMs get a standard z-score and
+    non-normal MDRMs a robust z-score from their own median and MAD (see ffiec031_panel_stats).
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        ref_data (pd.DataFrame): Reference data with 'MDRM' and 'ReportingFrequency' columns.
+        sw_result (Optional[pd.DataFrame]): Output of perform_shapiro_wilk_test. Defaults to running it.
+        mdrms (Optional[Iterable[str]]): MDRMs to score, e.g. those with changed values. Defaults to all MDRMs.
+    Returns: pd.DataFrame: 'MDRM', 'OutlierScore' and 'Outlier' of the current rows, grouped by frequency class.
+    """
+    # Only the series of the selected MDRMs are tested and scored; the report dates stay those of all data
+    all_report_dates = np.sort(proc_data["ReportDate"].unique())
+    current_report_date = proc_data["ReportDate"].max()
+    if mdrms is not None:
+        proc_data = proc_data[proc_data["MDRM"].isin(list(mdrms))]
+        if proc_data.empty:
+            return pd.DataFrame({"MDRM": pd.Series(dtype=object), "OutlierScore": pd.Series(dtype=float),
+                                 "Outlier": pd.Series(dtype=object)})
+
+    # Reuse the normality results when the caller already has them
+    if sw_result is None:
+        sw_result = perform_shapiro_wilk_test(proc_data)
+
+    # Statistics of every MDRM over the window of its frequency class, all in one pass over the matrix
+    matrix_mdrms, report_dates, values, present = build_mdrm_quarter_matrix(proc_data, all_report_dates)
+    frequency_classes = classify_reporting_frequencies(matrix_mdrms, ref_data)
+    class_windows = select_frequency_windows(report_dates)
+    mdrm_windows = np.where((frequency_classes >= 0)[:, None], class_windows[frequency_classes], False)
+    window_stats = grouped_window_stats(values, mdrm_windows)
+    has_prior_rows = (present & mdrm_windows).any(axis=1)
+
+    normality = sw_result.drop_duplicates("MDRM").set_index("MDRM")["Normality"].reindex(matrix_mdrms).to_numpy()
+    outlier_scores = compute_outlier_scores(values[:, -1], window_stats, normality)
+
+    # Current rows of MDRMs with prior rows in their window, grouped by frequency class like before
+    proc_data_current = proc_data[proc_data["ReportDate"] == current_report_date]
+    current_rows = pd.Index(matrix_mdrms).get_indexer(proc_data_current["MDRM"])
+    current_rows = current_rows[has_prior_rows[current_rows]]
+    current_rows = current_rows[np.argsort(frequency_classes[current_rows], kind="stable")]
 
-    prior_non_reporting = proc_data_prior[proc_data_prior["MDRM"].isin(mdrm_categories["non_reporting"])]
+    prior_data_outliers = pd.DataFrame({"MDRM": matrix_mdrms[current_rows], "OutlierScore": outlier_scores[current_rows]})
+    prior_data_outliers["Outlier"] = np.where(prior_data_outliers["OutlierScore"].abs() > 3, "Yes", "No")
+    return prior_data_outliers
 
-    # Calculate z-scores for each category
-    prior_data_categories = [prior_12qtrs, prior_semi_annual_5yrs, prior_annual_10yrs, prior_non_reporting]
-    prior_data_zscores = []
-    for prior_data_category in prior_data_categories:
-        relevant_current = proc_data_current[proc_data_current["MDRM"].isin(prior_data_category["MDRM"].unique())]
-        zscore_results = identify_outliers(prior_data_category, relevant_current, sw_result, normal_mdrms, notnormal_mdrms)
-        prior_data_zscores.append(zscore_results)
 
-    prior_data_outliers = pd.concat(prior_data_zscores, axis=0, ignore_index=True)
-    return prior_data_outliers[["MDRM", "OutlierScore", "Outlier"]]
+# Function to score the changed MDRMs again and keep the outlier scores of the others
+def update_outlier_detection(proc_data: pd.DataFrame, ref_data: pd.DataFrame, sw_result: pd.DataFrame,
+                             changed_mdrms: Optional[Iterable[str]], scores_path: Path) -> pd.DataFrame:
+    """
+    Keeps the outlier scores of the previous run for MDRMs without new, amended or removed values. Every
+    MDRM is scored again on the first run and whenever the latest report date moved, because that moves
+    the window and the current value of every MDRM.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        ref_data (pd.DataFrame): Reference data with 'MDRM' and 'ReportingFrequency' columns.
+        sw_result (pd.DataFrame): Output of perform_shapiro_wilk_test for every MDRM.
+        changed_mdrms (Optional[Iterable[str]]): MDRMs with changed values, from script 01 (see
+            read_changed_mdrms). None scores every MDRM.
+        scores_path (Path): Parquet file keeping the outlier scores between runs.
+    Returns: pd.DataFrame: The output of perform_outlier_detection for every MDRM, in the same order.
+    """
+    current_report_date = proc_data["ReportDate"].max()
+    previous = pd.read_parquet(scores_path) if scores_path.exists() else pd.DataFrame()
+    if changed_mdrms is None or previous.empty or previous["ScoredAsOf"].iloc[0] != current_report_date:
+        outlier_detection = perform_outlier_detection(proc_data, ref_data, sw_result)
+        rescored = proc_data["MDRM"].nunique()
+    else:
+        rescore = set(changed_mdrms) | (set(proc_data["MDRM"].unique()) - set(previous["MDRM"]))
+        outlier_detection = pd.concat([
+            previous.loc[~previous["MDRM"].isin(rescore), ["MDRM", "OutlierScore", "Outlier"]],
+            perform_outlier_detection(proc_data, ref_data, sw_result, mdrms=rescore),
+        ], axis=0, ignore_index=True)
+        # Order of the current rows, grouped by frequency class like scoring every MDRM
+        current_mdrms = pd.Index(pd.unique(proc_data.loc[proc_data["ReportDate"] == current_report_date, "MDRM"]))
+        row_order = np.lexsort((current_mdrms.get_indexer(outlier_detection["MDRM"]),
+                                classify_reporting_frequencies(outlier_detection["MDRM"], ref_data)))
+        outlier_detection = outlier_detection.iloc[row_order].reset_index(drop=True)
+        rescored = len(rescore)
+
+    scores_path.parent.mkdir(parents=True, exist_ok=True)
+    outlier_detection.astype({"MDRM": object}).assign(ScoredAsOf=current_report_date).to_parquet(scores_path, index=False)
+    print(f"Scored {rescored} MDRM(s); kept the outlier scores of the others.")
+    return outlier_detection
+
+
+# Function to check that scoring only some MDRMs matches scoring every MDRM
+def check_changed_mdrm_scoring(proc_data: pd.DataFrame, ref_data: pd.DataFrame, changed_mdrms: Iterable[str]) -> None:
+    """
+    Scores changed_mdrms alone and compares them with the same rows of a full run. Then amends a prior value
+    of every changed MDRM and compares update_outlier_detection, which scores only those MDRMs again, with a
+    full run on the amended data.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        ref_data (pd.DataFrame): Reference data with 'MDRM' and 'ReportingFrequency' columns.
+        changed_mdrms (Iterable[str]): MDRMs to treat as changed.
+    Raises:
+        AssertionError: If the scores of a subset differ from those of a full run.
+    """
+    changed_mdrms = set(changed_mdrms)
+    sw_result = perform_shapiro_wilk_test(proc_data)
+    full_scores = perform_outlier_detection(proc_data, ref_data, sw_result)
+    subset_scores = perform_outlier_detection(proc_data, ref_data, sw_result, mdrms=changed_mdrms)
+    expected = full_scores[full_scores["MDRM"].isin(changed_mdrms)].reset_index(drop=True)
+    assert subset_scores.equals(expected), "Scoring only the changed MDRMs does not match the full run."
+
+    report_dates = np.sort(proc_data["ReportDate"].unique())
+    amended = proc_data["MDRM"].isin(changed_mdrms) & (proc_data["ReportDate"] == report_dates[-2])
+    proc_data_amended = proc_data.assign(Value=proc_data["Value"].mask(amended, proc_data["Value"] * 2 + 1))
+    sw_result_amended = perform_shapiro_wilk_test(proc_data_amended)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scores_path = Path(temp_dir) / "outlier_scores.parquet"
+        update_outlier_detection(proc_data, ref_data, sw_result, None, scores_path)
+        updated_scores = update_outlier_detection(proc_data_amended, ref_data, sw_result_amended, changed_mdrms,
+                                                  scores_path)
+    assert updated_scores.equals(perform_outlier_detection(proc_data_amended, ref_data, sw_result_amended)), \
+        "Updating the changed MDRMs does not match the full run on the amended data."
 
 
 # Create field instruction
@@ -272,11 +308,9 @@ def create_field_instruction():
 
 
 def create_excel_from_list(data, excel_file):
+    # Streamed in constant memory; "Historical Data" continues on further sheets past Excel's row limit
     sheet_names = ["Filed Instruction", "Analysis Detail", "Historical Data"]
-    with pd.ExcelWriter(excel_file, engine="xlsxwriter") as writer:
-        data[0].to_excel(writer, sheet_name=sheet_names[0], index=False)
-        data[1].to_excel(writer, sheet_name=sheet_names[1], index=False)
-        data[2].to_excel(writer, sheet_name=sheet_names[2], index=False)
+    write_excel_streaming(dict(zip(sheet_names, data)), excel_file)
 
 
 def create_output_folder():
@@ -286,14 +320,15 @@ def create_output_folder():
     return output_folder_path
 
 
-def perform_ffiec031_trend_analysis(proc_data, ref_data):
+def perform_ffiec031_trend_analysis(proc_data, ref_data, changed_mdrms=None):
     today_date = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
     output_folder = create_output_folder()
     excel_file_path = output_folder + f"FFIEC031_TrendAnalysis_Result_{today_date}.xlsx"
 
     zero_balance_analysis = perform_zero_balance_analysis(proc_data, ref_data)
     variance_analysis = perform_variance_analysis(proc_data)
-    outlier_detection = perform_outlier_detection(proc_data, ref_data)
+    sw_result = perform_shapiro_wilk_test(proc_data, cache_path=NORMALITY_CACHE_PATH)
+    outlier_detection = update_outlier_detection(proc_data, ref_data, sw_result, changed_mdrms, OUTLIER_SCORES_PATH)
     analysis_detail = ft.reduce(
         lambda left, right: pd.merge(left, right, on="MDRM", how="left"),
         [variance_analysis,
@@ -309,7 +344,32 @@ def perform_ffiec031_trend_analysis(proc_data, ref_data):
     return analysis_detail
 
 
+def perform_ffiec031_backtest(proc_data):
+    """
+    Replays the classification, outlier and zero balance analysis over every past quarter with only the data
+    known at that quarter (see ffiec031_backtest), and saves the flag rates per |z| threshold and the flags
+    per quarter to Excel, with the full flag history split over as many sheets as it needs.
+    """
+    today_date = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+    output_folder = create_output_folder()
+    excel_file_path = output_folder + f"FFIEC031_Backtest_Result_{today_date}.xlsx"
+
+    flag_history = backtest_ffiec031_flags(proc_data, cache_path=NORMALITY_CACHE_PATH)
+    write_excel_streaming(
+        {"Threshold Summary": summarize_backtest_flags(flag_history),
+         "Flags by Quarter": count_backtest_flags_by_quarter(flag_history),
+         "Flag History": flag_history},
+        excel_file_path
+    )
+
+    return flag_history
+
+
 if __name__ == "__main__":
-    perform_ffiec031_trend_analysis(df_processed, df_reference)
+    df_processed = load_processed_data()
+    df_reference = load_reference_data()
+    changed_mdrms = read_changed_mdrms(Path.cwd() / CHANGED_MDRMS_PATH)      # None: score every MDRM
+    perform_ffiec031_trend_analysis(df_processed, df_reference, changed_mdrms)
+    # perform_ffiec031_backtest(df_processed)        # Replays every past quarter to tune the |z| threshold
 
 
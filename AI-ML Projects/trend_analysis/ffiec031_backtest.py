@@ -0,0 +1,268 @@
+# Load packages
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import deque
+from typing import Dict, Iterable, Optional
+from ffiec031_normality import run_shapiro_wilk_tests
+from ffiec031_panel_stats import (FREQUENCY_CLASSES, FREQUENCY_MONTHS, FREQUENCY_WINDOWS, build_mdrm_quarter_matrix,
+                                  categories_to_frequencies, categorize_matrix_rows, classify_reporting_frequencies,
+                                  compute_outlier_scores)
+from ffiec031_zero_balance import flag_zero_balance_breaches
+
+
+BACKTEST_THRESHOLDS = (2.0, 2.5, 3.0, 3.5, 4.0, 5.0)
+
+
+# Values of the latest report dates of a set of series, kept sorted per series and updated one date at a time
+class RollingWindow:
+    def __init__(self, shift: np.ndarray, window_size: Optional[int], capacity: int):
+        """
+        Args:
+            shift (np.ndarray): A typical value of every series, subtracted before the running sums to keep
+                them precise.
+            window_size (Optional[int]): Number of report dates in the window; None keeps every date.
+            capacity (int): Largest number of report dates the window can hold.
+        """
+        num_series = len(shift)
+        self.shift = shift
+        self.window_size = window_size
+        self.columns = deque()
+        self.sorted_values = np.full((num_series, max(window_size or capacity, 1)), np.nan)
+        self.count = np.zeros(num_series, dtype=np.int64)
+        self.present_count = np.zeros(num_series, dtype=np.int64)
+        self.total = np.zeros(num_series)
+        self.total_squares = np.zeros(num_series)
+
+    def push(self, column: np.ndarray, present: np.ndarray) -> None:
+        """ Adds the values of the next report date and drops the oldest one once the window is full. """
+        rows = np.arange(len(column))
+        self.columns.append((column, present))
+        if self.window_size is not None and len(self.columns) > self.window_size:
+            outgoing, outgoing_present = self.columns.popleft()
+        else:
+            outgoing, outgoing_present = np.full(len(column), np.nan), np.zeros(len(column), dtype=bool)
+        incoming_valid = ~np.isnan(column)
+        outgoing_valid = ~np.isnan(outgoing)
+
+        # The incoming value takes the slot of the outgoing value, or the first free slot
+        with np.errstate(invalid='ignore'):
+            outgoing_slot = (self.sorted_values < outgoing[:, None]).sum(axis=1)
+        slot = np.where(outgoing_valid, outgoing_slot, self.count)
+        self.sorted_values[rows[outgoing_valid], slot[outgoing_valid]] = np.nan
+        self.sorted_values[rows[incoming_valid], slot[incoming_valid]] = column[incoming_valid]
+        touched = incoming_valid | outgoing_valid
+        self.sorted_values[touched] = np.sort(self.sorted_values[touched], axis=1)
+
+        incoming_centred = np.where(incoming_valid, column - self.shift, 0.0)
+        outgoing_centred = np.where(outgoing_valid, outgoing - self.shift, 0.0)
+        self.count += incoming_valid.astype(np.int64) - outgoing_valid
+        self.present_count += present.astype(np.int64) - outgoing_present
+        self.total += incoming_centred - outgoing_centred
+        self.total_squares += incoming_centred ** 2 - outgoing_centred ** 2
+
+    # Function to take the median of every row of a sorted, NaN-padded buffer
+    @staticmethod
+    def _sorted_median(sorted_values: np.ndarray, count: np.ndarray) -> np.ndarray:
+        rows = np.arange(len(sorted_values))
+        lower = sorted_values[rows, np.maximum(count - 1, 0) // 2]
+        upper = sorted_values[rows, count // 2 - (count == 0)]
+        return np.where(count > 0, (lower + upper) / 2, np.nan)
+
+    def stats(self, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Args: rows (Optional[np.ndarray]): Series to compute the statistics of. Defaults to all series.
+        Returns: Dict[str, np.ndarray]: 'count', 'mean', 'std', 'median' and 'mad' like grouped_window_stats.
+        """
+        rows = np.arange(len(self.count)) if rows is None else rows
+        count, total, total_squares = self.count[rows], self.total[rows], self.total_squares[rows]
+        sorted_values = self.sorted_values[rows]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.shift[rows] + total / count
+            variance = (total_squares - total ** 2 / count) / (count - 1)
+            std = np.sqrt(np.maximum(variance, 0))
+        std[count < 2] = np.nan
+        # A window holding one distinct value has no spread, whatever the rounding of the running sums
+        positions = np.arange(len(count))
+        constant = (count >= 2) & (sorted_values[:, 0] == sorted_values[positions, np.maximum(count - 1, 0)])
+        std[constant] = 0.0
+
+        median = self._sorted_median(sorted_values, count)
+        deviations = np.sort(np.abs(sorted_values - median[:, None]), axis=1)
+        mad = self._sorted_median(deviations, count)
+        return {'count': count, 'mean': mean, 'std': std, 'median': median, 'mad': mad}
+
+
+# Function to replay the outlier and zero balance analysis over every past quarter in one run
+def backtest_ffiec031_flags(proc_data: pd.DataFrame, ref_data: Optional[pd.DataFrame] = None,
+                            sw_result: Optional[pd.DataFrame] = None, min_prior_quarters: int = 4,
+                            cache_path: Optional[Path] = None,
+                            windows: Optional[Dict[str, Optional[int]]] = None) -> pd.DataFrame:
+    """
+    Walks the report dates forward and scores every quarter only with what was known at that quarter.
+    Before a quarter is scored, the prior quarter is pushed into the rolling window of every frequency class
+    whose months it belongs to, added to the running totals, and appended to the value history of every MDRM
+    that reported it. Each MDRM is then classified as of the quarter, like generate_lineitem_metadata on the
+    data up to it, and scored against the window of its class at that time, like perform_outlier_detection.
+    Only MDRMs whose history gained a value are tested for normality again.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        ref_data (Optional[pd.DataFrame]): Reference data with 'MDRM' and 'ReportingFrequency' columns to use
+            for every quarter instead. A reference built from the full history classifies past quarters with
+            information from their future, so pass one only if it is known as of every quarter. Defaults to
+            replaying the classification.
+        sw_result (Optional[pd.DataFrame]): Normality to use for every quarter. Defaults to testing the prior
+            history of every quarter.
+        min_prior_quarters (int): Quarters of history needed before a quarter is scored. Defaults to 4.
+        cache_path (Optional[Path]): SQLite cache of p-values. Defaults to no file.
+        windows (Optional[Dict[str, Optional[int]]]): Window per frequency class. Defaults to FREQUENCY_WINDOWS.
+    Returns: pd.DataFrame: One row per scored MDRM and quarter with 'ReportDate', 'MDRM', 'ReportingFrequency',
+        'FrequencyClass', 'Value', 'Normality', 'OutlierScore', 'Outlier' and 'ZeroBalance_Breached'.
+    """
+    windows = windows or FREQUENCY_WINDOWS
+    mdrms, report_dates, values, present = build_mdrm_quarter_matrix(proc_data)
+    num_mdrms, num_dates = values.shape
+    months = pd.DatetimeIndex(report_dates).month.to_numpy()
+
+    static_frequencies = None
+    if ref_data is not None:
+        static_frequencies = (ref_data.drop_duplicates('MDRM').set_index('MDRM')['ReportingFrequency']
+                              .reindex(mdrms).to_numpy(dtype=object))
+        static_classes = classify_reporting_frequencies(mdrms, ref_data)
+
+    # One rolling window per frequency class over every MDRM, so an MDRM whose class changes is scored
+    # against the window of its new class
+    with np.errstate(invalid='ignore'):
+        first_valid = np.argmax(~np.isnan(values), axis=1)
+    shift = np.nan_to_num(values[np.arange(num_mdrms), first_valid])
+    rolling_windows = [RollingWindow(shift, windows.get(frequency_class), num_dates)
+                       for frequency_class in FREQUENCY_CLASSES]
+
+    # Running state of the quarters before the current one
+    prior_totals = np.zeros(num_mdrms)
+    has_prior_rows = np.zeros(num_mdrms, dtype=bool)
+    history = np.full((num_mdrms, num_dates), np.nan)           # Non-missing prior values, packed to the left
+    history_length = np.zeros(num_mdrms, dtype=np.int64)
+    history_changed = np.zeros(num_mdrms, dtype=bool)
+
+    if sw_result is not None:
+        normality = sw_result.drop_duplicates('MDRM').set_index('MDRM')['Normality'].reindex(mdrms).to_numpy()
+    else:
+        normality = np.full(num_mdrms, 'Insufficient Data', dtype=object)
+
+    flag_history = []
+    for current_position in range(1, num_dates):
+        # The quarter before the current one joins the windows of the classes it is reported in
+        prior_position = current_position - 1
+        prior_values, prior_present = values[:, prior_position], present[:, prior_position]
+        for class_position, frequency_class in enumerate(FREQUENCY_CLASSES):
+            if months[prior_position] in FREQUENCY_MONTHS[frequency_class]:
+                rolling_windows[class_position].push(prior_values, prior_present)
+        reported = ~np.isnan(prior_values)
+        prior_totals += np.where(reported, prior_values, 0.0)
+        has_prior_rows |= prior_present
+        history[reported, history_length[reported]] = prior_values[reported]
+        history_length += reported
+        history_changed |= reported
+        if current_position < min_prior_quarters:
+            continue
+
+        # Classification as of the current quarter: the 8 quarters before it and the running totals
+        if static_frequencies is None:
+            mdrm_category, _ = categorize_matrix_rows(values, present, report_dates, current_position,
+                                                      prior_totals, has_prior_rows)
+            frequencies = categories_to_frequencies(mdrm_category, has_prior_rows)
+            frequency_classes = classify_reporting_frequencies(
+                mdrms, pd.DataFrame({'MDRM': mdrms, 'ReportingFrequency': frequencies})
+            )
+        else:
+            frequencies, frequency_classes = static_frequencies, static_classes
+
+        if sw_result is None:
+            # Shapiro-Wilk on the full prior history, like perform_shapiro_wilk_test, of the MDRMs it changed for
+            retest = np.flatnonzero(history_changed & (history_length >= 3))
+            pvalues = run_shapiro_wilk_tests([history[row, :history_length[row]] for row in retest], cache_path)
+            normality[retest] = ['No' if round(pvalue, 4) < 0.05 else 'Yes' for pvalue in pvalues]
+            history_changed[:] = False
+
+        for class_position, frequency_class in enumerate(FREQUENCY_CLASSES):
+            rows = np.flatnonzero(frequency_classes == class_position)
+            rolling_window = rolling_windows[class_position]
+            scored = present[rows, current_position] & (rolling_window.present_count[rows] > 0)
+            if not scored.any():
+                continue
+            rows = rows[scored]
+            current_values = values[rows, current_position]
+            outlier_scores = compute_outlier_scores(current_values, rolling_window.stats(rows), normality[rows])
+            flag_history.append(pd.DataFrame({
+                'ReportDate': report_dates[current_position],
+                'MDRM': mdrms[rows],
+                'ReportingFrequency': frequencies[rows],
+                'FrequencyClass': frequency_class,
+                'Value': current_values,
+                'Normality': normality[rows],
+                'OutlierScore': outlier_scores,
+            }))
+
+    if not flag_history:
+        return pd.DataFrame(columns=['ReportDate', 'MDRM', 'ReportingFrequency', 'FrequencyClass', 'Value',
+                                     'Normality', 'OutlierScore', 'Outlier', 'ZeroBalance_Breached'])
+    flag_history = pd.concat(flag_history, ignore_index=True).sort_values(['ReportDate', 'MDRM'], ignore_index=True)
+    flag_history['Outlier'] = np.where(flag_history['OutlierScore'].abs() > 3, 'Yes', 'No')
+    # Zero balance rules are scored for every quarter at once, each with the frequency known at that quarter
+    breached = flag_zero_balance_breaches(flag_history['ReportingFrequency'], flag_history['Value'],
+                                          flag_history['ReportDate'].dt.month)
+    flag_history['ZeroBalance_Breached'] = np.where(breached, 'Yes', 'No')
+    return flag_history
+
+
+# Function to summarise flag rates of a backtest per z-score threshold
+def summarize_backtest_flags(flag_history: pd.DataFrame, thresholds: Iterable[float] = BACKTEST_THRESHOLDS,
+                             known_issues: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Counts the flags every |z| threshold would have raised. Filed history is taken as correct, so every
+    flag on it is a false positive, except the MDRM and report date pairs listed in known_issues.
+    Args:
+        flag_history (pd.DataFrame): Output of backtest_ffiec031_flags.
+        thresholds (Iterable[float]): |z| thresholds to compare. Defaults to BACKTEST_THRESHOLDS.
+        known_issues (Optional[pd.DataFrame]): 'MDRM' and 'ReportDate' of values known to be wrong.
+            Defaults to none.
+    Returns: pd.DataFrame: Per threshold and frequency class: 'Scored', 'Flagged', 'FalsePositives',
+        'FalsePositiveRate', 'TruePositives' and 'Recall' (NaN without known issues).
+    """
+    is_issue = np.zeros(len(flag_history), dtype=bool)
+    if known_issues is not None and not known_issues.empty:
+        issue_keys = pd.MultiIndex.from_frame(known_issues[['MDRM', 'ReportDate']])
+        is_issue = pd.MultiIndex.from_frame(flag_history[['MDRM', 'ReportDate']]).isin(issue_keys)
+
+    absolute_scores = flag_history['OutlierScore'].abs().to_numpy()
+    summaries = []
+    for threshold in thresholds:
+        flagged = absolute_scores > threshold
+        summary = pd.DataFrame({
+            'FrequencyClass': flag_history['FrequencyClass'].to_numpy(),
+            'Scored': 1,
+            'Negatives': ~is_issue,
+            'Flagged': flagged,
+            'FalsePositives': flagged & ~is_issue,
+            'TruePositives': flagged & is_issue,
+            'Issues': is_issue,
+        }).groupby('FrequencyClass', sort=False).sum()
+        summary.loc['all'] = summary.sum()
+        summaries.append(summary.reset_index().assign(Threshold=threshold))
+
+    summary_df = pd.concat(summaries, ignore_index=True)
+    summary_df['FalsePositiveRate'] = (summary_df['FalsePositives'] / summary_df['Negatives']).round(4)
+    summary_df['Recall'] = (summary_df['TruePositives'] / summary_df['Issues'].where(summary_df['Issues'] > 0)).round(4)
+    return summary_df[['Threshold', 'FrequencyClass', 'Scored', 'Flagged', 'FalsePositives', 'FalsePositiveRate',
+                       'TruePositives', 'Recall']]
+
+
+# Function to count the flags raised in every quarter of a backtest
+def count_backtest_flags_by_quarter(flag_history: pd.DataFrame) -> pd.DataFrame:
+    return (flag_history
+            .assign(Outlier=flag_history['Outlier'] == 'Yes',
+                    ZeroBalance_Breached=flag_history['ZeroBalance_Breached'] == 'Yes')
+            .groupby('ReportDate')
+            .agg(Scored=('MDRM', 'size'), Outliers=('Outlier', 'sum'), ZeroBalance_Breaches=('ZeroBalance_Breached', 'sum'))
+            .reset_index())
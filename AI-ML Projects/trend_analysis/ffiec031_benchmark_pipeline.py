@@ -0,0 +1,179 @@
+# Load packages
+import time
+import shutil
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ffiec031_excel_cache import EXCEL_CACHE_DIR_NAME
+from ffiec031_excel_writer import write_excel_streaming
+from ffiec031_instrumentation import count_rows, load_script_module
+from ffiec031_panel_store import PANEL_STORE_PATH, write_panel_store
+from ffiec031_synthetic_sdf import generate_synthetic_sdf_corpus
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+RESULT_COLUMNS = ['RunAt', 'Commit', 'MDRMs', 'Quarters', 'Seed', 'Stage', 'Rows', 'Seconds', 'PeakMemory_MB']
+
+
+# Function to time a stage and measure its peak Python memory
+def measure_stage(stage: str, func: Callable, *args, repeat: int = 1, profile_memory: bool = True,
+                  setup: Optional[Callable[[], None]] = None, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Times the best of several runs without tracing, then runs the stage once more under tracemalloc for
+    its peak allocation, so tracing does not slow down the timed runs.
+    Args:
+        stage (str): Name of the stage.
+        func (Callable): Function to run; args and kwargs are passed on.
+        repeat (int): Number of timed runs. Defaults to 1.
+        profile_memory (bool): Measure the peak allocation. Defaults to True.
+        setup (Optional[Callable[[], None]]): Run untimed before every run, e.g. to empty a cache so every
+            run is cold. Defaults to none.
+    Returns:
+        Tuple[Any, Dict[str, Any]]: The result of the last timed run and its 'Stage', 'Rows', 'Seconds' and
+        'PeakMemory_MB'.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.append(time.perf_counter() - start_time)
+
+    peak_memory = np.nan
+    if profile_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+    record = {'Stage': stage, 'Rows': count_rows(result), 'Seconds': round(min(timings), 4),
+              'PeakMemory_MB': round(peak_memory, 2)}
+    print(record)
+    return result, record
+
+
+# Function to benchmark every stage of scripts 01 and 02 on one corpus
+def benchmark_pipeline(root_dir: Path, repeat: int = 1, profile_memory: bool = True) -> List[Dict[str, Any]]:
+    """
+    Runs loading, processing and classification from script 01, writes the panel and reference inputs of
+    script 02 into root_dir, times loading them back, then runs every analysis of
+    perform_ffiec031_trend_analysis.
+    Args:
+        root_dir (Path): Root folder of a corpus written by generate_synthetic_sdf_corpus.
+        repeat (int): Number of timed runs per stage. Defaults to 1.
+        profile_memory (bool): Measure the peak allocation of every stage. Defaults to True.
+    Returns: List[Dict[str, Any]]: One record per stage.
+    """
+    records = []
+    preprocess = load_script_module('01_ffiec031_preprocess_data.py', root_dir)
+
+    def run(stage, func, *args, setup=None, **kwargs):
+        result, record = measure_stage(stage, func, *args, repeat=repeat, profile_memory=profile_memory,
+                                       setup=setup, **kwargs)
+        records.append(record)
+        return result
+
+    hist_df, static_df = run('load_ffiec031_data', preprocess.load_ffiec031_data, root_dir)
+    proc_df = run('process_ffiec031_sdf_files', preprocess.process_ffiec031_sdf_files, hist_df, static_df)
+    run('categorize_mdrms', preprocess.categorize_mdrms, proc_df)
+    ref_df = run('generate_lineitem_metadata', preprocess.generate_lineitem_metadata, hist_df, proc_df)
+
+    # Inputs of script 02; every stage is timed cold, and cached timings are recorded as separate warm stages
+    write_panel_store(proc_df, root_dir / PANEL_STORE_PATH)
+    write_excel_streaming({'Sheet1': ref_df}, root_dir / 'inputs' / 'FFIEC_031_Reference.xlsx')
+    trend_analysis = load_script_module('02_ffiec031_perform_trend_analysis.py', root_dir)
+    excel_cache_dir = root_dir / 'inputs' / EXCEL_CACHE_DIR_NAME
+    run('load_processed_data', trend_analysis.load_processed_data, root_dir)
+    run('load_reference_data', trend_analysis.load_reference_data, root_dir,
+        setup=lambda: shutil.rmtree(excel_cache_dir, ignore_errors=True))
+    run('load_reference_data (warm cache)', trend_analysis.load_reference_data, root_dir)
+
+    run('perform_zero_balance_analysis', trend_analysis.perform_zero_balance_analysis, proc_df, ref_df)
+    run('perform_variance_analysis', trend_analysis.perform_variance_analysis, proc_df)
+    sw_result = run('perform_shapiro_wilk_test', trend_analysis.perform_shapiro_wilk_test, proc_df)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = Path(cache_dir) / 'normality_cache.sqlite'
+        trend_analysis.perform_shapiro_wilk_test(proc_df, cache_path=cache_path)
+        run('perform_shapiro_wilk_test (warm cache)', trend_analysis.perform_shapiro_wilk_test, proc_df,
+            cache_path=cache_path)
+    run('perform_outlier_detection', trend_analysis.perform_outlier_detection, proc_df, ref_df, sw_result)
+    return records
+
+
+# Function to get the commit the benchmark ran on
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+# Function to compare a run with the previous run on the same corpus
+def compare_with_previous_run(results: pd.DataFrame, history: pd.DataFrame, tolerance: float = 0.25,
+                              min_seconds: float = 0.05) -> pd.DataFrame:
+    """
+    Args:
+        results (pd.DataFrame): Records of the current run in RESULT_COLUMNS.
+        history (pd.DataFrame): Records of earlier runs in RESULT_COLUMNS.
+        tolerance (float): Relative slowdown or memory growth flagged as a regression. Defaults to 0.25.
+        min_seconds (float): Slowdowns smaller than this are timer noise, not regressions. Defaults to 0.05.
+    Returns: pd.DataFrame: Time and memory ratios against the latest earlier run with the same MDRMs,
+        quarters and seed, with a 'Regression' column; empty when there is no such run.
+    """
+    corpus_keys = ['MDRMs', 'Quarters', 'Seed']
+    previous = history.merge(results[corpus_keys].drop_duplicates(), on=corpus_keys)
+    if previous.empty:
+        return pd.DataFrame()
+    previous = previous[previous['RunAt'] == previous['RunAt'].max()]
+    comparison = results.merge(previous[['Stage', 'Seconds', 'PeakMemory_MB', 'Commit']], on='Stage',
+                               suffixes=('', '_Prev'))
+    comparison['Time_Ratio'] = (comparison['Seconds'] / comparison['Seconds_Prev']).round(2)
+    comparison['Memory_Ratio'] = (comparison['PeakMemory_MB'] / comparison['PeakMemory_MB_Prev']).round(2)
+    slower = (comparison['Time_Ratio'] > 1 + tolerance) & (comparison['Seconds'] - comparison['Seconds_Prev'] > min_seconds)
+    comparison['Regression'] = np.where(slower | (comparison['Memory_Ratio'] > 1 + tolerance), 'Yes', 'No')
+    return comparison[['Stage', 'Commit_Prev', 'Seconds_Prev', 'Seconds', 'Time_Ratio',
+                       'PeakMemory_MB_Prev', 'PeakMemory_MB', 'Memory_Ratio', 'Regression']]
+
+
+def main(num_mdrms: int = 2000, num_quarters: int = 96, seed: int = 0, repeat: int = 1,
+         profile_memory: bool = True, results_path: Optional[Path] = None):
+    """
+    Benchmarks the pipeline on a synthetic single-institution corpus and appends the results to
+    outputs/benchmarks/ffiec031_pipeline_benchmarks.csv, comparing them with the previous run.
+    """
+    results_path = results_path or Path.cwd() / 'outputs' / 'benchmarks' / 'ffiec031_pipeline_benchmarks.csv'
+    corpus_dir = Path(tempfile.mkdtemp(prefix='ffiec031_benchmark_'))
+    try:
+        generate_synthetic_sdf_corpus(corpus_dir, 1, num_mdrms, num_quarters, seed)
+        records = benchmark_pipeline(corpus_dir, repeat, profile_memory)
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    results = pd.DataFrame(records).assign(
+        RunAt=datetime.now().isoformat(timespec='seconds'), Commit=get_git_commit(),
+        MDRMs=num_mdrms, Quarters=num_quarters, Seed=seed
+    )[RESULT_COLUMNS]
+    print(results.to_string(index=False))
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    if results_path.exists():
+        comparison = compare_with_previous_run(results, pd.read_csv(results_path, dtype={'Commit': str}))
+        if not comparison.empty:
+            print(comparison.to_string(index=False))
+    results.to_csv(results_path, mode='a', header=not results_path.exists(), index=False)
+    print(f"Results appended to: {results_path}")
+
+
+if __name__ == "__main__":
+    main()
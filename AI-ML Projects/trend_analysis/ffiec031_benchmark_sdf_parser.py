@@ -0,0 +1,81 @@
+# Load packages
+import os
+import time
+import shutil
+import tempfile
+import pandas as pd
+from pathlib import Path
+from typing import Callable, List
+from ffiec031_sdf_parser import PARALLEL_MIN_BYTES, load_sdf_files_parallel
+
+
+# Function to load SDF files the way load_ffiec031_data always has: one read_csv per file, then one concat
+def load_sdf_files_sequential(file_paths: List[Path]) -> pd.DataFrame:
+    return pd.concat([pd.read_csv(file, sep=';') for file in file_paths], axis=0, ignore_index=True)
+
+
+# Function to build a synthetic corpus by copying the checked-in SDF files under distinct cert numbers
+def create_synthetic_sdf_corpus(sdf_dir: Path, target_dir: Path, num_files: int) -> List[Path]:
+    template_files = sorted(sdf_dir.glob("*.SDF"))
+    corpus_files = []
+    for i in range(num_files):
+        template_file = template_files[i % len(template_files)]
+        cert_number = 100000 + i // len(template_files)
+        corpus_file = target_dir / template_file.name.replace("Cert3510", f"Cert{cert_number}")
+        shutil.copyfile(template_file, corpus_file)
+        corpus_files.append(corpus_file)
+    return corpus_files
+
+
+# Function to time a loader and return the best of several runs
+def time_loader(loader: Callable, file_paths: List[Path], repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        loader(file_paths)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+# Function to compare the sequential and parallel loaders on a list of SDF files
+def benchmark_sdf_loaders(label: str, file_paths: List[Path], max_workers: int, repeat: int = 3) -> dict:
+    sequential_time = time_loader(load_sdf_files_sequential, file_paths, repeat)
+    parallel_time = time_loader(lambda paths: load_sdf_files_parallel(paths, max_workers=max_workers), file_paths, repeat)
+    pool_time = time_loader(lambda paths: load_sdf_files_parallel(paths, max_workers=max_workers, min_parallel_bytes=0),
+                            file_paths, repeat)
+    corpus_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+    result = {
+        "Corpus": label,
+        "Files": len(file_paths),
+        "MB": round(corpus_bytes / 1024 ** 2, 1),
+        "Workers": max_workers,
+        "Pool_used": max_workers > 1 and corpus_bytes >= PARALLEL_MIN_BYTES,
+        "Sequential_sec": round(sequential_time, 3),
+        "Parallel_sec": round(parallel_time, 3),        # load_sdf_files_parallel with its size threshold
+        "Pool_sec": round(pool_time, 3),                # Always on the process pool
+        "Speedup": round(sequential_time / parallel_time, 2),
+    }
+    print(result)
+    return result
+
+
+def main(num_synthetic_files: int = 10000, max_workers: int = None):
+    """ Benchmarks SDF parsing on the checked-in files and on a synthetic corpus. """
+    rootdir = Path.cwd()
+    sdf_dir = rootdir / "inputs" / "ffiec_031_sdf_files"
+    max_workers = max_workers or os.cpu_count() or 1
+
+    results = [benchmark_sdf_loaders("checked-in", sorted(sdf_dir.glob("*.SDF")), max_workers)]
+
+    synthetic_dir = Path(tempfile.mkdtemp(prefix="sdf_corpus_"))
+    try:
+        corpus_files = create_synthetic_sdf_corpus(sdf_dir, synthetic_dir, num_synthetic_files)
+        results.append(benchmark_sdf_loaders("synthetic", corpus_files, max_workers, repeat=1))
+    finally:
+        shutil.rmtree(synthetic_dir, ignore_errors=True)
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
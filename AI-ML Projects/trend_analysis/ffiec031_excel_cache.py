@@ -0,0 +1,80 @@
+# Load packages
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+EXCEL_CACHE_DIR_NAME = 'ffiec031_excel_cache'
+SOURCE_KEY_FIELD = b'ffiec031_source'
+
+
+# Function to get the path of the Parquet sidecar of an Excel sheet in the cache
+def get_excel_cache_path(excel_path: Path, cache_dir: Path, sheet_name: Union[str, int] = 0) -> Path:
+    suffix = '' if sheet_name == 0 else '.' + ''.join(c if c.isalnum() else '_' for c in str(sheet_name))
+    return cache_dir / f"{excel_path.stem}{suffix}.parquet"
+
+
+# Function to read the source key (mtime, size and SHA-256 of the workbook) stored in a sidecar
+def read_excel_cache_key(cache_path: Path) -> Optional[Dict]:
+    try:
+        metadata = pq.read_schema(str(cache_path)).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return json.loads(metadata[SOURCE_KEY_FIELD]) if SOURCE_KEY_FIELD in metadata else None
+
+
+# Function to write a frame or table to a sidecar with its source key
+def write_excel_cache(table: pa.Table, cache_path: Path, source_key: Dict) -> None:
+    metadata = {**(table.schema.metadata or {}), SOURCE_KEY_FIELD: json.dumps(source_key).encode()}
+    temp_path = cache_path.with_suffix('.tmp')
+    pq.write_table(table.replace_schema_metadata(metadata), str(temp_path))
+    temp_path.replace(cache_path)
+
+
+# Function to read an Excel sheet through a Parquet sidecar keyed by the workbook's mtime and hash
+def read_excel_cached(excel_path: Path, cache_dir: Optional[Path] = None, sheet_name: Union[str, int] = 0) -> pd.DataFrame:
+    """
+    Reads the sheet from its Parquet sidecar when the workbook is unchanged: an equal mtime and size is
+    trusted without hashing, otherwise the SHA-256 of the workbook decides. The workbook is parsed with
+    pd.read_excel only on a cache miss, and the sidecar is rewritten.
+    Args:
+        excel_path (Path): Workbook to read.
+        cache_dir (Optional[Path]): Folder holding the sidecars. Defaults to ffiec031_excel_cache next to
+            the workbook.
+        sheet_name (Union[str, int]): Sheet to read. Defaults to the first sheet.
+    Returns: pd.DataFrame: The sheet as pd.read_excel returns it.
+    """
+    excel_path = Path(excel_path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else excel_path.parent / EXCEL_CACHE_DIR_NAME
+    cache_path = get_excel_cache_path(excel_path, cache_dir, sheet_name)
+
+    file_stat = excel_path.stat()
+    source_key = {'mtime_ns': file_stat.st_mtime_ns, 'size': file_stat.st_size}
+    cached_key = read_excel_cache_key(cache_path)
+    if cached_key is not None and all(cached_key.get(field) == value for field, value in source_key.items()):
+        print(f"Loaded {excel_path.name} from its Parquet sidecar.")
+        return pq.read_table(str(cache_path)).to_pandas()
+
+    source_key['sha256'] = hashlib.sha256(excel_path.read_bytes()).hexdigest()
+    if cached_key is not None and cached_key.get('sha256') == source_key['sha256']:
+        # Touched or copied but unchanged; record the new mtime so the next read skips the hash
+        table = pq.read_table(str(cache_path))
+        write_excel_cache(table, cache_path, source_key)
+        print(f"Loaded {excel_path.name} from its Parquet sidecar.")
+        return table.to_pandas()
+
+    excel_df = pd.read_excel(excel_path, sheet_name=sheet_name)
+    try:
+        table = pa.Table.from_pandas(excel_df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Columns mixing e.g. numbers and text cannot be stored; read such workbooks from Excel every time
+        print(f"Parsed {excel_path.name}; not cached ({e}).")
+        return excel_df
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    write_excel_cache(table, cache_path, source_key)
+    print(f"Parsed {excel_path.name} and cached it as a Parquet sidecar.")
+    return excel_df
@@ -0,0 +1,90 @@
+# Load packages
+import pandas as pd
+import xlsxwriter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+
+EXCEL_MAX_ROWS = 1048576            # Rows per worksheet, including the header row
+EXCEL_MAX_SHEET_NAME = 31
+
+SheetData = Union[pd.DataFrame, Iterable[pd.DataFrame], Any]        # Any: a pandas Styler
+
+
+# Function to go through the data of a sheet chunk by chunk
+def _iter_chunks(sheet_data: SheetData, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if isinstance(getattr(sheet_data, 'data', None), pd.DataFrame):
+        sheet_data = sheet_data.data                                         # A Styler: write its data
+    if isinstance(sheet_data, pd.DataFrame):
+        for start in range(0, max(len(sheet_data), 1), chunk_rows):
+            yield sheet_data.iloc[start:start + chunk_rows]
+    else:
+        yield from sheet_data
+
+
+# Function to name the parts of a sheet that is split over several worksheets
+def _part_sheet_name(sheet_name: str, part: int) -> str:
+    if part == 1:
+        return sheet_name[:EXCEL_MAX_SHEET_NAME]
+    suffix = f" ({part})"
+    return sheet_name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+
+
+# Function to write sheets to Excel row by row in constant memory, splitting sheets and files at the row limits
+def write_excel_streaming(sheets: Dict[str, SheetData], excel_path: Path, max_rows_per_sheet: int = EXCEL_MAX_ROWS,
+                          max_rows_per_file: Optional[int] = None, chunk_rows: int = 50000) -> List[Path]:
+    """
+    Streams every sheet into xlsxwriter's constant-memory mode, so only the current row is held by the
+    writer. A sheet longer than max_rows_per_sheet continues on 'Name (2)', 'Name (3)', ... and a workbook
+    longer than max_rows_per_file continues in 'file_2.xlsx', 'file_3.xlsx', ... Later stages do not
+    re-read the workbooks: script 02 reads the panel store and caches the inputs it parses (see
+    ffiec031_excel_cache).
+    Args:
+        sheets (Dict[str, SheetData]): Sheet names and their data: a DataFrame, a Styler, or an iterable
+            of DataFrame chunks with the same columns.
+        excel_path (Path): Path of the (first) Excel file.
+        max_rows_per_sheet (int): Rows per worksheet, including the header. Defaults to Excel's limit.
+        max_rows_per_file (Optional[int]): Rows per workbook, including headers. Defaults to no limit.
+        chunk_rows (int): Rows taken from a DataFrame at a time. Defaults to 50000.
+    Returns: List[Path]: The Excel files written.
+    """
+    excel_path = Path(excel_path)
+    workbook_options = {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'}
+    excel_files = [excel_path]
+    workbook = xlsxwriter.Workbook(str(excel_path), workbook_options)
+    file_rows = 0
+
+    for sheet_name, sheet_data in sheets.items():
+        part = 0
+        worksheet = None
+        sheet_row = 0
+
+        for chunk in _iter_chunks(sheet_data, chunk_rows):
+            header = [str(column) for column in chunk.columns]
+            # Timestamps are written as dates; NaN and NaT are left blank like DataFrame.to_excel does
+            rows = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+            if worksheet is None and not rows:
+                rows = [None]                                        # An empty sheet still gets its header
+
+            for row in rows:
+                new_sheet = worksheet is None or sheet_row >= max_rows_per_sheet
+                rows_needed = (2 if new_sheet else 1) - (row is None)
+                if max_rows_per_file and file_rows > 0 and file_rows + rows_needed > max_rows_per_file:
+                    workbook.close()
+                    excel_files.append(excel_path.with_name(f"{excel_path.stem}_{len(excel_files) + 1}.xlsx"))
+                    workbook = xlsxwriter.Workbook(str(excel_files[-1]), workbook_options)
+                    file_rows = 0
+                    new_sheet = True
+                if new_sheet:
+                    part += 1
+                    worksheet = workbook.add_worksheet(_part_sheet_name(sheet_name, part))
+                    worksheet.write_row(0, 0, header)
+                    sheet_row = 1
+                    file_rows += 1
+                if row is not None:
+                    worksheet.write_row(sheet_row, 0, row)
+                    sheet_row += 1
+                    file_rows += 1
+
+    workbook.close()
+    return excel_files
@@ -0,0 +1,196 @@
+# Load packages
+import os
+import re
+import time
+import asyncio
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urljoin, urlsplit
+import aiohttp
+
+
+FACSIMILE_URL = "https://cdr.ffiec.gov/Public/ViewFacsimileDirect.aspx"
+
+
+# Function to build the facsimile page URL of an institution for a given quarter end date
+def build_facsimile_url(quarter_end_date: str, rssd_id: int = 480228, base_url: str = FACSIMILE_URL) -> str:
+    """
+    Builds the CDR facsimile page URL for one institution and quarter.
+    Args:
+        quarter_end_date (str): Quarter end date in MMDDYYYY format.
+        rssd_id (int): RSSD ID of the institution. Defaults to 480228.
+        base_url (str): Facsimile page URL, e.g. a local stand-in server. Defaults to the CDR site.
+    Returns: str: The facsimile page URL.
+    """
+    return f"{base_url}?ds=call&idtype=id_rssd&id={rssd_id}&date={quarter_end_date}"
+
+
+# HTML parser collecting the ASP.NET form fields needed to post back a download button
+class _PostbackFormParser(HTMLParser):
+    def __init__(self, button_id: str):
+        super().__init__()
+        self.button_id = button_id
+        self.form_action = None
+        self.hidden_fields = {}
+        self.button = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and self.form_action is None:
+            self.form_action = attrs.get("action", "")
+        elif tag == "input" and attrs.get("type", "").lower() == "hidden" and attrs.get("name"):
+            self.hidden_fields[attrs["name"]] = attrs.get("value", "")
+        if attrs.get("id") == self.button_id:
+            self.button = {"tag": tag, **attrs}
+
+
+# Function to extract the postback target and form data for the download button of a facsimile page
+def parse_postback_form(html: str, button_id: str = "Download_SDF_3") -> Tuple[str, Dict[str, str]]:
+    """
+    Extracts the form action and the form fields that ASP.NET expects when the download button is clicked.
+    Args:
+        html (str): HTML of the facsimile page.
+        button_id (str): Element ID of the download button. Defaults to 'Download_SDF_3'.
+    Returns:
+        Tuple[str, Dict[str, str]]: The form action (relative to the page URL) and the form data to post.
+    Raises:
+        ValueError: If the page has no form or no download button.
+    """
+    parser = _PostbackFormParser(button_id)
+    parser.feed(html)
+    if parser.form_action is None or parser.button is None:
+        raise ValueError(f"Download button '{button_id}' could not be found on the facsimile page.")
+
+    form_data = dict(parser.hidden_fields)
+    button = parser.button
+    postback = re.search(r"__doPostBack\('([^']*)','([^']*)'\)", button.get("href", "") + button.get("onclick", ""))
+    if postback:
+        # Link buttons post back through __doPostBack(target, argument)
+        form_data["__EVENTTARGET"] = postback.group(1)
+        form_data["__EVENTARGUMENT"] = postback.group(2)
+    else:
+        # Submit buttons post their own name and value
+        form_data[button.get("name", button_id)] = button.get("value", "")
+
+    return parser.form_action, form_data
+
+
+# Function to create an asyncio rate limiter that spaces out requests evenly
+def create_rate_limiter(requests_per_second: float) -> Callable:
+    """
+    Creates a coroutine function that blocks until the next request slot is free.
+    Args: requests_per_second (float): Maximum request rate. Zero or less disables the limit.
+    Returns: Callable: A coroutine function to await before every request.
+    """
+    interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+    lock = asyncio.Lock()
+    next_slot = [0.0]
+
+    async def wait_for_slot():
+        async with lock:
+            now = time.monotonic()
+            delay = next_slot[0] - now
+            next_slot[0] = max(now, next_slot[0]) + interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    return wait_for_slot
+
+
+# Function to get the file name from a Content-Disposition header
+def get_attachment_filename(content_disposition: str) -> str:
+    match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', content_disposition or "")
+    return os.path.basename(match.group(1)) if match else None
+
+
+# Function to fetch one SDF file through the facsimile page postback
+async def fetch_sdf(session: aiohttp.ClientSession, url: str, filename: str, download_folder: str,
+                    wait_for_slot: Callable, button_id: str = "Download_SDF_3") -> str:
+    """
+    Loads the facsimile page, posts back its download button and saves the returned SDF file.
+    Args:
+        session (aiohttp.ClientSession): Shared HTTP session holding the connection pool.
+        url (str): Facsimile page URL.
+        filename (str): File name to use when the response does not name the file.
+        download_folder (str): Folder to save the SDF file in.
+        wait_for_slot (Callable): Rate limiter awaited before every request.
+        button_id (str): Element ID of the download button. Defaults to 'Download_SDF_3'.
+    Returns: str: Path of the saved SDF file.
+    """
+    await wait_for_slot()
+    async with session.get(url) as response:
+        response.raise_for_status()
+        html = await response.text()
+
+    form_action, form_data = parse_postback_form(html, button_id)
+
+    await wait_for_slot()
+    async with session.post(urljoin(url, form_action), data=form_data) as response:
+        response.raise_for_status()
+        if response.content_type == "text/html":
+            raise ValueError("The postback returned a web page instead of an SDF file.")
+        content = await response.read()
+        filename = get_attachment_filename(response.headers.get("Content-Disposition")) or filename
+
+    # Write to a temporary file first so a partial download never looks like a finished SDF file
+    file_path = os.path.join(download_folder, filename)
+    temp_path = file_path + ".part"
+    with open(temp_path, "wb") as file:
+        file.write(content)
+    os.replace(temp_path, file_path)
+    return file_path
+
+
+# Function to fetch many SDF files concurrently over a pool of HTTP connections
+async def fetch_sdfs(jobs: List[Dict[str, str]], download_folder: str, max_connections: int = 8,
+                     requests_per_second: float = 4.0,
+                     max_connections_per_host: int = 0) -> Dict[str, Tuple[bool, float]]:
+    """
+    Fetches SDF files concurrently while limiting open connections and the request rate of every host.
+    Args:
+        jobs (List[Dict[str, str]]): Jobs with a 'key' used for reporting, the facsimile page 'url'
+            and the fallback 'filename'.
+        download_folder (str): Folder to save the SDF files in.
+        max_connections (int): Size of the connection pool and number of concurrent jobs. Defaults to 8.
+        requests_per_second (float): Maximum request rate per host. Defaults to 4.0.
+        max_connections_per_host (int): Maximum open connections per host; 0 means no extra limit. Defaults to 0.
+    Returns:
+        Dict[str, Tuple[bool, float]]: Whether each job succeeded and its wall time in seconds, keyed by job key.
+    """
+    rate_limiters = {}
+    for job in jobs:
+        host = urlsplit(job["url"]).netloc
+        if host not in rate_limiters:
+            rate_limiters[host] = create_rate_limiter(requests_per_second)
+    connector = aiohttp.TCPConnector(limit=max_connections, limit_per_host=max_connections_per_host)
+    timeout = aiohttp.ClientTimeout(total=120)
+    # Each page visit is followed by its own postback, so jobs run with no more than one request in flight each
+    job_slots = asyncio.Semaphore(max_connections)
+
+    async def run_job(session, job):
+        async with job_slots:
+            start_time = time.perf_counter()
+            try:
+                wait_for_slot = rate_limiters[urlsplit(job["url"]).netloc]
+                await fetch_sdf(session, job["url"], job["filename"], download_folder, wait_for_slot)
+                downloaded = True
+            except Exception as e:
+                print(f"Error downloading file for {job['key']}: {e}")
+                downloaded = False
+            elapsed = time.perf_counter() - start_time
+            print(f"{job['key']}: {'done' if downloaded else 'failed'} in {elapsed:.2f} seconds")
+            return job["key"], (downloaded, elapsed)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        results = await asyncio.gather(*(run_job(session, job) for job in jobs))
+
+    return dict(results)
+
+
+# Function to run the asynchronous fetch from synchronous code
+def download_sdfs_http(jobs: List[Dict[str, str]], download_folder: str, max_connections: int = 8,
+                       requests_per_second: float = 4.0,
+                       max_connections_per_host: int = 0) -> Dict[str, Tuple[bool, float]]:
+    """ Synchronous wrapper around fetch_sdfs. """
+    return asyncio.run(fetch_sdfs(jobs, download_folder, max_connections, requests_per_second,
+                                  max_connections_per_host))
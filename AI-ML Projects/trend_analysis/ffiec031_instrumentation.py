@@ -0,0 +1,347 @@
+# Load packages
+import os
+import sys
+import json
+import time
+import cProfile
+import platform
+import threading
+import contextlib
+import tracemalloc
+import functools
+import importlib.util
+import pandas as pd
+from pathlib import Path
+from types import ModuleType
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+try:
+    import psutil
+except ImportError:
+    psutil = None       # RSS is then read from /proc where available, and left out elsewhere
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# Functions wrapped as stages in each numbered script; nested calls show up as child stages
+SCRIPT_STAGES = {
+    '00': ('00_ffiec031_download_sdf_files.py', [
+        'sync_manifest', 'get_quarter_end_dates_to_download', 'download_sdfs_concurrently',
+        'download_sdfs_without_browser', 'schedule_institution_downloads',
+    ]),
+    '01': ('01_ffiec031_preprocess_data.py', [
+        'load_ffiec031_data', 'process_ffiec031_sdf_files', 'densify_mdrm_report_dates', 'record_sdf_versions',
+        'update_lineitem_metadata', 'generate_lineitem_metadata', 'categorize_mdrms', 'save_dataframe_to_excel',
+        'write_panel_store', 'append_new_quarters', 'upload_ffiec031_data_to_sqlserver',
+    ]),
+    '02': ('02_ffiec031_perform_trend_analysis.py', [
+        'load_processed_data', 'load_reference_data', 'perform_ffiec031_trend_analysis',
+        'perform_zero_balance_analysis', 'perform_variance_analysis', 'perform_shapiro_wilk_test',
+        'update_outlier_detection', 'perform_outlier_detection', 'create_excel_from_list',
+    ]),
+}
+
+# Numbered scripts that are not instrumented, and why
+EXCLUDED_SCRIPTS = {
+    '03': "03_ffiec031_appendix.py is a scratch appendix; its module-level code uses names it never defines, so "
+          "it cannot be imported and its stages cannot be timed",
+}
+
+
+# Function to run a block in another working directory (contextlib.chdir needs Python 3.11)
+@contextlib.contextmanager
+def working_directory(work_dir: Path) -> Iterator[None]:
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        yield
+    finally:
+        os.chdir(previous_dir)
+
+
+# Function to import a numbered script (e.g. 01_...py) as a module from a given working directory
+def load_script_module(script_name: str, work_dir: Path) -> ModuleType:
+    """
+    The numbered scripts cannot be imported by name, and some resolve paths relative to the working
+    directory when they are imported.
+    Args:
+        script_name (str): File name of the script in trend_analysis.
+        work_dir (Path): Working directory while the script is imported.
+    Returns: ModuleType: The imported script.
+    """
+    module_name = Path(script_name).stem.lstrip('0123456789_')
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / script_name)
+    module = importlib.util.module_from_spec(spec)
+    with working_directory(work_dir):
+        spec.loader.exec_module(module)
+    return module
+
+
+# Function to count the rows of a stage argument or result
+def count_rows(result: Any) -> Optional[int]:
+    if isinstance(result, tuple) and result:
+        return count_rows(result[0])
+    if isinstance(result, dict):
+        return sum(len(items) for items in result.values() if hasattr(items, '__len__'))
+    if isinstance(getattr(result, 'data', None), pd.DataFrame):
+        return len(result.data)                                             # A pandas Styler
+    return len(result) if hasattr(result, '__len__') and not isinstance(result, (str, bytes)) else None
+
+
+# Function to read the resident set size of this process in bytes
+def get_current_rss() -> Optional[int]:
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Sampler thread keeping the highest RSS seen since it was last read
+class RssSampler(threading.Thread):
+    def __init__(self, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = get_current_rss() or 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, get_current_rss() or 0)
+
+    def take_peak(self) -> int:
+        """ Returns the peak since the last call and starts a new one from the current RSS. """
+        current_rss = get_current_rss() or 0
+        peak, self.peak = max(self.peak, current_rss), current_rss
+        return peak
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _to_mb(num_bytes: Optional[float]) -> Optional[float]:
+    return None if num_bytes is None else round(num_bytes / 2 ** 20, 2)
+
+
+# Stage timers, row counts, memory and optional profiles of one run, written out as a JSON report
+class RunInstrumentation:
+    def __init__(self, run_name: str, report_dir: Optional[Path] = None, trace_memory: bool = False,
+                 profile: bool = False, top_allocations: int = 10, rss_interval: float = 0.05):
+        """
+        Args:
+            run_name (str): Name of the run, used in the report file name.
+            report_dir (Optional[Path]): Folder of the JSON report and cProfile dumps. Defaults to
+                outputs/run_reports.
+            trace_memory (bool): Trace Python allocations with tracemalloc: the peak of every stage and the
+                source lines that allocated most in it. Slows the run down. Defaults to False.
+            profile (bool): Dump a cProfile file per stage (time spent in child stages is left out).
+                Defaults to False.
+            top_allocations (int): Source lines listed per stage when tracing memory. Defaults to 10.
+            rss_interval (float): Seconds between RSS samples. Defaults to 0.05.
+        """
+        self.run_name = run_name
+        self.report_dir = Path(report_dir) if report_dir else Path.cwd() / 'outputs' / 'run_reports'
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.top_allocations = top_allocations
+        self.rss_interval = rss_interval
+        self.run_id = datetime.now().strftime('%Y-%m-%d %H-%M-%S')
+        self.stages: List[Dict[str, Any]] = []
+        self.report_path: Optional[Path] = None
+        self._stack: List[Dict[str, Any]] = []
+        self._sampler: Optional[RssSampler] = None
+        self._peak_rss = 0
+        self._started_at = None
+        self._start_time = None
+
+    def __enter__(self):
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        self._started_at = datetime.now().isoformat(timespec='seconds')
+        self._start_time = time.perf_counter()
+        self._sampler = RssSampler(self.rss_interval)
+        self._sampler.start()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._sampler.stop()
+        peak_rss = self._sampler.take_peak()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.write_report(status='failed' if exc_type else 'completed', error=repr(exc_value) if exc_type else None,
+                          peak_rss=max(self._peak_rss, peak_rss))
+        return False
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Times a block of code as a stage and records its memory. Stages can be nested; the peaks of a
+        child stage count towards its parents.
+        Args:
+            name (str): Name of the stage.
+            rows_in (Optional[int]): Rows going into the stage. Defaults to None.
+        Returns: Iterator[Dict[str, Any]]: The stage record, e.g. to set 'rows_out' before the block ends.
+        """
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None:
+            self._collect_peaks(parent)
+            if parent['profiler'] is not None:
+                parent['profiler'].disable()
+
+        record = {
+            'stage': name, 'parent': parent['record']['stage'] if parent else None, 'depth': len(self._stack),
+            'start_sec': round(time.perf_counter() - self._start_time, 4), 'seconds': None, 'status': 'running',
+            'rows_in': rows_in, 'rows_out': None, 'rss_start_mb': _to_mb(get_current_rss()),
+        }
+        frame = {'record': record, 'rss_peak': self._sampler.take_peak(), 'traced_peak': 0,
+                 'snapshot': None, 'profiler': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            frame['snapshot'] = self._take_snapshot()
+        if self.profile:
+            frame['profiler'] = cProfile.Profile()
+            frame['profiler'].enable()
+        self._stack.append(frame)
+        start_time = time.perf_counter()
+
+        try:
+            yield record
+            record['status'] = 'completed'
+        except BaseException as error:
+            record['status'] = 'failed'
+            record['error'] = repr(error)
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start_time, 4)
+            if frame['profiler'] is not None:
+                frame['profiler'].disable()
+                profile_path = self.report_dir / f"{self.run_name}_{self.run_id}_{len(self.stages):02d}_{name}.prof"
+                frame['profiler'].dump_stats(str(profile_path))
+                record['profile'] = str(profile_path)
+            self._collect_peaks(frame)
+            self._stack.pop()
+            self._peak_rss = max(self._peak_rss, frame['rss_peak'])
+
+            record['rss_end_mb'] = _to_mb(get_current_rss())
+            record['peak_rss_mb'] = _to_mb(frame['rss_peak'])
+            if self.trace_memory:
+                record['traced_peak_mb'] = _to_mb(frame['traced_peak'])
+                record['top_allocations'] = self._top_allocations(frame['snapshot'])
+            self.stages.append(record)
+
+            if parent is not None:
+                parent['rss_peak'] = max(parent['rss_peak'], frame['rss_peak'])
+                parent['traced_peak'] = max(parent['traced_peak'], frame['traced_peak'])
+                if self.trace_memory:
+                    tracemalloc.reset_peak()
+                if parent['profiler'] is not None:
+                    parent['profiler'].enable()
+
+    # Function to fold the peaks seen so far into a stage frame
+    def _collect_peaks(self, frame: Dict[str, Any]) -> None:
+        frame['rss_peak'] = max(frame['rss_peak'], self._sampler.take_peak())
+        if self.trace_memory:
+            frame['traced_peak'] = max(frame['traced_peak'], tracemalloc.get_traced_memory()[1])
+
+    # Function to take a tracemalloc snapshot without the allocations of the profilers themselves
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        profiler_files = (tracemalloc.__file__, cProfile.__file__, __file__)
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, module_file) for module_file in profiler_files
+        ])
+
+    # Function to list the source lines that allocated most since a snapshot
+    def _top_allocations(self, snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        statistics = self._take_snapshot().compare_to(snapshot, 'lineno')
+        return [
+            {'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+             'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff}
+            for stat in statistics[:self.top_allocations]
+        ]
+
+    def wrap(self, func: Callable, name: Optional[str] = None) -> Callable:
+        """ Wraps a function so every call is recorded as a stage, with the rows of its first argument and result. """
+        @functools.wraps(func)
+        def instrumented(*args, **kwargs):
+            first_argument = args[0] if args else next(iter(kwargs.values()), None)
+            rows_in = count_rows(first_argument)
+            with self.stage(name or func.__name__, rows_in) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = count_rows(result)
+            return result
+        instrumented.__wrapped__ = func
+        return instrumented
+
+    def instrument_module(self, module: ModuleType, function_names: Iterable[str]) -> None:
+        """
+        Replaces module-level functions with their wrapped versions. Calls between functions of the module
+        go through its globals, so they are recorded as nested stages.
+        """
+        for function_name in function_names:
+            func = getattr(module, function_name, None)
+            if callable(func):
+                setattr(module, function_name, self.wrap(func))
+
+    def write_report(self, status: str, error: Optional[str] = None, peak_rss: Optional[int] = None) -> Path:
+        report = {
+            'run_name': self.run_name,
+            'run_id': self.run_id,
+            'status': status,
+            'error': error,
+            'started_at': self._started_at,
+            'total_seconds': round(time.perf_counter() - self._start_time, 4),
+            'peak_rss_mb': _to_mb(peak_rss),
+            'trace_memory': self.trace_memory,
+            'profile': self.profile,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'pid': os.getpid(),
+            'stages': sorted(self.stages, key=lambda record: record['start_sec']),
+        }
+        self.report_path = self.report_dir / f"{self.run_name}_{self.run_id}.json"
+        self.report_path.write_text(json.dumps(report, indent=2, default=str))
+        print(f"Run report saved as: {self.report_path}")
+        return self.report_path
+
+
+# Function to print the stages of a run report as a table
+def summarize_run_report(report_path: Path) -> pd.DataFrame:
+    report = json.loads(Path(report_path).read_text())
+    columns = ['stage', 'depth', 'status', 'seconds', 'rows_in', 'rows_out', 'peak_rss_mb', 'traced_peak_mb']
+    stages_df = pd.DataFrame(report['stages']).reindex(columns=columns)
+    stages_df['stage'] = ['  ' * depth + stage for stage, depth in zip(stages_df['stage'], stages_df['depth'])]
+    stages_df['stage'] = stages_df['stage'].str.ljust(stages_df['stage'].str.len().max())
+    return stages_df.drop(columns='depth')
+
+
+def main(script: str = '01', trace_memory: bool = False, profile: bool = False, **main_kwargs):
+    """
+    Runs one of the numbered scripts (00 to 02) from the current working directory with its functions
+    instrumented, and writes a JSON run report to outputs/run_reports. Script 03 is not instrumented
+    (see EXCLUDED_SCRIPTS).
+    Args:
+        script (str): '00', '01' or '02'.
+        trace_memory (bool): Record tracemalloc peaks and top allocations per stage. Defaults to False.
+        profile (bool): Dump a cProfile file per stage. Defaults to False.
+        main_kwargs: Passed on to the main function of the script.
+    """
+    if script in EXCLUDED_SCRIPTS:
+        print(f"Script {script} is not instrumented: {EXCLUDED_SCRIPTS[script]}.")
+        return
+    script_name, function_names = SCRIPT_STAGES[script]
+    with RunInstrumentation(Path(script_name).stem, trace_memory=trace_memory, profile=profile) as run:
+        with run.stage('import'):
+            module = load_script_module(script_name, Path.cwd())
+        run.instrument_module(module, function_names)
+        if hasattr(module, 'main'):
+            module.main(**main_kwargs)
+        else:
+            module.perform_ffiec031_trend_analysis(module.load_processed_data(), module.load_reference_data())
+    print(summarize_run_report(run.report_path).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
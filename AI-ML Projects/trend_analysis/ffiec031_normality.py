@@ -0,0 +1,138 @@
+# Load packages
+import os
+import sqlite3
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from scipy.stats import shapiro
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+
+NORMALITY_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shapiro_pvalues (
+        series_hash TEXT PRIMARY KEY,
+        series_length INTEGER NOT NULL,
+        pvalue REAL,
+        recorded_at TEXT NOT NULL
+    );
+"""
+
+
+# Function to split a long-format column into one series per MDRM in a single pass
+def group_series(mdrms: pd.Series, values: pd.Series,
+                 report_dates: Optional[pd.Series] = None) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Sorts the rows once by MDRM (and report date) and cuts the values at the group boundaries, instead
+    of filtering the whole column once per MDRM. Missing values are left out of every series.
+    Args:
+        mdrms (pd.Series): MDRM of every row.
+        values (pd.Series): Value of every row.
+        report_dates (Optional[pd.Series]): Report date of every row, to order each series in time.
+            Defaults to keeping the row order.
+    Returns:
+        Tuple[np.ndarray, List[np.ndarray]]: A tuple containing:
+            - distinct_mdrms (np.ndarray): MDRMs in order of first appearance, like Series.unique().
+            - series (List[np.ndarray]): float64 non-missing values of every MDRM.
+    """
+    mdrm_codes, distinct_mdrms = pd.factorize(mdrms)
+    values = values.to_numpy(dtype=float, na_value=np.nan)
+    keep = (mdrm_codes >= 0) & ~np.isnan(values)
+    if report_dates is None:
+        order = np.argsort(mdrm_codes[keep], kind='stable')
+    else:
+        order = np.lexsort((report_dates.to_numpy()[keep], mdrm_codes[keep]))
+    sorted_values = values[keep][order]
+    counts = np.bincount(mdrm_codes[keep], minlength=len(distinct_mdrms))
+    series = np.split(sorted_values, np.cumsum(counts)[:-1]) if len(distinct_mdrms) else []
+    return np.asarray(distinct_mdrms, dtype=object), series
+
+
+# Function to hash the history of a series
+def hash_series(values: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(values, dtype='<f8').tobytes(), digest_size=16).hexdigest()
+
+
+# Function to run the Shapiro-Wilk test on a batch of series (in a worker process)
+def shapiro_pvalues(series_batch: List[np.ndarray]) -> List[float]:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return [float(shapiro(values).pvalue) for values in series_batch]
+
+
+# Function to read cached p-values for a list of series hashes
+def _read_cached_pvalues(cache: sqlite3.Connection, series_hashes: List[str]) -> Dict[str, float]:
+    cache.execute("CREATE TEMP TABLE IF NOT EXISTS requested_hashes (series_hash TEXT PRIMARY KEY)")
+    cache.execute("DELETE FROM requested_hashes")
+    cache.executemany("INSERT OR IGNORE INTO requested_hashes VALUES (?)", ((series_hash,) for series_hash in series_hashes))
+    rows = cache.execute(
+        "SELECT s.series_hash, s.pvalue FROM shapiro_pvalues s JOIN requested_hashes r ON s.series_hash = r.series_hash"
+    ).fetchall()
+    return {series_hash: np.nan if pvalue is None else pvalue for series_hash, pvalue in rows}
+
+
+# Function to test many series for normality, re-testing only series whose history changed
+def run_shapiro_wilk_tests(series: List[np.ndarray], cache_path: Optional[Path] = None,
+                           max_workers: Optional[int] = None, min_length: int = 3,
+                           series_per_task: int = 250) -> np.ndarray:
+    """
+    Looks every series up by the hash of its values in the SQLite cache, if there is one, and runs the
+    Shapiro-Wilk test only on the misses, spread over a process pool when there are many.
+    Args:
+        series (List[np.ndarray]): Non-missing values of every series, in time order.
+        cache_path (Optional[Path]): SQLite file keeping p-values between runs. Defaults to no file.
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+        min_length (int): Series shorter than this are not tested. Defaults to 3, the minimum of shapiro.
+        series_per_task (int): Series tested per task. Defaults to 250.
+    Returns: np.ndarray: p-value of every series, NaN for series shorter than min_length.
+    """
+    pvalues = np.full(len(series), np.nan)
+    testable = [position for position, values in enumerate(series) if len(values) >= min_length]
+    series_hashes = {position: hash_series(series[position]) for position in testable}
+
+    known = {}
+    cache = None
+    if cache_path is not None:
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        cache = sqlite3.connect(str(cache_path))
+        cache.executescript(NORMALITY_CACHE_SCHEMA)
+        known = _read_cached_pvalues(cache, list(set(series_hashes.values())))
+
+    # Identical histories (e.g. all-zero series) are tested once
+    missing = {}
+    for position in testable:
+        if series_hashes[position] not in known:
+            missing.setdefault(series_hashes[position], position)
+    missing_hashes = list(missing)
+    batches = [[series[missing[series_hash]] for series_hash in missing_hashes[start:start + series_per_task]]
+               for start in range(0, len(missing_hashes), series_per_task)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(batches) <= 1:
+        batch_pvalues = [shapiro_pvalues(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            batch_pvalues = list(executor.map(shapiro_pvalues, batches))
+    new_pvalues = dict(zip(missing_hashes, (pvalue for batch in batch_pvalues for pvalue in batch)))
+
+    known.update(new_pvalues)
+    for position in testable:
+        pvalues[position] = known[series_hashes[position]]
+
+    if cache is not None:
+        recorded_at = datetime.now().isoformat(timespec='seconds')
+        with cache:
+            cache.executemany(
+                "INSERT OR REPLACE INTO shapiro_pvalues VALUES (?, ?, ?, ?)",
+                [(series_hash, len(series[missing[series_hash]]), None if np.isnan(pvalue) else pvalue, recorded_at)
+                 for series_hash, pvalue in new_pvalues.items()]
+            )
+        cache.close()
+
+    reused = len(testable) - sum(series_hashes[position] in new_pvalues for position in testable)
+    print(f"Shapiro-Wilk: {len(testable)} series, {len(new_pvalues)} distinct histories tested and {reused} series "
+          f"reused from earlier runs.")
+    return pvalues
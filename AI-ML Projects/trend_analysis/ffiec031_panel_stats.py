@@ -0,0 +1,227 @@
+# Load packages
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional, Tuple
+
+
+FREQUENCY_CLASSES = ('quarterly', 'semi_annual', 'annual', 'non_reporting')
+
+# Prior report dates in the outlier window of each frequency class: 12 quarters, 5 years of June and
+# December filings and 10 years of December filings; None uses every prior report date
+FREQUENCY_WINDOWS = {'quarterly': 12, 'semi_annual': 10, 'annual': 10, 'non_reporting': None}
+FREQUENCY_MONTHS = {'quarterly': (3, 6, 9, 12), 'semi_annual': (6, 12), 'annual': (12,), 'non_reporting': (3, 6, 9, 12)}
+
+ROBUST_Z_CONSTANT = 0.6745
+
+# Reporting patterns of categorize_mdrms and the ReportingFrequency each one is labelled with
+CATEGORY_FREQUENCIES = {
+    'zero_quarter': 'Quarterly with Zeros',
+    'zero_quarter_novalue': 'Quarterly - Not Reported',
+    'zero_semi_annual': 'Semi-Annually with Zeros',
+    'zero_annual': 'Annually with Zeros',
+    'nonzero_quarter': 'Quarterly with Non-zeros',
+    'nonzero_semi_annual': 'Semi-Annually with Non-zeros',
+    'nonzero_annual': 'Annually with Non-zeros',
+}
+
+
+# Function to place long processed data into an MDRM x report date matrix
+def build_mdrm_quarter_matrix(proc_data: pd.DataFrame, report_dates: Optional[np.ndarray] = None
+                              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Places every value of the long processed data into an MDRM x report date matrix.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'MDRM', 'ReportDate' and 'Value' columns,
+            holding at most one row per MDRM and report date.
+        report_dates (Optional[np.ndarray]): Sorted report dates of the columns, e.g. those of the full data
+            when proc_data holds only some MDRMs. Defaults to the report dates of proc_data.
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: A tuple containing:
+            - mdrms (np.ndarray): MDRMs in order of first appearance (matrix rows).
+            - report_dates (np.ndarray): Sorted report dates (matrix columns).
+            - values (np.ndarray): float64 values, NaN where no value was reported.
+            - present (np.ndarray): Boolean mask of the MDRM and report date pairs that have a row.
+    """
+    mdrm_codes, mdrms = pd.factorize(proc_data['MDRM'].to_numpy(dtype=object))
+    if report_dates is None:
+        report_dates = np.sort(proc_data['ReportDate'].unique())
+    date_codes = np.searchsorted(report_dates, proc_data['ReportDate'].to_numpy())
+
+    values = np.full((len(mdrms), len(report_dates)), np.nan)
+    present = np.zeros((len(mdrms), len(report_dates)), dtype=bool)
+    values[mdrm_codes, date_codes] = proc_data['Value'].to_numpy(dtype=float)
+    present[mdrm_codes, date_codes] = True
+
+    return mdrms, report_dates, values, present
+
+
+# Function to categorize every row of an MDRM x report date matrix as of one report date
+def categorize_matrix_rows(values: np.ndarray, present: np.ndarray, report_dates: np.ndarray,
+                           current_position: Optional[int] = None, prior_totals: Optional[np.ndarray] = None,
+                           has_prior_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classifies every MDRM from the 8 report dates before the current one and the total of every value
+    before it, like categorize_mdrms. Later report dates are not looked at.
+    Args:
+        values (np.ndarray): float64 (MDRM x report date) matrix, NaN where not reported.
+        present (np.ndarray): Boolean mask of the MDRM and report date pairs that have a row.
+        report_dates (np.ndarray): Sorted report dates (matrix columns).
+        current_position (Optional[int]): Column of the current report date. Defaults to the latest one.
+        prior_totals (Optional[np.ndarray]): Total of every value before the current report date, e.g. kept
+            as a running sum. Defaults to summing the earlier columns.
+        has_prior_rows (Optional[np.ndarray]): Whether every MDRM has a row before the current report date.
+            Defaults to checking the earlier columns.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: A tuple containing:
+            - mdrm_category (np.ndarray): Key of CATEGORY_FREQUENCIES for every MDRM.
+            - has_prior_rows (np.ndarray): Whether every MDRM has a row before the current report date;
+              MDRMs without one are not reported.
+    """
+    num_dates = len(report_dates) if current_position is None else current_position + 1
+
+    # The current quarter is excluded; the 8 report dates before it form the recent window
+    recent_8quarters = slice(max(num_dates - 9, 0), max(num_dates - 1, 0))
+    window_months = pd.DatetimeIndex(report_dates[recent_8quarters]).month.to_numpy()
+    semi_annual_dates = np.isin(window_months, [6, 12])
+    annual_dates = window_months == 12
+
+    if has_prior_rows is None:
+        has_prior_rows = present[:, :max(num_dates - 1, 0)].any(axis=1)
+    if prior_totals is None:
+        prior_totals = np.nansum(values[:, :max(num_dates - 1, 0)], axis=1)
+
+    # NaN and zero bitmasks over the 8-quarter window
+    window_values = values[:, recent_8quarters]
+    window_present = present[:, recent_8quarters]
+    window_nan = window_present & np.isnan(window_values)
+    window_valid = window_present & ~np.isnan(window_values)
+    window_zero = window_valid & (window_values == 0)
+
+    recent_8quarter_value = np.nansum(window_values, axis=1)
+    missing_count = window_nan.sum(axis=1)
+    valid_count = window_valid.sum(axis=1)
+    annual_zero_count = (window_zero & annual_dates).sum(axis=1)
+    semi_annual_zero_count = (window_zero & semi_annual_dates).sum(axis=1)
+
+    # Most recent non-missing value in the window
+    window_size = window_valid.shape[1]
+    if window_size:
+        last_valid_position = window_size - 1 - np.argmax(window_valid[:, ::-1], axis=1)
+        last_valid_value = window_values[np.arange(len(values)), last_valid_position]
+    else:
+        last_valid_value = np.full(len(values), np.nan)
+
+    # Classify all MDRMs at once; conditions are checked in order like the original if/else chain
+    zero_balance = (prior_totals == 0) | (recent_8quarter_value == 0)
+    has_missing = missing_count > 0
+    conditions = [
+        zero_balance & has_missing & (missing_count == 6) & (annual_zero_count == 2),
+        zero_balance & has_missing & (missing_count == 4) & (semi_annual_zero_count == 4),
+        zero_balance & has_missing,
+        zero_balance,
+        (valid_count == 8) & (last_valid_value == 0),
+        valid_count == 2,
+        valid_count == 4,
+    ]
+    choices = ["zero_annual", "zero_semi_annual", "zero_quarter_novalue", "zero_quarter",
+               "zero_quarter", "nonzero_annual", "nonzero_semi_annual"]
+    return np.select(conditions, choices, default="nonzero_quarter"), has_prior_rows
+
+
+# Function to label categorized MDRMs with their ReportingFrequency
+def categories_to_frequencies(mdrm_category: np.ndarray, has_prior_rows: np.ndarray) -> np.ndarray:
+    frequencies = pd.Series(mdrm_category).map(CATEGORY_FREQUENCIES).to_numpy(dtype=object)
+    return np.where(has_prior_rows, frequencies, 'Not Reported')
+
+
+# Function to map reporting frequencies to frequency classes
+def classify_reporting_frequencies(mdrms: Iterable[str], ref_data: pd.DataFrame) -> np.ndarray:
+    """
+    Args:
+        mdrms (Iterable[str]): MDRMs to classify.
+        ref_data (pd.DataFrame): Reference data with 'MDRM' and 'ReportingFrequency' columns.
+    Returns: np.ndarray: Position in FREQUENCY_CLASSES of every MDRM, -1 for MDRMs not in ref_data.
+    """
+    frequency_map = ref_data.drop_duplicates('MDRM').set_index('MDRM')['ReportingFrequency']
+    frequencies = frequency_map.reindex(pd.Index(mdrms, dtype=object))
+    frequency_strings = frequencies.fillna('').astype(str)
+    return np.select(
+        [frequencies.isna().to_numpy() & ~frequencies.index.isin(frequency_map.index),
+         frequency_strings.str.startswith('Quarterly with').to_numpy(),
+         frequency_strings.str.startswith('Semi-Annually').to_numpy(),
+         frequency_strings.str.startswith('Annually').to_numpy()],
+        [-1, FREQUENCY_CLASSES.index('quarterly'), FREQUENCY_CLASSES.index('semi_annual'), FREQUENCY_CLASSES.index('annual')],
+        default=FREQUENCY_CLASSES.index('non_reporting')
+    )
+
+
+# Function to select the window of prior report dates of every frequency class
+def select_frequency_windows(report_dates: np.ndarray, current_position: int = -1,
+                             windows: Optional[Dict[str, Optional[int]]] = None) -> np.ndarray:
+    """
+    Args:
+        report_dates (np.ndarray): Sorted report dates (matrix columns).
+        current_position (int): Column of the current report date; only earlier columns are used.
+            Defaults to the latest report date.
+        windows (Optional[Dict[str, Optional[int]]]): Number of prior report dates per frequency class.
+            Defaults to FREQUENCY_WINDOWS.
+    Returns: np.ndarray: Boolean (frequency class x report date) mask of the windows.
+    """
+    windows = windows or FREQUENCY_WINDOWS
+    num_dates = len(report_dates)
+    current_position = current_position % num_dates if num_dates else 0
+    months = pd.DatetimeIndex(report_dates).month.to_numpy()
+    prior = np.arange(num_dates) < current_position
+
+    window_mask = np.zeros((len(FREQUENCY_CLASSES), num_dates), dtype=bool)
+    for class_position, frequency_class in enumerate(FREQUENCY_CLASSES):
+        eligible = np.flatnonzero(prior & np.isin(months, FREQUENCY_MONTHS[frequency_class]))
+        window_size = windows.get(frequency_class)
+        if window_size is not None:
+            eligible = eligible[len(eligible) - min(window_size, len(eligible)):]
+        window_mask[class_position, eligible] = True
+    return window_mask
+
+
+# Function to compute NaN-aware statistics of every row of a matrix over its own window of columns
+def grouped_window_stats(values: np.ndarray, window: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Computes per-series count, mean, standard deviation (ddof=1), median and median absolute deviation
+    from the series' own median in one pass over the matrix.
+    Args:
+        values (np.ndarray): float64 (series x report date) matrix, NaN where not reported.
+        window (np.ndarray): Boolean mask of the same shape selecting the columns of every series.
+    Returns: Dict[str, np.ndarray]: 'count', 'mean', 'std', 'median' and 'mad' per series; NaN where a
+        series has too few values.
+    """
+    windowed = np.where(window, values, np.nan)
+    valid = ~np.isnan(windowed)
+    count = valid.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)                 # All-NaN rows give NaN statistics
+        mean = np.where(valid, windowed, 0).sum(axis=1) / count
+        squared_deviation = np.where(valid, (windowed - mean[:, None]) ** 2, 0).sum(axis=1)
+        std = np.sqrt(squared_deviation / (count - 1))
+        std[count < 2] = np.nan
+        median = np.nanmedian(windowed, axis=1)
+        mad = np.nanmedian(np.abs(windowed - median[:, None]), axis=1)
+
+    return {'count': count, 'mean': mean, 'std': std, 'median': median, 'mad': mad}
+
+
+# Function to compute standard or robust z-scores of current values
+def compute_outlier_scores(current_values: np.ndarray, stats: Dict[str, np.ndarray],
+                           normality: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        current_values (np.ndarray): Current value of every series.
+        stats (Dict[str, np.ndarray]): Output of grouped_window_stats.
+        normality (np.ndarray): 'Yes' (standard z-score), 'No' (robust z-score) or anything else (0).
+    Returns: np.ndarray: z-scores; 0 where the spread is zero or unknown, NaN where the current value is.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        standard_z = np.where(stats['std'] > 0, (current_values - stats['mean']) / stats['std'], 0.0)
+        robust_z = np.where(stats['mad'] > 0, ROBUST_Z_CONSTANT * (current_values - stats['median']) / stats['mad'], 0.0)
+    return np.select([normality == 'Yes', normality == 'No'], [standard_z, robust_z], default=0.0)
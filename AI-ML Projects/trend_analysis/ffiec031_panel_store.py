@@ -0,0 +1,201 @@
+# Load packages
+import struct
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+
+# Layout of a panel store file:
+#   header | source key | report dates (int64 ns) | MDRM labels (fixed-width ASCII) | values (float64, MDRM x date) | validity bits
+# The value matrix is row-major, so the history of one MDRM is one contiguous slice of the file
+PANEL_MAGIC = b"FFPANEL1"
+PANEL_HEADER = struct.Struct("<8sIIII4Q")
+PANEL_VERSION = 2
+# Since version 2: mtime (ns), size and SHA-256 of the processed workbook saved with the panel, all zero if none
+PANEL_SOURCE = struct.Struct("<qQ32s")
+PANEL_ALIGNMENT = 64
+
+# Panel written by script 01 and read by script 02, the SQL benchmark and the ARIMA model, relative to the
+# project folder holding inputs/ and outputs/
+PANEL_STORE_PATH = Path("outputs") / "FFIEC031_Processed.panel"
+
+
+class PanelStore(NamedTuple):
+    mdrms: np.ndarray               # MDRM labels (matrix rows), sorted
+    report_dates: np.ndarray        # Report dates (matrix columns), sorted datetime64[ns]
+    values: np.ndarray              # float64 memory-mapped MDRM x report date matrix, NaN where not reported
+    valid_bits: np.ndarray          # Memory-mapped validity bitmask, one packed row per MDRM
+    mdrm_index: Dict[str, int]      # Row number of every MDRM
+
+
+# Function to round a file offset up to the alignment of the arrays
+def _align(offset: int) -> int:
+    return -(-offset // PANEL_ALIGNMENT) * PANEL_ALIGNMENT
+
+
+# Function to write processed data as a memory-mappable MDRM x report date panel
+def write_panel_store(proc_data: pd.DataFrame, file_path: Path, source_path: Optional[Path] = None) -> None:
+    """
+    Lays out the long processed data as an integer-coded MDRM x report date matrix and writes it with
+    a validity bitmask and a small header.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns,
+            holding at most one row per MDRM and report date.
+        file_path (Path): Path of the panel store file.
+        source_path (Optional[Path]): Workbook saved with the same data; its mtime, size and SHA-256 are
+            recorded so readers can tell whether a copy of it still matches the panel. Defaults to None.
+    """
+    mdrm_labels = proc_data['MDRM'].to_numpy(dtype=object)
+    mdrms = np.sort(pd.unique(mdrm_labels).astype(str))
+    report_dates = np.sort(proc_data['ReportDate'].unique()).astype('datetime64[ns]')
+    mdrm_codes = np.searchsorted(mdrms, mdrm_labels.astype(str))
+    date_codes = np.searchsorted(report_dates, proc_data['ReportDate'].to_numpy().astype('datetime64[ns]'))
+
+    values = np.full((len(mdrms), len(report_dates)), np.nan)
+    values[mdrm_codes, date_codes] = proc_data['Value'].to_numpy(dtype=float)
+    valid_bits = np.packbits(~np.isnan(values), axis=1)
+
+    mdrm_width = max((len(mdrm) for mdrm in mdrms), default=1)
+    source_key = PANEL_SOURCE.pack(0, 0, bytes(32))
+    if source_path is not None:
+        file_stat = Path(source_path).stat()
+        source_key = PANEL_SOURCE.pack(file_stat.st_mtime_ns, file_stat.st_size,
+                                       hashlib.sha256(Path(source_path).read_bytes()).digest())
+
+    dates_offset = _align(PANEL_HEADER.size + PANEL_SOURCE.size)
+    mdrms_offset = _align(dates_offset + report_dates.nbytes)
+    values_offset = _align(mdrms_offset + len(mdrms) * mdrm_width)
+    valid_offset = _align(values_offset + values.nbytes)
+    header = PANEL_HEADER.pack(PANEL_MAGIC, PANEL_VERSION, len(mdrms), len(report_dates), mdrm_width,
+                               dates_offset, mdrms_offset, values_offset, valid_offset)
+
+    # Write to a temporary file first so readers never map a half-written panel
+    temp_path = Path(file_path).with_suffix('.tmp')
+    temp_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(temp_path, 'wb') as file:
+        for offset, content in [(0, header),
+                                (PANEL_HEADER.size, source_key),
+                                (dates_offset, report_dates.view(np.int64).tobytes()),
+                                (mdrms_offset, mdrms.astype(f'S{mdrm_width}').tobytes()),
+                                (values_offset, values.tobytes()),
+                                (valid_offset, valid_bits.tobytes())]:
+            file.seek(offset)
+            file.write(content)
+    temp_path.replace(file_path)
+
+
+# Function to open a panel store without reading its value matrix
+def open_panel_store(file_path: Path) -> PanelStore:
+    """
+    Memory-maps a panel store; values are only read from disk when a slice of them is used.
+    Args: file_path (Path): Path of the panel store file.
+    Returns: PanelStore: The labels and the memory-mapped value matrix and validity bitmask.
+    Raises:
+        ValueError: If the file is not a panel store.
+    """
+    with open(file_path, 'rb') as file:
+        header = file.read(PANEL_HEADER.size)
+    (magic, _version, num_mdrms, num_dates, mdrm_width,
+     dates_offset, mdrms_offset, values_offset, valid_offset) = PANEL_HEADER.unpack(header)
+    if magic != PANEL_MAGIC:
+        raise ValueError(f"{file_path} is not an FFIEC 031 panel store.")
+
+    report_dates = np.memmap(file_path, dtype=np.int64, mode='r', offset=dates_offset, shape=(num_dates,))
+    mdrm_bytes = np.memmap(file_path, dtype=f'S{mdrm_width}', mode='r', offset=mdrms_offset, shape=(num_mdrms,))
+    values = np.memmap(file_path, dtype=np.float64, mode='r', offset=values_offset, shape=(num_mdrms, num_dates))
+    valid_bits = np.memmap(file_path, dtype=np.uint8, mode='r', offset=valid_offset,
+                           shape=(num_mdrms, -(-num_dates // 8)))
+
+    mdrms = np.char.decode(np.asarray(mdrm_bytes), 'ascii').astype(object)
+    return PanelStore(
+        mdrms=mdrms,
+        report_dates=np.asarray(report_dates).view('datetime64[ns]'),
+        values=values,
+        valid_bits=valid_bits,
+        mdrm_index={mdrm: row for row, mdrm in enumerate(mdrms)},
+    )
+
+
+# Function to read the source key (mtime, size and SHA-256 of the workbook) stored in a panel header
+def read_panel_source_key(file_path: Path) -> Optional[Dict]:
+    with open(file_path, 'rb') as file:
+        header = file.read(PANEL_HEADER.size + PANEL_SOURCE.size)
+    magic, version = PANEL_HEADER.unpack_from(header)[:2]
+    if magic != PANEL_MAGIC or version < 2:
+        return None
+    mtime_ns, size, sha256 = PANEL_SOURCE.unpack_from(header, PANEL_HEADER.size)
+    if not any(sha256):
+        return None
+    return {'mtime_ns': mtime_ns, 'size': size, 'sha256': sha256.hex()}
+
+
+# Function to check whether a workbook holds the data of a panel
+def panel_matches_source(file_path: Path, source_path: Path) -> Optional[bool]:
+    """
+    Compares a workbook with the source key in the panel header the way read_excel_cached compares it
+    with a sidecar: an equal mtime and size is trusted without hashing, otherwise the SHA-256 decides.
+    A copy with a new mtime but the same hash is recorded in the header so the next check skips the hash.
+    Args:
+        file_path (Path): Path of the panel store file.
+        source_path (Path): Workbook to compare.
+    Returns: Optional[bool]: Whether the workbook matches, or None if the panel records no source.
+    """
+    source_key = read_panel_source_key(file_path)
+    if source_key is None:
+        return None
+    file_stat = Path(source_path).stat()
+    if file_stat.st_size != source_key['size']:
+        return False
+    if file_stat.st_mtime_ns == source_key['mtime_ns']:
+        return True
+    sha256 = hashlib.sha256(Path(source_path).read_bytes()).digest()
+    if sha256.hex() != source_key['sha256']:
+        return False
+    with open(file_path, 'r+b') as file:
+        file.seek(PANEL_HEADER.size)
+        file.write(PANEL_SOURCE.pack(file_stat.st_mtime_ns, file_stat.st_size, sha256))
+    return True
+
+
+# Function to get the validity mask of one MDRM
+def get_panel_valid_mask(store: PanelStore, mdrm: str) -> np.ndarray:
+    row = store.mdrm_index[mdrm]
+    return np.unpackbits(store.valid_bits[row], count=len(store.report_dates)).astype(bool)
+
+
+# Function to read the history of one MDRM as a time series
+def read_panel_series(store: PanelStore, mdrm: str, dropna: bool = True) -> pd.DataFrame:
+    """
+    Slices the history of one MDRM out of the panel without touching the other rows.
+    Args:
+        store (PanelStore): Panel returned by open_panel_store.
+        mdrm (str): MDRM to read.
+        dropna (bool): Keep only report dates with a valid value. Defaults to True.
+    Returns: pd.DataFrame: A 'Value' column indexed by 'ReportDate'.
+    """
+    row_values = store.values[store.mdrm_index[mdrm]]
+    report_dates = store.report_dates
+    if dropna:
+        valid_mask = get_panel_valid_mask(store, mdrm)
+        row_values, report_dates = row_values[valid_mask], report_dates[valid_mask]
+    return pd.DataFrame({'Value': np.asarray(row_values)}, index=pd.DatetimeIndex(report_dates, name='ReportDate'))
+
+
+# Function to expand a panel (or some of its MDRMs) back into the long processed layout
+def panel_store_to_frame(store: PanelStore, mdrms: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Rebuilds the 'ReportDate', 'MDRM' and 'Value' columns written by process_ffiec031_sdf_files.
+    Args:
+        store (PanelStore): Panel returned by open_panel_store.
+        mdrms (Optional[Iterable[str]]): MDRMs to expand. Defaults to all MDRMs.
+    Returns: pd.DataFrame: Processed data sorted by MDRM and report date.
+    """
+    rows = np.arange(len(store.mdrms)) if mdrms is None else np.sort([store.mdrm_index[mdrm] for mdrm in mdrms])
+    num_dates = len(store.report_dates)
+    return pd.DataFrame({
+        'ReportDate': np.tile(store.report_dates, len(rows)),
+        'MDRM': np.repeat(store.mdrms[rows], num_dates),
+        'Value': np.asarray(store.values[rows]).ravel(),
+    })
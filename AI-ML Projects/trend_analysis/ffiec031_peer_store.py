@@ -0,0 +1,150 @@
+# Load packages
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from ffiec031_sdf_cache import load_sdf_files_cached
+from ffiec031_sdf_parser import clean_sdf_values
+
+
+# Hive partitions: one directory per quarter, then one per institution, e.g. quarter=20240930/rssd=480228
+PEER_PARTITIONING = ds.partitioning(pa.schema([('quarter', pa.int32()), ('rssd', pa.int64())]), flavor='hive')
+PEER_SCHEMA = pa.schema([
+    ('MDRM', pa.string()),
+    ('Value', pa.float64()),
+    ('LastUpdate', pa.int32()),
+    ('quarter', pa.int32()),
+    ('rssd', pa.int64()),
+])
+
+
+# Function to clean the SDF-layout history of many institutions into the rows of the peer store
+def prepare_peer_rows(hist_data: pd.DataFrame, static_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts values to numbers and drops static and TEXT MDRMs like process_ffiec031_sdf_files, but keeps
+    the institution and does not fill unreported quarters in.
+    Args:
+        hist_data (pd.DataFrame): Historical data in the SDF layout, for any number of institutions.
+        static_data (pd.DataFrame): Static data containing MDRM field names.
+    Returns: pd.DataFrame: 'MDRM', 'Value', 'LastUpdate', 'quarter' and 'rssd' columns.
+    """
+    values, drop_mask = clean_sdf_values(hist_data['Value'], hist_data['MDRM #'], static_data['field_name'].unique())
+    keep = ~drop_mask & hist_data['Call Date'].notna().to_numpy()
+    peer_df = pd.DataFrame({
+        'MDRM': hist_data['MDRM #'].to_numpy()[keep].astype(str),
+        'Value': values[keep],
+        'LastUpdate': pd.to_numeric(hist_data['Last Update'], errors='coerce').fillna(0).to_numpy(dtype=np.int32)[keep],
+        'quarter': hist_data['Call Date'].to_numpy(dtype=np.int32, na_value=0)[keep],
+        'rssd': hist_data['Bank RSSD Identifier'].to_numpy(dtype=np.int64)[keep],
+    })
+    return peer_df
+
+
+# Function to write peer rows into the partitioned store
+def write_peer_store(peer_data: pd.DataFrame, store_dir: Path, rows_per_group: int = 1024) -> None:
+    """
+    Writes one compressed Parquet file per quarter and institution, sorted by MDRM in small row groups so
+    a filter on MDRM skips the row groups (and files) that cannot hold it. Partitions present in
+    peer_data replace the ones already in the store; the others are left alone.
+    Args:
+        peer_data (pd.DataFrame): Output of prepare_peer_rows.
+        store_dir (Path): Root folder of the store.
+        rows_per_group (int): Rows per Parquet row group. Defaults to 1024.
+    """
+    table = pa.Table.from_pandas(
+        peer_data.sort_values(['quarter', 'rssd', 'MDRM'], ignore_index=True), schema=PEER_SCHEMA, preserve_index=False
+    )
+    ds.write_dataset(
+        table,
+        store_dir,
+        format='parquet',
+        partitioning=PEER_PARTITIONING,
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        min_rows_per_group=rows_per_group,
+        max_rows_per_group=rows_per_group,
+    )
+
+
+# Function to open the partitioned store as a dataset
+def open_peer_store(store_dir: Path) -> ds.Dataset:
+    return ds.dataset(store_dir, format='parquet', partitioning=PEER_PARTITIONING, schema=PEER_SCHEMA)
+
+
+# Function to list the quarters (YYYYMMDD) held in the store from its partition directories
+def list_peer_quarters(store_dir: Path) -> List[int]:
+    return sorted(int(path.name.split('=')[1]) for path in Path(store_dir).glob('quarter=*'))
+
+
+# Function to read a slice of the store
+def read_peer_store(store_dir: Path, mdrms: Optional[Iterable[str]] = None, rssd_ids: Optional[Iterable[int]] = None,
+                    last_n_quarters: Optional[int] = None) -> pd.DataFrame:
+    """
+    Reads the rows of some MDRMs, institutions and quarters; partition filters skip unrelated directories
+    and MDRM filters skip row groups through their statistics.
+    Args:
+        store_dir (Path): Root folder of the store.
+        mdrms (Optional[Iterable[str]]): MDRMs to read. Defaults to all MDRMs.
+        rssd_ids (Optional[Iterable[int]]): RSSD IDs to read. Defaults to all institutions.
+        last_n_quarters (Optional[int]): Read only the latest quarters in the store. Defaults to all quarters.
+    Returns: pd.DataFrame: 'rssd', 'MDRM', 'ReportDate' and 'Value' columns.
+    """
+    filters = []
+    if last_n_quarters is not None:
+        filters.append(ds.field('quarter').isin(list_peer_quarters(store_dir)[-last_n_quarters:]))
+    if rssd_ids is not None:
+        filters.append(ds.field('rssd').isin([int(rssd_id) for rssd_id in rssd_ids]))
+    if mdrms is not None:
+        mdrms = list(mdrms)
+        # Single MDRMs use an equality test so the row group statistics can be used for skipping
+        filters.append(ds.field('MDRM') == mdrms[0] if len(mdrms) == 1 else ds.field('MDRM').isin(mdrms))
+    row_filter = None
+    for expression in filters:
+        row_filter = expression if row_filter is None else row_filter & expression
+
+    peer_df = open_peer_store(store_dir).to_table(
+        columns=['rssd', 'MDRM', 'quarter', 'Value'], filter=row_filter
+    ).to_pandas()
+    peer_df['ReportDate'] = pd.to_datetime(peer_df.pop('quarter').astype(str), format='%Y%m%d')
+    return peer_df[['rssd', 'MDRM', 'ReportDate', 'Value']]
+
+
+# Function to lay a slice of the store out as a dense bank x MDRM x quarter array
+def read_peer_cube(store_dir: Path, mdrms: Optional[Iterable[str]] = None, rssd_ids: Optional[Iterable[int]] = None,
+                   last_n_quarters: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reads a slice of the store with read_peer_store and places it in a float64 cube.
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: A tuple containing:
+            - rssd_ids (np.ndarray): Sorted RSSD IDs (first axis).
+            - mdrms (np.ndarray): Sorted MDRMs (second axis).
+            - report_dates (np.ndarray): Sorted report dates (third axis).
+            - values (np.ndarray): Values, NaN where an institution did not report an MDRM for a quarter.
+    """
+    peer_df = read_peer_store(store_dir, mdrms, rssd_ids, last_n_quarters)
+    rssd_codes, rssd_ids = pd.factorize(peer_df['rssd'], sort=True)
+    mdrm_codes, mdrms = pd.factorize(peer_df['MDRM'], sort=True)
+    date_codes, report_dates = pd.factorize(peer_df['ReportDate'], sort=True)
+
+    values = np.full((len(rssd_ids), len(mdrms), len(report_dates)), np.nan)
+    values[rssd_codes, mdrm_codes, date_codes] = peer_df['Value'].to_numpy(dtype=float)
+    return np.asarray(rssd_ids), np.asarray(mdrms, dtype=object), np.asarray(report_dates), values
+
+
+def main():
+    """ Builds the peer store from every SDF file in inputs/ffiec_031_sdf_files. """
+    rootdir = Path.cwd()
+    sdf_dir = rootdir / 'inputs' / 'ffiec_031_sdf_files'
+    hist_df = load_sdf_files_cached(sorted(sdf_dir.rglob("*.SDF")), rootdir / 'inputs' / 'ffiec_031_sdf_cache')
+    static_df = pd.read_csv(rootdir / 'inputs' / 'FFIEC_031_AX_Report_Static_Data.csv')
+    peer_df = prepare_peer_rows(hist_df, static_df)
+    write_peer_store(peer_df, rootdir / 'outputs' / 'ffiec031_peer_store')
+    print(f"Wrote {len(peer_df)} rows for {peer_df['rssd'].nunique()} institution(s) "
+          f"and {peer_df['quarter'].nunique()} quarter(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Load packages
+import hashlib
+import pandas as pd
+import pyarrow as pa
+from pathlib import Path
+from typing import Dict, List
+from ffiec031_sdf_manifest import open_manifest, sync_manifest
+from ffiec031_sdf_parser import CATEGORY_COLUMNS, SDF_DTYPES
+
+
+# Function to look up the SHA-256 of every SDF file, hashing only files the manifest has not seen
+def get_sdf_file_hashes(file_paths: List[Path]) -> Dict[Path, str]:
+    """
+    Reads SDF checksums from the manifest of each folder; files outside the manifest are hashed directly.
+    Args: file_paths (List[Path]): SDF files to look up.
+    Returns: Dict[Path, str]: SHA-256 hex digests keyed by file path.
+    """
+    file_hashes = {}
+    for folder in {file_path.parent for file_path in file_paths}:
+        manifest = open_manifest(str(folder))
+        sync_manifest(manifest, str(folder))
+        recorded_hashes = dict(manifest.execute("SELECT filename, sha256 FROM sdf_manifest"))
+        manifest.close()
+        for file_path in file_paths:
+            if file_path.parent == folder and file_path.name in recorded_hashes:
+                file_hashes[file_path] = recorded_hashes[file_path.name]
+
+    for file_path in file_paths:
+        if file_path not in file_hashes:
+            file_hashes[file_path] = hashlib.sha256(file_path.read_bytes()).hexdigest()
+    return file_hashes
+
+
+# Function to give every dictionary column int32 indices, so fragments with few or many categories concatenate
+def widen_dictionary_indices(table: pa.Table) -> pa.Table:
+    schema = pa.schema([
+        pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type)) if pa.types.is_dictionary(field.type)
+        else field for field in table.schema
+    ], metadata=table.schema.metadata)
+    return table if schema.equals(table.schema) else table.cast(schema)
+
+
+# Function to parse one SDF file into a typed Arrow fragment in the cache
+def write_sdf_fragment(file_path: Path, fragment_path: Path) -> None:
+    sdf_df = pd.read_csv(file_path, sep=';', dtype=SDF_DTYPES)
+    table = widen_dictionary_indices(pa.Table.from_pandas(sdf_df, preserve_index=False))
+    temp_path = fragment_path.with_suffix('.tmp')
+    with pa.OSFile(str(temp_path), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    temp_path.replace(fragment_path)
+
+
+# Function to memory-map a cached Arrow fragment without copying it
+def read_sdf_fragment(fragment_path: Path) -> pa.Table:
+    with pa.memory_map(str(fragment_path), 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+# Function to load SDF files through the columnar cache
+def load_sdf_files_cached(file_paths: List[Path], cache_dir: Path, prune: bool = True) -> pd.DataFrame:
+    """
+    Loads SDF files from typed Arrow fragments keyed by file hash; only new or changed files are parsed.
+    Args:
+        file_paths (List[Path]): SDF files to load.
+        cache_dir (Path): Folder holding the cached fragments.
+        prune (bool): Remove fragments of files that are no longer loaded. Defaults to True.
+    Returns: pd.DataFrame: The combined historical data with the SDF_DTYPES schema.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    file_hashes = get_sdf_file_hashes(list(file_paths))
+
+    tables = []
+    count_parsed = 0
+    for file_path, file_hash in file_hashes.items():
+        fragment_path = cache_dir / f"{file_hash}.arrow"
+        if not fragment_path.exists():
+            write_sdf_fragment(file_path, fragment_path)
+            count_parsed += 1
+        tables.append(widen_dictionary_indices(read_sdf_fragment(fragment_path)))      # Also fragments of older runs
+
+    if prune:
+        wanted_fragments = {f"{file_hash}.arrow" for file_hash in file_hashes.values()}
+        for fragment_path in cache_dir.glob("*.arrow"):
+            if fragment_path.name not in wanted_fragments:
+                fragment_path.unlink()
+
+    print(f"Loaded {len(tables)} SDF file(s) from the cache, {count_parsed} of which were parsed.")
+    # Each fragment has its own dictionaries; unify them so the categorical columns share one set of categories,
+    # sorted like the categories built by the parallel parser so that sorting by MDRM stays alphabetical
+    hist_df = pa.concat_tables(tables).unify_dictionaries().to_pandas()
+    for column in CATEGORY_COLUMNS:
+        hist_df[column] = hist_df[column].cat.reorder_categories(sorted(hist_df[column].cat.categories))
+    return hist_df
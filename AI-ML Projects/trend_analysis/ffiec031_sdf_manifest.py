@@ -0,0 +1,148 @@
+# Load packages
+import os
+import re
+import csv
+import sqlite3
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+
+MANIFEST_FILENAME = "sdf_manifest.sqlite"
+SDF_FILENAME_PATTERN = re.compile(r'^Call_Cert(\d+)_(\d{6})\.SDF$')
+
+MANIFEST_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sdf_manifest (
+        filename TEXT PRIMARY KEY,
+        cert_number INTEGER NOT NULL,
+        rssd_id INTEGER,
+        quarter_end_date TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        last_update TEXT,
+        recorded_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_sdf_manifest_cert_quarter ON sdf_manifest (cert_number, quarter_end_date);
+    CREATE INDEX IF NOT EXISTS idx_sdf_manifest_rssd_quarter ON sdf_manifest (rssd_id, quarter_end_date);
+"""
+
+
+# Function to open (and create if needed) the manifest of a download folder
+def open_manifest(download_folder: str) -> sqlite3.Connection:
+    """
+    Opens the SQLite manifest stored next to the SDF files.
+    Args: download_folder (str): Folder holding the SDF files.
+    Returns: sqlite3.Connection: Connection to the manifest database.
+    """
+    manifest = sqlite3.connect(os.path.join(download_folder, MANIFEST_FILENAME))
+    manifest.executescript(MANIFEST_SCHEMA)
+    return manifest
+
+
+# Function to read the checksum, RSSD ID and latest 'Last Update' of an SDF file in one pass
+def describe_sdf_file(file_path: str) -> Dict[str, Optional[str]]:
+    """
+    Reads an SDF file once to compute its SHA-256 and pick up the RSSD ID and latest 'Last Update'.
+    Args: file_path (str): Path to the SDF file.
+    Returns: Dict[str, Optional[str]]: The 'sha256', 'rssd_id' and 'last_update' of the file.
+    """
+    with open(file_path, 'rb') as file:
+        content = file.read()
+
+    rssd_id = None
+    last_update = None
+    rows = csv.DictReader(content.decode('utf-8', errors='replace').splitlines(), delimiter=';')
+    for row in rows:
+        rssd_id = rssd_id or row.get('Bank RSSD Identifier')
+        row_last_update = row.get('Last Update')
+        if row_last_update and (last_update is None or row_last_update > last_update):
+            last_update = row_last_update
+
+    return {
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "rssd_id": int(rssd_id) if rssd_id and rssd_id.isdigit() else None,
+        "last_update": last_update,
+    }
+
+
+# Function to bring the manifest up to date with the SDF files in the download folder
+def sync_manifest(manifest: sqlite3.Connection, download_folder: str) -> int:
+    """
+    Scans the download folder once and records new or changed SDF files. Files whose size and
+    modification time match the manifest are not re-read; files that disappeared are removed.
+    Args:
+        manifest (sqlite3.Connection): Connection returned by open_manifest.
+        download_folder (str): Folder holding the SDF files.
+    Returns: int: Number of SDF files that were (re-)recorded.
+    """
+    recorded = {
+        filename: (size, mtime_ns)
+        for filename, size, mtime_ns in manifest.execute("SELECT filename, size, mtime_ns FROM sdf_manifest")
+    }
+    seen_filenames = set()
+    recorded_at = datetime.now().isoformat(timespec='seconds')
+    changed_rows = []
+
+    with os.scandir(download_folder) as entries:
+        for entry in entries:
+            match = SDF_FILENAME_PATTERN.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            seen_filenames.add(entry.name)
+            stat = entry.stat()
+            if recorded.get(entry.name) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            cert_number, quarter_end_date_short = match.groups()
+            file_description = describe_sdf_file(entry.path)
+            changed_rows.append((
+                entry.name,
+                int(cert_number),
+                file_description["rssd_id"],
+                '20' + quarter_end_date_short[-2:] + quarter_end_date_short[:4],     # YYYYMMDD
+                stat.st_size,
+                stat.st_mtime_ns,
+                file_description["sha256"],
+                file_description["last_update"],
+                recorded_at,
+            ))
+
+    removed_filenames = [(filename,) for filename in recorded if filename not in seen_filenames]
+    with manifest:
+        manifest.executemany("INSERT OR REPLACE INTO sdf_manifest VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", changed_rows)
+        manifest.executemany("DELETE FROM sdf_manifest WHERE filename = ?", removed_filenames)
+
+    return len(changed_rows)
+
+
+# Function to find which of the expected SDF files of an institution are not recorded in the manifest
+def find_unrecorded_sdf_files(manifest: sqlite3.Connection, cert_number: int, filenames: Iterable[str]) -> List[str]:
+    """
+    Looks up the recorded files of one institution with a single indexed query.
+    Args:
+        manifest (sqlite3.Connection): Connection returned by open_manifest.
+        cert_number (int): Cert number of the institution.
+        filenames (Iterable[str]): Expected SDF file names, in order.
+    Returns: List[str]: The expected file names that are missing, in the given order.
+    """
+    recorded_filenames = {
+        filename for (filename,) in
+        manifest.execute("SELECT filename FROM sdf_manifest WHERE cert_number = ?", (cert_number,))
+    }
+    return [filename for filename in filenames if filename not in recorded_filenames]
+
+
+# Function to list every SDF file name recorded in the manifest
+def list_recorded_sdf_files(manifest: sqlite3.Connection) -> set:
+    return {filename for (filename,) in manifest.execute("SELECT filename FROM sdf_manifest")}
+
+
+# Function to get the most recent quarter end date (YYYYMMDD) recorded in the manifest
+def find_latest_recorded_quarter(manifest: sqlite3.Connection, cert_number: Optional[int] = None) -> Optional[str]:
+    if cert_number is None:
+        row = manifest.execute("SELECT MAX(quarter_end_date) FROM sdf_manifest").fetchone()
+    else:
+        row = manifest.execute(
+            "SELECT MAX(quarter_end_date) FROM sdf_manifest WHERE cert_number = ?", (cert_number,)
+        ).fetchone()
+    return row[0]
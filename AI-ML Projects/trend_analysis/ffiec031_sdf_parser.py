@@ -0,0 +1,163 @@
+# Load packages
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Explicit schema of the SDF files: 'Value' stays a string because it mixes amounts, percentages and text;
+# the dates are nullable so one blank cell does not fail the whole batch
+SDF_DTYPES = {
+    'Call Date': 'Int32',
+    'Bank RSSD Identifier': 'int64',
+    'MDRM #': 'category',
+    'Value': 'str',
+    'Last Update': 'Int32',
+    'Short Definition': 'category',
+    'Call Schedule': 'category',
+    'Line Number': 'category',
+}
+CATEGORY_COLUMNS = [column for column, dtype in SDF_DTYPES.items() if dtype == 'category']
+
+# Below this many bytes of SDF files the process pool costs more than it saves: starting two spawned workers
+# (the Windows default) took 1.5 s, while the 95 checked-in files (17 MB) parse in-process in about 0.5 s
+PARALLEL_MIN_BYTES = 128 * 1024 ** 2
+
+
+# Function to convert parsed SDF values to floats and flag the rows of TEXT and static MDRMs
+def clean_sdf_values(values: pd.Series, mdrms: pd.Series,
+                     static_mdrms: Iterable[str] = ()) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts the 'Value' column to float64 and builds the mask of rows to drop. This runs after
+    parsing, as its own vectorised step over the parsed column, not inside read_csv: numeric strings are
+    converted in one call, only the strings that fail it (percentages and text) are stripped of trailing
+    '%' and tried again, and anything still not numeric becomes NaN. MDRMs are classified once per
+    distinct MDRM (a category of the parsed column) rather than once per row.
+    Args:
+        values (pd.Series): Raw 'Value' column.
+        mdrms (pd.Series): 'MDRM #' column, categorical or not.
+        static_mdrms (Iterable[str]): MDRMs to drop, e.g. the field names of the static data. Defaults to none.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: A tuple containing:
+            - numeric_values (np.ndarray): float64 values, NaN where a value is missing or not numeric.
+            - drop_mask (np.ndarray): True for rows of TEXT MDRMs and static MDRMs.
+    """
+    numeric_values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    retry = np.isnan(numeric_values) & values.notna().to_numpy()
+    if retry.any():
+        numeric_values[retry] = pd.to_numeric(
+            values[retry].astype(str).str.rstrip('%'), errors='coerce'
+        ).to_numpy(dtype=float, na_value=np.nan)
+
+    if isinstance(mdrms.dtype, pd.CategoricalDtype):
+        mdrm_codes, distinct_mdrms = mdrms.cat.codes.to_numpy(), mdrms.cat.categories
+    else:
+        mdrm_codes, distinct_mdrms = pd.factorize(mdrms)
+    distinct_mdrms = pd.Index(distinct_mdrms).astype(str)
+    drop_distinct = distinct_mdrms.str.contains('TEXT', regex=False) | distinct_mdrms.isin(set(static_mdrms))
+    # Code -1 (missing MDRM) maps to the appended False
+    drop_mask = np.append(np.asarray(drop_distinct, dtype=bool), False)[mdrm_codes]
+
+    return numeric_values, drop_mask
+
+
+# Function to parse a batch of SDF files into one set of column arrays
+def parse_sdf_batch(file_paths: List[Path]) -> Dict[str, np.ndarray]:
+    """
+    Parses SDF files with the explicit schema and returns plain column arrays, with categorical
+    columns as (categories, codes) so they are cheap to send back from a worker process.
+    Args: file_paths (List[Path]): SDF files to parse.
+    Returns: Dict[str, np.ndarray]: Column arrays keyed by column name.
+    """
+    # Categorical columns are read as strings and nullable integers as plain numbers, and both are converted
+    # once per batch, which is cheaper than building categories or masks for every file
+    read_dtypes = {column: 'str' if dtype == 'category' else dtype for column, dtype in SDF_DTYPES.items()
+                   if dtype != 'Int32'}
+    batch_df = pd.concat(
+        [pd.read_csv(file_path, sep=';', dtype=read_dtypes) for file_path in file_paths],
+        axis=0, ignore_index=True
+    )
+    batch_df = batch_df.astype({column: dtype for column, dtype in SDF_DTYPES.items() if dtype == 'Int32'})
+    columns = {}
+    for column in SDF_DTYPES:
+        if column in CATEGORY_COLUMNS:
+            values = batch_df[column].astype('category')
+            columns[column] = (np.asarray(values.cat.categories, dtype=object), values.cat.codes.to_numpy())
+        else:
+            # Nullable columns keep their mask, which a plain NumPy array cannot hold
+            is_nullable = pd.api.types.is_extension_array_dtype(batch_df[column].dtype)
+            columns[column] = batch_df[column].array if is_nullable else batch_df[column].to_numpy()
+    return columns
+
+
+# Function to combine the column arrays of all batches into one DataFrame with a single allocation per column
+def combine_sdf_batches(batches: List[Dict[str, np.ndarray]]) -> pd.DataFrame:
+    """
+    Copies every batch into preallocated column arrays; categorical columns share one sorted set of categories.
+    Args: batches (List[Dict[str, np.ndarray]]): Results of parse_sdf_batch.
+    Returns: pd.DataFrame: The combined historical data.
+    """
+    batch_lengths = [len(batch['Call Date']) for batch in batches]
+    offsets = np.concatenate([[0], np.cumsum(batch_lengths)])
+    total_length = int(offsets[-1])
+
+    combined = {}
+    for column in SDF_DTYPES:
+        if column in CATEGORY_COLUMNS:
+            categories = pd.Index(sorted(set().union(*(batch[column][0] for batch in batches))))
+            codes = np.empty(total_length, dtype=np.int32)
+            for batch, start, end in zip(batches, offsets[:-1], offsets[1:]):
+                batch_categories, batch_codes = batch[column]
+                # Map the batch's own category codes onto the shared categories; -1 (missing) stays -1
+                code_map = np.append(categories.get_indexer(batch_categories), -1).astype(np.int32)
+                codes[start:end] = code_map[batch_codes]
+            combined[column] = pd.Categorical.from_codes(codes, categories=categories)
+        elif not batches:
+            combined[column] = pd.array([], dtype=SDF_DTYPES[column])
+        elif isinstance(batches[0][column], np.ndarray):
+            values = np.empty(total_length, dtype=batches[0][column].dtype)
+            for batch, start, end in zip(batches, offsets[:-1], offsets[1:]):
+                values[start:end] = batch[column]
+            combined[column] = values
+        else:
+            combined[column] = pd.concat([pd.Series(batch[column], copy=False) for batch in batches],
+                                         ignore_index=True).array
+
+    return pd.DataFrame(combined)
+
+
+# Function to parse SDF files on a process pool
+def load_sdf_files_parallel(file_paths: List[Path], max_workers: Optional[int] = None,
+                            files_per_batch: Optional[int] = None,
+                            min_parallel_bytes: int = PARALLEL_MIN_BYTES) -> pd.DataFrame:
+    """
+    Parses SDF files in batches across worker processes and combines them into one DataFrame. Corpora
+    smaller than min_parallel_bytes are parsed in-process, where the pool would only add its start-up.
+    Measured with ffiec031_benchmark_sdf_parser on one CPU, the 95 checked-in files (17 MB) parse in
+    0.47 s in-process, 0.64 s on a forced pool of two workers and 0.34 s with the untyped read_csv loop;
+    the typed schema costs parse time but gives categorical columns and nullable dates.
+    Args:
+        file_paths (List[Path]): SDF files to parse.
+        max_workers (Optional[int]): Number of worker processes. Defaults to the number of CPUs.
+        files_per_batch (Optional[int]): Files parsed per task. Defaults to spreading the files
+            over about four tasks per worker.
+        min_parallel_bytes (int): Total file size from which the process pool is used. Defaults to
+            PARALLEL_MIN_BYTES; 0 always uses the pool.
+    Returns: pd.DataFrame: The combined historical data with the SDF_DTYPES schema.
+    """
+    file_paths = list(file_paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    if sum(os.path.getsize(file_path) for file_path in file_paths) < min_parallel_bytes:
+        max_workers = 1
+    files_per_batch = files_per_batch or max(1, -(-len(file_paths) // (max_workers * 4)))
+    file_batches = [file_paths[i:i + files_per_batch] for i in range(0, len(file_paths), files_per_batch)]
+
+    if max_workers == 1 or len(file_batches) <= 1:
+        batches = [parse_sdf_batch(file_batch) for file_batch in file_batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            batches = list(executor.map(parse_sdf_batch, file_batches))
+
+    return combine_sdf_batches(batches)
@@ -0,0 +1,130 @@
+# Load packages
+import os
+import re
+import time
+import secrets
+import threading
+from pathlib import Path
+from typing import Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+FACSIMILE_PATH = "/Public/ViewFacsimileDirect.aspx"
+
+FACSIMILE_PAGE = """<html>
+<body>
+<form method="post" action="./ViewFacsimileDirect.aspx?{query}" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{view_state}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="2F5BB46A" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{view_state}" />
+<input type="submit" name="Download_SDF_3" value="Download SDF" id="Download_SDF_3" />
+</form>
+</body>
+</html>"""
+
+
+# Function to index the SDF files of a folder by their quarter end date (MMDDYYYY)
+def index_sdf_files(sdf_folder: Path) -> dict:
+    sdf_files = {}
+    for file in Path(sdf_folder).glob("*.SDF"):
+        match = re.search(r'_(\d{6})\.', file.name)
+        if match:
+            result = match.group(1)
+            sdf_files[result[:4] + '20' + result[-2:]] = file
+    return sdf_files
+
+
+# Function to create the request handler serving the facsimile page and its SDF postback
+def create_facsimile_handler(sdf_files: dict, latency: float = 0.0):
+    """
+    Creates a request handler mimicking the CDR facsimile page: GET returns the ASP.NET form with the
+    'Download_SDF_3' button, and posting the form back returns the SDF file of the requested quarter.
+    Args:
+        sdf_files (dict): SDF file paths keyed by quarter end date (MMDDYYYY).
+        latency (float): Seconds to wait before every response, to mimic the remote server. Defaults to 0.0.
+    Returns: A BaseHTTPRequestHandler subclass.
+    """
+    issued_view_states = set()
+
+    class FacsimileHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def find_sdf_file(self):
+            url = urlsplit(self.path)
+            if url.path != FACSIMILE_PATH:
+                return url, None
+            quarter_end_date = parse_qs(url.query).get("date", [""])[0]
+            return url, sdf_files.get(quarter_end_date)
+
+        def send_body(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            url, sdf_file = self.find_sdf_file()
+            if sdf_file is None:
+                self.send_body(404, b"Not found", "text/plain")
+                return
+            view_state = secrets.token_urlsafe(24)
+            issued_view_states.add(view_state)
+            page = FACSIMILE_PAGE.format(query=url.query, view_state=view_state)
+            self.send_body(200, page.encode("utf-8"), "text/html; charset=utf-8")
+
+        def do_POST(self):
+            time.sleep(latency)
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            url, sdf_file = self.find_sdf_file()
+            if sdf_file is None:
+                self.send_body(404, b"Not found", "text/plain")
+                return
+            if form.get("__VIEWSTATE", [""])[0] not in issued_view_states or "Download_SDF_3" not in form:
+                # ASP.NET re-renders the page when the postback is not recognised
+                self.send_body(200, b"<html><body>Invalid postback</body></html>", "text/html")
+                return
+            self.send_body(200, sdf_file.read_bytes(), "text/plain",
+                           {"Content-Disposition": f'attachment; filename="{sdf_file.name}"'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return FacsimileHandler
+
+
+# Function to start the stand-in facsimile server on a background thread
+def start_stub_server(sdf_folder: Path, host: str = "127.0.0.1", port: int = 0,
+                      latency: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serves the SDF files of a folder the way the CDR facsimile page does, for offline benchmarks.
+    Args:
+        sdf_folder (Path): Folder with the SDF files to serve, e.g. inputs/ffiec_031_sdf_files.
+        host (str): Interface to listen on. Defaults to '127.0.0.1'.
+        port (int): Port to listen on; 0 picks a free port. Defaults to 0.
+        latency (float): Seconds to wait before every response. Defaults to 0.0.
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The running server (call shutdown() to stop it) and the
+        facsimile page URL to pass as base_url.
+    """
+    handler = create_facsimile_handler(index_sdf_files(sdf_folder), latency)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}{FACSIMILE_PATH}"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    sdf_folder = Path.cwd() / "inputs" / "ffiec_031_sdf_files"
+    server, base_url = start_stub_server(sdf_folder, port=int(os.environ.get("PORT", 8031)))
+    print(f"Serving {len(index_sdf_files(sdf_folder))} SDF files at {base_url} - press Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,204 @@
+# Load packages
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+SDF_HEADER = ['Call Date', 'Bank RSSD Identifier', 'MDRM #', 'Value', 'Last Update',
+              'Short Definition', 'Call Schedule', 'Line Number']
+
+# Share of the MDRMs given to each kind of line item
+ITEM_KIND_SHARES = {
+    'quarterly': 0.55,          # Non-zero every quarter
+    'zero_quarterly': 0.12,     # Zero every quarter
+    'semi_annual': 0.08,        # Reported in June and December only
+    'annual': 0.08,             # Reported in December only
+    'discontinued': 0.05,       # Reported for the first part of the history only
+    'percentage': 0.06,         # Ratios written as '7.5923%'
+    'text': 0.03,               # TEXT MDRMs with free text values
+    'static': 0.03,             # MDRMs listed in the static data
+}
+MDRM_PREFIXES = ['RCFD', 'RCON', 'RIAD', 'RCFA', 'RCFN']
+CALL_SCHEDULES = ['RC', 'RCA', 'RCB', 'RCC', 'RCE', 'RCF', 'RCG', 'RCK', 'RCL', 'RCRI', 'RCRII', 'RI', 'RIA']
+TEXT_VALUES = ['Accounts Receivable', 'Prepaid expenses', 'Deferred compensation', 'Other liabilities', 'N/A']
+
+
+# Function to draw the MDRMs of a synthetic corpus and the kind of line item each one is
+def generate_mdrm_catalog(num_mdrms: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Draws distinct MDRM codes, assigns each one a kind from ITEM_KIND_SHARES and the parameters of its
+    random walk.
+    Args:
+        num_mdrms (int): Number of MDRMs.
+        seed (int): Random seed. Defaults to 0.
+    Returns: pd.DataFrame: 'MDRM', 'Kind', 'Level', 'Volatility', 'Schedule', 'LineNumber' and
+        'Definition' columns.
+    """
+    rng = np.random.default_rng(seed)
+    kinds = list(ITEM_KIND_SHARES)
+    shares = np.array(list(ITEM_KIND_SHARES.values()))
+    mdrm_kinds = rng.choice(kinds, size=num_mdrms, p=shares / shares.sum())
+
+    # Distinct four-digit item numbers; the prefix depends on the kind like the real report
+    item_numbers = rng.permutation(10000)[:num_mdrms] if num_mdrms <= 10000 else np.arange(num_mdrms)
+    prefixes = rng.choice(MDRM_PREFIXES, size=num_mdrms)
+    prefixes = np.where(mdrm_kinds == 'text', 'TEXT', prefixes)
+    prefixes = np.where(mdrm_kinds == 'percentage', 'RCFA', prefixes)
+    prefixes = np.where(mdrm_kinds == 'static', 'TE01', prefixes)
+    mdrms = [f"{prefix}{number:04d}" if number < 10000 else f"{prefix[:2]}{number:06d}"
+             for prefix, number in zip(prefixes, item_numbers)]
+
+    catalog = pd.DataFrame({
+        'MDRM': mdrms,
+        'Kind': mdrm_kinds,
+        'Level': np.round(10 ** rng.uniform(3, 8, size=num_mdrms)),
+        'Volatility': rng.uniform(0.01, 0.25, size=num_mdrms),
+        'Schedule': rng.choice(CALL_SCHEDULES, size=num_mdrms),
+        'LineNumber': [f"{line}{suffix}" for line, suffix in
+                       zip(rng.integers(1, 60, size=num_mdrms), rng.choice(['', 'a', 'b', 'c'], size=num_mdrms))],
+    })
+    catalog['Definition'] = 'Synthetic ' + catalog['Kind'].str.replace('_', ' ') + ' item ' + catalog['MDRM']
+    return catalog
+
+
+# Function to get the quarter-end dates of a synthetic corpus
+def generate_quarter_dates(num_quarters: int, last_quarter: str = '2024-12-31') -> pd.DatetimeIndex:
+    return pd.date_range(end=pd.Timestamp(last_quarter), periods=num_quarters, freq='QE')
+
+
+# Function to simulate the values of every MDRM of one institution over all quarters
+def simulate_bank_values(catalog: pd.DataFrame, quarter_dates: pd.DatetimeIndex,
+                         rng: np.random.Generator, outlier_rate: float = 0.01) -> pd.DataFrame:
+    """
+    Simulates a multiplicative random walk per MDRM with occasional jumps, then applies the reporting
+    pattern of its kind: zeros, June/December or December only, a cut-off for discontinued items,
+    percentages and free text.
+    Args:
+        catalog (pd.DataFrame): Output of generate_mdrm_catalog.
+        quarter_dates (pd.DatetimeIndex): Quarter-end dates.
+        rng (np.random.Generator): Random generator of this institution.
+        outlier_rate (float): Share of values multiplied by a large jump. Defaults to 0.01.
+    Returns: pd.DataFrame: 'MDRM', 'QuarterIndex' and 'Value' (as written to the SDF file) of every
+        reported row.
+    """
+    num_mdrms, num_quarters = len(catalog), len(quarter_dates)
+    kinds = catalog['Kind'].to_numpy()
+    months = quarter_dates.month.to_numpy()
+
+    # Random walk in log space, scaled per institution
+    bank_scale = 10 ** rng.uniform(-1, 1)
+    steps = rng.normal(0, catalog['Volatility'].to_numpy()[:, None], size=(num_mdrms, num_quarters))
+    jumps = rng.random((num_mdrms, num_quarters)) < outlier_rate
+    steps[jumps] += rng.choice([-1.5, 1.5], size=jumps.sum())
+    levels = catalog['Level'].to_numpy()[:, None] * bank_scale * np.exp(np.cumsum(steps, axis=1))
+    values = np.round(levels)
+
+    # Reporting patterns per kind
+    reported = np.ones((num_mdrms, num_quarters), dtype=bool)
+    reported[kinds == 'semi_annual'] = np.isin(months, [6, 12])
+    reported[kinds == 'annual'] = months == 12
+    cutoffs = rng.integers(num_quarters // 4, max(num_quarters // 2, num_quarters // 4 + 1), size=num_mdrms)
+    discontinued = kinds == 'discontinued'
+    reported[discontinued] = np.arange(num_quarters)[None, :] < cutoffs[discontinued, None]
+
+    # Some semi-annual and annual items are reported as zero
+    zero_rows = (kinds == 'zero_quarterly') | (np.isin(kinds, ['semi_annual', 'annual']) & (rng.random(num_mdrms) < 0.3))
+    values[zero_rows] = 0
+
+    mdrm_index, quarter_index = np.nonzero(reported)
+    row_values = values[mdrm_index, quarter_index]
+    row_kinds = kinds[mdrm_index]
+    value_strings = row_values.astype(np.int64).astype(str).astype(object)
+
+    is_percentage = row_kinds == 'percentage'
+    value_strings[is_percentage] = [f"{value:.4f}%" for value in rng.uniform(4, 20, size=is_percentage.sum())]
+    is_text = row_kinds == 'text'
+    value_strings[is_text] = rng.choice(TEXT_VALUES, size=is_text.sum())
+    is_static = row_kinds == 'static'
+    value_strings[is_static] = rng.choice(['www.examplebank.biz', 'Example Bank, N.A.'], size=is_static.sum())
+
+    return pd.DataFrame({
+        'MDRM': catalog['MDRM'].to_numpy()[mdrm_index],
+        'QuarterIndex': quarter_index,
+        'Value': value_strings,
+    })
+
+
+# Function to write the static data CSV listing the static MDRMs of a catalog
+def write_synthetic_static_data(catalog: pd.DataFrame, file_path: Path) -> None:
+    static_items = catalog[catalog['Kind'] == 'static']
+    pd.DataFrame({
+        'report': 'FFIEC_031',
+        'entity': 'LC_2001_BANACONSOLDT',
+        'field_name': static_items['MDRM'],
+        'field_description': static_items['Definition'],
+    }).to_csv(file_path, index=False)
+
+
+# Function to write a synthetic corpus of SDF files
+def generate_synthetic_sdf_corpus(root_dir: Path, num_banks: int = 1, num_mdrms: int = 2000, num_quarters: int = 96,
+                                  seed: int = 0, last_quarter: str = '2024-12-31') -> Dict[str, object]:
+    """
+    Writes one SDF file per institution and quarter to root_dir/inputs/ffiec_031_sdf_files (one folder per
+    institution when there are several), named Call_Cert{cert}_{MMDDYY}.SDF like the FFIEC downloads, and
+    the matching static data CSV to root_dir/inputs.
+    Args:
+        root_dir (Path): Root folder of the corpus, laid out like the project root.
+        num_banks (int): Number of institutions. Defaults to 1.
+        num_mdrms (int): Number of MDRMs per institution. Defaults to 2000.
+        num_quarters (int): Number of quarters. Defaults to 96.
+        seed (int): Random seed. Defaults to 0.
+        last_quarter (str): Latest quarter-end date. Defaults to '2024-12-31'.
+    Returns: Dict[str, object]: The catalog, quarter dates, RSSD IDs and the SDF files written.
+    """
+    sdf_dir = Path(root_dir) / 'inputs' / 'ffiec_031_sdf_files'
+    sdf_dir.mkdir(parents=True, exist_ok=True)
+    catalog = generate_mdrm_catalog(num_mdrms, seed)
+    quarter_dates = generate_quarter_dates(num_quarters, last_quarter)
+    write_synthetic_static_data(catalog, Path(root_dir) / 'inputs' / 'FFIEC_031_AX_Report_Static_Data.csv')
+
+    rssd_ids = [480228 + 1000 * bank for bank in range(num_banks)]
+    call_dates = quarter_dates.strftime('%Y%m%d').astype(int)
+    # Filings are last updated within a few months of the quarter end
+    last_updates = (quarter_dates + pd.Timedelta(days=45)).strftime('%Y%m%d').astype(int)
+    file_dates = quarter_dates.strftime('%m%d%y')
+
+    sdf_files: List[Path] = []
+    for bank, rssd_id in enumerate(rssd_ids):
+        rng = np.random.default_rng([seed, bank])
+        bank_dir = sdf_dir if num_banks == 1 else sdf_dir / str(rssd_id)
+        bank_dir.mkdir(parents=True, exist_ok=True)
+        bank_values = simulate_bank_values(catalog, quarter_dates, rng)
+        bank_rows = bank_values.merge(catalog[['MDRM', 'Definition', 'Schedule', 'LineNumber']], on='MDRM')
+
+        for quarter_index, quarter_rows in bank_rows.groupby('QuarterIndex', sort=True):
+            sdf_df = pd.DataFrame({
+                'Call Date': call_dates[quarter_index],
+                'Bank RSSD Identifier': rssd_id,
+                'MDRM #': quarter_rows['MDRM'].to_numpy(),
+                'Value': quarter_rows['Value'].to_numpy(),
+                'Last Update': last_updates[quarter_index],
+                'Short Definition': quarter_rows['Definition'].to_numpy(),
+                'Call Schedule': quarter_rows['Schedule'].to_numpy(),
+                'Line Number': quarter_rows['LineNumber'].to_numpy(),
+            }, columns=SDF_HEADER).sort_values('MDRM #')
+            sdf_file = bank_dir / f"Call_Cert{3510 + bank}_{file_dates[quarter_index]}.SDF"
+            sdf_df.to_csv(sdf_file, sep=';', index=False)
+            sdf_files.append(sdf_file)
+
+    return {'catalog': catalog, 'quarter_dates': quarter_dates, 'rssd_ids': rssd_ids, 'sdf_files': sdf_files}
+
+
+def main(num_banks: int = 1, num_mdrms: int = 2000, num_quarters: int = 96, seed: int = 0,
+         root_dir: Optional[Path] = None):
+    """ Writes a synthetic corpus under outputs/ffiec031_synthetic. """
+    root_dir = root_dir or Path.cwd() / 'outputs' / 'ffiec031_synthetic'
+    corpus = generate_synthetic_sdf_corpus(root_dir, num_banks, num_mdrms, num_quarters, seed)
+    print(f"Wrote {len(corpus['sdf_files'])} SDF file(s) for {num_banks} institution(s), {num_mdrms} MDRM(s) "
+          f"and {num_quarters} quarter(s) to {root_dir}")
+    print(corpus['catalog']['Kind'].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
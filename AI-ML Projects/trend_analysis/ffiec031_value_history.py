@@ -0,0 +1,228 @@
+# Load packages
+import sqlite3
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+
+# MDRMs with new, amended or removed values in the last run of script 01, relative to the project folder;
+# script 02 scores only these series again
+CHANGED_MDRMS_PATH = Path("outputs") / "ffiec031_changed_mdrms.parquet"
+
+# 'Last Update' is a day, so amendments filed on the same day are told apart by their sequence number
+HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS value_versions (
+        rssd_id INTEGER NOT NULL,
+        mdrm TEXT NOT NULL,
+        report_date INTEGER NOT NULL,
+        last_update INTEGER NOT NULL,
+        sequence INTEGER NOT NULL DEFAULT 0,
+        value TEXT,
+        recorded_at TEXT NOT NULL,
+        PRIMARY KEY (rssd_id, mdrm, report_date, last_update, sequence)
+    );
+    CREATE TABLE IF NOT EXISTS quarter_hashes (
+        rssd_id INTEGER NOT NULL,
+        report_date INTEGER NOT NULL,
+        row_hash TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        last_update INTEGER,
+        PRIMARY KEY (rssd_id, report_date)
+    );
+    CREATE INDEX IF NOT EXISTS idx_value_versions_quarter ON value_versions (rssd_id, report_date);
+"""
+
+# Latest known version of every value of the given quarters
+CURRENT_VERSIONS_QUERY = """
+    SELECT rssd_id, mdrm, report_date, last_update, value FROM (
+        SELECT v.*, ROW_NUMBER() OVER (
+            PARTITION BY v.rssd_id, v.mdrm, v.report_date ORDER BY v.last_update DESC, v.sequence DESC
+        ) AS version_rank
+        FROM value_versions v
+        JOIN changed_quarters c ON v.rssd_id = c.rssd_id AND v.report_date = c.report_date
+    ) WHERE version_rank = 1
+"""
+
+# Next sequence number of every (institution, MDRM, report date, 'Last Update') key
+INSERT_VERSION_SQL = """
+    INSERT INTO value_versions (rssd_id, mdrm, report_date, last_update, sequence, value, recorded_at)
+    SELECT :rssd_id, :mdrm, :report_date, :last_update, COALESCE(MAX(sequence) + 1, 0), :value, :recorded_at
+    FROM value_versions
+    WHERE rssd_id = :rssd_id AND mdrm = :mdrm AND report_date = :report_date AND last_update = :last_update
+"""
+
+
+# Function to open (and create if needed) the value history of a run
+def open_value_history(store_path: Path) -> sqlite3.Connection:
+    history = sqlite3.connect(str(store_path))
+    columns = [row[1] for row in history.execute("PRAGMA table_info(value_versions)")]
+    if columns and 'sequence' not in columns:
+        # Histories written before the sequence number was part of the key
+        with history:
+            history.execute("ALTER TABLE value_versions RENAME TO value_versions_unsequenced")
+            history.execute("DROP INDEX IF EXISTS idx_value_versions_quarter")
+            history.executescript(HISTORY_SCHEMA)
+            history.execute(
+                "INSERT INTO value_versions (rssd_id, mdrm, report_date, last_update, value, recorded_at) "
+                "SELECT rssd_id, mdrm, report_date, last_update, value, recorded_at FROM value_versions_unsequenced"
+            )
+            history.execute("DROP TABLE value_versions_unsequenced")
+    history.executescript(HISTORY_SCHEMA)
+    return history
+
+
+# Function to bring SDF-layout rows into the key columns of the value history
+def _to_version_rows(hist_data: pd.DataFrame) -> pd.DataFrame:
+    hist_data = hist_data[hist_data['Call Date'].notna()]          # Rows without a call date have no quarter
+    values = hist_data['Value']
+    return pd.DataFrame({
+        'rssd_id': hist_data['Bank RSSD Identifier'].to_numpy(dtype=np.int64),
+        'mdrm': hist_data['MDRM #'].astype(str).to_numpy(),
+        'report_date': hist_data['Call Date'].to_numpy(dtype=np.int64),
+        'last_update': pd.to_numeric(hist_data['Last Update'], errors='coerce').fillna(0).to_numpy(dtype=np.int64),
+        'value': values.astype(str).where(values.notna(), None).to_numpy(dtype=object),
+    })
+
+
+# Function to hash the rows of every institution and quarter
+def hash_sdf_quarters(version_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hashes every (MDRM, Value) row and adds the row hashes up per institution and quarter, so the
+    quarter hash does not depend on the order of the rows in the SDF file.
+    Args: version_rows (pd.DataFrame): Output of _to_version_rows.
+    Returns: pd.DataFrame: 'rssd_id', 'report_date', 'row_hash', 'row_count' and 'last_update' per quarter.
+    """
+    row_hashes = pd.util.hash_pandas_object(version_rows[['mdrm', 'value']], index=False).to_numpy()
+    quarter_hashes = (
+        version_rows[['rssd_id', 'report_date', 'last_update']]
+        .assign(row_hash=row_hashes)
+        .groupby(['rssd_id', 'report_date'], sort=True)
+        .agg(row_hash=('row_hash', lambda hashes: np.add.reduce(hashes.to_numpy(), dtype=np.uint64)),
+             row_count=('row_hash', 'size'),
+             last_update=('last_update', 'max'))
+        .reset_index()
+    )
+    quarter_hashes['row_hash'] = quarter_hashes['row_hash'].map(lambda row_hash: f"{int(row_hash):016x}")
+    return quarter_hashes
+
+
+# Function to record new and amended values and return only what changed since the last run
+def record_sdf_versions(hist_data: pd.DataFrame, store_path: Path) -> pd.DataFrame:
+    """
+    Compares the hash of every institution and quarter with the previous run; only quarters whose hash
+    changed are diffed row by row. New values, amended values and values removed from a filing (stored
+    as NULL) are appended as versions keyed by their 'Last Update' and a sequence number, so a second
+    amendment filed on the same day does not overwrite the first.
+    Args:
+        hist_data (pd.DataFrame): Historical data in the SDF layout, including 'Last Update'.
+        store_path (Path): SQLite file holding the value history.
+    Returns: pd.DataFrame: The changed values with 'rssd_id', 'mdrm', 'report_date', 'last_update',
+        'value' and 'change' ('new', 'amended' or 'removed') columns.
+    """
+    version_rows = _to_version_rows(hist_data)
+    quarter_hashes = hash_sdf_quarters(version_rows)
+    history = open_value_history(store_path)
+
+    stored_hashes = pd.read_sql_query("SELECT rssd_id, report_date, row_hash FROM quarter_hashes", history)
+    compared = quarter_hashes.merge(stored_hashes, on=['rssd_id', 'report_date'], how='left', suffixes=('', '_stored'))
+    changed_quarters = compared.loc[compared['row_hash'] != compared['row_hash_stored'], ['rssd_id', 'report_date']]
+
+    history.execute("CREATE TEMP TABLE IF NOT EXISTS changed_quarters (rssd_id INTEGER, report_date INTEGER)")
+    history.execute("DELETE FROM changed_quarters")
+    history.executemany("INSERT INTO changed_quarters VALUES (?, ?)", changed_quarters.itertuples(index=False))
+    current_versions = pd.read_sql_query(CURRENT_VERSIONS_QUERY, history)
+
+    # Diff the rows of the changed quarters against their latest versions
+    new_rows = version_rows.merge(changed_quarters, on=['rssd_id', 'report_date'])
+    diff = new_rows.merge(current_versions, on=['rssd_id', 'mdrm', 'report_date'], how='outer',
+                          suffixes=('', '_stored'), indicator=True)
+    in_filing = diff['_merge'] != 'right_only'
+    was_stored = (diff['_merge'] != 'left_only') & diff['value_stored'].notna()
+    value_changed = diff['value'].fillna('\0').to_numpy() != diff['value_stored'].fillna('\0').to_numpy()
+    diff['change'] = np.select(
+        [in_filing & ~was_stored & diff['value'].notna(), in_filing & was_stored & value_changed, ~in_filing & was_stored],
+        ['new', 'amended', 'removed'],
+        default=''
+    )
+    changes = diff[diff['change'] != ''].copy()
+
+    # A removed value has no 'Last Update' of its own; it is recorded with the latest one of its quarter
+    removed = changes['change'] == 'removed'
+    if removed.any():
+        quarter_last_update = quarter_hashes.set_index(['rssd_id', 'report_date'])['last_update']
+        changes.loc[removed, 'last_update'] = [
+            quarter_last_update.get((rssd_id, report_date), 0)
+            for rssd_id, report_date in zip(changes.loc[removed, 'rssd_id'], changes.loc[removed, 'report_date'])
+        ]
+    changes = changes[['rssd_id', 'mdrm', 'report_date', 'last_update', 'value', 'change']].astype(
+        {'rssd_id': np.int64, 'report_date': np.int64, 'last_update': np.int64}
+    ).reset_index(drop=True)
+
+    recorded_at = datetime.now().isoformat(timespec='seconds')
+    with history:
+        history.executemany(
+            INSERT_VERSION_SQL,
+            [{**row, 'recorded_at': recorded_at} for row in changes.drop(columns='change').to_dict('records')]
+        )
+        history.executemany(
+            "INSERT OR REPLACE INTO quarter_hashes VALUES (?, ?, ?, ?, ?)",
+            quarter_hashes.merge(changed_quarters, on=['rssd_id', 'report_date'])[
+                ['rssd_id', 'report_date', 'row_hash', 'row_count', 'last_update']
+            ].itertuples(index=False, name=None)
+        )
+    history.close()
+
+    print(f"{len(changed_quarters)} of {len(quarter_hashes)} quarter(s) changed: "
+          f"{(changes['change'] == 'new').sum()} new, {(changes['change'] == 'amended').sum()} amended and "
+          f"{(changes['change'] == 'removed').sum()} removed value(s).")
+    return changes
+
+
+# Function to read the values as they were known on a given date
+def read_values_as_of(store_path: Path, as_of: Optional[int] = None, rssd_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    Picks the latest version of every value with a 'Last Update' on or before a date.
+    Args:
+        store_path (Path): SQLite file holding the value history.
+        as_of (Optional[int]): Knowledge date as YYYYMMDD. Defaults to the latest versions.
+        rssd_id (Optional[int]): Institution to read. Defaults to all institutions.
+    Returns: pd.DataFrame: 'rssd_id', 'mdrm', 'report_date', 'last_update' and 'value' columns; values
+        removed by that date are left out.
+    """
+    history = open_value_history(store_path)
+    versions = pd.read_sql_query(
+        """
+        SELECT rssd_id, mdrm, report_date, last_update, value FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY rssd_id, mdrm, report_date ORDER BY last_update DESC, sequence DESC
+            ) AS version_rank
+            FROM value_versions
+            WHERE last_update <= :as_of AND (:rssd_id IS NULL OR rssd_id = :rssd_id)
+        ) WHERE version_rank = 1 AND value IS NOT NULL
+        ORDER BY rssd_id, mdrm, report_date
+        """,
+        history,
+        params={"as_of": as_of if as_of is not None else 99991231, "rssd_id": rssd_id}
+    )
+    history.close()
+    return versions
+
+
+# Function to hand the MDRMs changed in this run over to the trend analysis
+def write_changed_mdrms(changed_mdrms: Iterable[str], file_path: Path) -> None:
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({'MDRM': sorted(set(changed_mdrms))}, dtype=object).to_parquet(file_path, index=False)
+
+
+# Function to read the MDRMs changed in the last run of script 01
+def read_changed_mdrms(file_path: Path) -> Optional[Set[str]]:
+    """
+    Reads the hand-over of write_changed_mdrms; a missing file means every MDRM is scored.
+    Args: file_path (Path): Parquet file written by write_changed_mdrms.
+    Returns: Optional[Set[str]]: The changed MDRMs, or None if no run recorded them.
+    """
+    if not file_path.exists():
+        return None
+    return set(pd.read_parquet(file_path)['MDRM'])
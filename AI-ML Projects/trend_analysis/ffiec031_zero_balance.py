@@ -0,0 +1,93 @@
+# Load packages
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+
+VALUE_STATES = ('zero', 'nonzero', 'missing')
+QUARTER_END_MONTHS = (3, 6, 9, 12)
+
+# Zero balance rules: (ReportingFrequency, quarter-end months, value states flagged as a breach).
+# Outside its reporting months a semi-annual or annual item should not be reported at all.
+# Frequencies without a rule ('Not Reported' and MDRMs missing from the reference data) are never breached.
+ZERO_BALANCE_RULES = (
+    ('Quarterly with Zeros', QUARTER_END_MONTHS, ('nonzero', 'missing')),
+    ('Quarterly - Not Reported', QUARTER_END_MONTHS, ('zero', 'nonzero')),
+    ('Semi-Annually with Zeros', (6, 12), ('nonzero', 'missing')),
+    ('Semi-Annually with Zeros', (3, 9), ('zero', 'nonzero')),
+    ('Annually with Zeros', (12,), ('nonzero', 'missing')),
+    ('Annually with Zeros', (3, 6, 9), ('zero', 'nonzero')),
+    ('Quarterly with Non-zeros', QUARTER_END_MONTHS, ('zero', 'missing')),
+    ('Semi-Annually with Non-zeros', (6, 12), ('zero', 'missing')),
+    ('Semi-Annually with Non-zeros', (3, 9), ('zero', 'nonzero')),
+    ('Annually with Non-zeros', (12,), ('zero', 'missing')),
+    ('Annually with Non-zeros', (3, 6, 9), ('zero', 'nonzero')),
+)
+
+
+# Function to compile the zero balance rules into a lookup table
+@lru_cache(maxsize=None)
+def compile_zero_balance_rules(rules: Tuple = ZERO_BALANCE_RULES) -> Tuple[pd.Index, np.ndarray]:
+    """
+    Args: rules (Tuple): Rules in the layout of ZERO_BALANCE_RULES.
+    Returns:
+        Tuple[pd.Index, np.ndarray]: A tuple containing:
+            - frequencies (pd.Index): Reporting frequencies with rules, in table order.
+            - breach_table (np.ndarray): Boolean table indexed by (frequency, month, value state); the
+              extra last frequency row is for frequencies without a rule and is all False.
+    """
+    frequencies = pd.Index(list(dict.fromkeys(rule[0] for rule in rules)))
+    breach_table = np.zeros((len(frequencies) + 1, 13, len(VALUE_STATES)), dtype=bool)
+    for frequency, months, value_states in rules:
+        breach_table[np.ix_([frequencies.get_loc(frequency)], list(months),
+                            [VALUE_STATES.index(state) for state in value_states])] = True
+    return frequencies, breach_table
+
+
+# Function to flag zero balance breaches for any number of rows in one pass
+def flag_zero_balance_breaches(frequencies: Iterable[str], values: Iterable[float], months: Iterable[int],
+                               rules: Tuple = ZERO_BALANCE_RULES) -> np.ndarray:
+    """
+    Classifies every value as zero, non-zero or missing with np.select and looks the breach flag up in
+    the compiled rule table by frequency, month and value state. Frequencies are matched once per
+    distinct frequency, so the cost per row does not depend on the number of rules.
+    Args:
+        frequencies (Iterable[str]): ReportingFrequency of every row; categorical columns are fastest.
+        values (Iterable[float]): Value of every row, NaN when not reported.
+        months (Iterable[int]): Month of the ReportDate of every row.
+        rules (Tuple): Rules in the layout of ZERO_BALANCE_RULES. Defaults to ZERO_BALANCE_RULES.
+    Returns: np.ndarray: True where the row breaches its rule.
+    """
+    rule_frequencies, breach_table = compile_zero_balance_rules(rules)
+
+    # Code -1 (missing frequency) and frequencies without a rule map to the all-False last row
+    frequency_codes, distinct_frequencies = pd.factorize(pd.Series(frequencies))
+    distinct_rows = rule_frequencies.get_indexer(pd.Index(distinct_frequencies))
+    distinct_rows = np.append(np.where(distinct_rows < 0, len(rule_frequencies), distinct_rows), len(rule_frequencies))
+    frequency_rows = distinct_rows[frequency_codes]
+
+    values = np.asarray(values, dtype=float)
+    value_states = np.select([np.isnan(values), values == 0], [VALUE_STATES.index('missing'), VALUE_STATES.index('zero')],
+                             default=VALUE_STATES.index('nonzero'))
+    return breach_table[frequency_rows, np.asarray(months, dtype=np.intp), value_states]
+
+
+# Function to score zero balance breaches for every row of processed data
+def score_zero_balance_breaches(proc_data: pd.DataFrame, ref_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores every report date (and institution, if proc_data has several) at once, e.g. to backtest the
+    zero balance rules over the full history.
+    Args:
+        proc_data (pd.DataFrame): Processed data with 'ReportDate', 'MDRM' and 'Value' columns.
+        ref_data (pd.DataFrame): Reference data with 'MDRM' and 'ReportingFrequency' columns.
+    Returns: pd.DataFrame: proc_data with a 'ZeroBalance_Breached' column ('Yes' or 'No').
+    """
+    frequency_map = ref_data.drop_duplicates('MDRM').set_index('MDRM')['ReportingFrequency']
+    # Map the frequency once per distinct MDRM instead of merging per row
+    mdrm_codes, distinct_mdrms = pd.factorize(proc_data['MDRM'])
+    frequencies = pd.Categorical(frequency_map.reindex(distinct_mdrms).to_numpy())
+    row_frequencies = frequencies.take(mdrm_codes, allow_fill=True)
+
+    breached = flag_zero_balance_breaches(row_frequencies, proc_data['Value'], proc_data['ReportDate'].dt.month)
+    return proc_data.assign(ZeroBalance_Breached=np.where(breached, 'Yes', 'No'))